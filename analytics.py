@@ -0,0 +1,163 @@
+import json
+from datetime import datetime
+
+import codec
+from concurrency import reads
+from instrumentation import instrumented
+from repository import Repository
+
+TASK_STATUSES = ('OPEN', 'IN_PROGRESS', 'COMPLETE')
+
+
+# Helper functions
+def status_breakdown(counts):
+    """
+    :param counts: Counter of task statuses, or None for no tasks
+    :return: (number of tasks, {status: number of tasks})
+    """
+    if not counts:
+        return 0, dict.fromkeys(TASK_STATUSES, 0)
+    return sum(counts.values()), {status: counts[status] for status in TASK_STATUSES}
+
+
+def completion_rate(total, statuses):
+    return statuses['COMPLETE'] / total if total else 0.0
+
+
+# AnalyticsBase class
+class AnalyticsBase:
+    """
+    Base interface implementation for API's reporting workload and progress across users, boards and teams.
+    A task counts as incomplete until its status is COMPLETE.
+    """
+
+    # incomplete tasks of a user across all boards
+    def user_workload(self, request: str) -> str:
+        """
+        :param request: A json string with the user identifier
+        {
+          "id" : "<user_id>"
+        }
+        :return: A json string with the response
+        {
+          "id" : "<user_id>",
+          "incomplete_tasks" : <tasks assigned to the user that are not COMPLETE>,
+          "tasks" : <tasks assigned to the user>,
+          "statuses" : {"OPEN" : <count>, "IN_PROGRESS" : <count>, "COMPLETE" : <count>}
+        }
+        """
+        pass
+
+    # status breakdown of the tasks of a board
+    def board_progress(self, request: str) -> str:
+        """
+        :param request: A json string with the board identifier
+        {
+          "id" : "<board_id>"
+        }
+        :return: A json string with the response
+        {
+          "id" : "<board_id>",
+          "tasks" : <tasks of the board>,
+          "statuses" : {"OPEN" : <count>, "IN_PROGRESS" : <count>, "COMPLETE" : <count>},
+          "completion_rate" : <fraction of the tasks that are COMPLETE, 0 without tasks>
+        }
+        """
+        pass
+
+    # completion of the tasks on a team's boards and workload of its members
+    def team_progress(self, request: str) -> str:
+        """
+        :param request: A json string with the team identifier
+        {
+          "id" : "<team_id>"
+        }
+        :return: A json string with the response
+        {
+          "id" : "<team_id>",
+          "boards" : {"OPEN" : <count>, "CLOSED" : <count>},
+          "tasks" : <tasks on the team's boards>,
+          "statuses" : {"OPEN" : <count>, "IN_PROGRESS" : <count>, "COMPLETE" : <count>},
+          "completion_rate" : <fraction of those tasks that are COMPLETE, 0 without tasks>,
+          "member_incomplete_tasks" : <incomplete tasks assigned to the team's members, on any board>
+        }
+        """
+        pass
+
+
+# AnalyticsManager class
+@instrumented(AnalyticsBase)
+class AnalyticsManager(AnalyticsBase):
+    """
+    Answers from counters the board and team managers of the same repository keep up to
+    date as they write, so no query scans the tasks. The counters are built the first
+    time they are queried, which loads every board.
+    """
+
+    def __init__(self, repository=None, backend=None):
+        self.repository = repository or Repository(backend)
+        self.users = self.repository.users
+        self.teams = self.repository.teams
+        self.boards = self.repository.boards
+        self.guard = self.repository.guard
+
+    @reads
+    def user_workload(self, request: str) -> str:
+        user_id = codec.loads(request)['id']
+        if user_id not in self.users:
+            return codec.dumps({"error": "User not found"})
+        total, statuses = status_breakdown(self.repository.counters().users.get(user_id))
+        return codec.dumps({"id": user_id, "incomplete_tasks": total - statuses['COMPLETE'], "tasks": total,
+                            "statuses": statuses})
+
+    @reads
+    def board_progress(self, request: str) -> str:
+        board_id = codec.loads(request)['id']
+        if board_id not in self.boards:
+            return codec.dumps({"error": "Board not found"})
+        total, statuses = status_breakdown(self.repository.counters().boards.get(board_id))
+        return codec.dumps({"id": board_id, "tasks": total, "statuses": statuses,
+                            "completion_rate": completion_rate(total, statuses)})
+
+    @reads
+    def team_progress(self, request: str) -> str:
+        team_id = codec.loads(request)['id']
+        if team_id not in self.teams:
+            return codec.dumps({"error": "Team not found"})
+        counters = self.repository.counters()
+        total, statuses = status_breakdown(counters.teams.get(team_id))
+        boards = counters.team_boards.get(team_id, {})
+        return codec.dumps({
+            "id": team_id,
+            "boards": {"OPEN": boards.get('OPEN', 0), "CLOSED": boards.get('CLOSED', 0)},
+            "tasks": total,
+            "statuses": statuses,
+            "completion_rate": completion_rate(total, statuses),
+            "member_incomplete_tasks": counters.member_incomplete[team_id],
+        })
+
+
+# Usage Example
+if __name__ == "__main__":
+    from project_board_base import ProjectBoardManager
+    from team_base import TeamManager
+    from user_base import UserManager
+
+    repository = Repository()
+    user_manager = UserManager(repository)
+    team_manager = TeamManager(repository)
+    board_manager = ProjectBoardManager(repository)
+    analytics = AnalyticsManager(repository)
+
+    user_id = json.loads(user_manager.create_user(json.dumps({"name": "analyst", "display_name": "Analyst"})))['id']
+    team_id = json.loads(team_manager.create_team(json.dumps(
+        {"name": "Analytics Team", "description": "", "admin": user_id})))['id']
+    board_id = json.loads(board_manager.create_board(json.dumps(
+        {"name": "Analytics Board", "description": "", "team_id": team_id,
+         "creation_time": datetime.now().isoformat()})))['id']
+    board_manager.add_task(json.dumps({"board_id": board_id, "title": "Count things", "description": "",
+                                       "user_id": user_id, "creation_time": datetime.now().isoformat()}))
+
+    print(analytics.user_workload(json.dumps({"id": user_id})))
+    print(analytics.board_progress(json.dumps({"id": board_id})))
+    print(analytics.team_progress(json.dumps({"id": team_id})))
@@ -0,0 +1,229 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from analytics import AnalyticsManager
+from project_board_base import ProjectBoardManager
+from team_base import TeamManager
+from user_base import UserManager
+
+# Pool size when no executor is passed in
+DEFAULT_WORKERS = 8
+
+
+# AsyncManager class
+class AsyncManager:
+    """
+    Runs a synchronous manager's methods on a bounded thread pool, so lock waits and
+    disk I/O never block the event loop.
+
+    Reads run concurrently on the pool. Writes are queued: all writes submitted while
+    a batch is running form the next batch, which runs as one pool job under a single
+    write lock with every log append flushed together at its end. Each caller still
+    gets its own result or exception, once its write has been flushed.
+
+    Pass the same executor to several facades to bound the threads they use together,
+    and the same repository to share data between them.
+    """
+
+    manager_class = None
+
+    def __init__(self, manager=None, repository=None, backend=None, executor=None, max_workers=DEFAULT_WORKERS):
+        self.manager = manager or self.manager_class(repository, backend)
+        self.owns_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='planner')
+        # (call, future) of writes waiting for the next batch
+        self.pending_writes = []
+        self.flush_task = None
+        self.batches = 0
+
+    async def close(self):
+        """
+        Wait for queued writes, then shut the pool down if this facade created it.
+        """
+        if self.flush_task is not None:
+            await self.flush_task
+        if self.owns_executor:
+            await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown)
+
+    async def _read(self, method, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(method, *args))
+
+    async def _write(self, method, *args):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending_writes.append((functools.partial(method, *args), future))
+        if self.flush_task is None:
+            self.flush_task = loop.create_task(self._flush_writes())
+        return await future
+
+    async def _flush_writes(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while self.pending_writes:
+                batch, self.pending_writes = self.pending_writes, []
+                try:
+                    results = await loop.run_in_executor(self.executor, self._run_batch, [call for call, _ in batch])
+                except Exception as error:
+                    results = [(False, error)] * len(batch)
+                for (_, future), (succeeded, value) in zip(batch, results):
+                    if future.done():
+                        continue
+                    if succeeded:
+                        future.set_result(value)
+                    else:
+                        future.set_exception(value)
+        finally:
+            self.flush_task = None
+
+    def _run_batch(self, calls):
+        repository = self.manager.repository
+        results = []
+        with repository.guard.writing(), repository.batch():
+            for call in calls:
+                try:
+                    results.append((True, call()))
+                except Exception as error:
+                    results.append((False, error))
+        self.batches += 1
+        return results
+
+
+# AsyncUserManager class
+class AsyncUserManager(AsyncManager):
+    """
+    Async counterpart of UserManager, with the same requests and responses.
+    """
+
+    manager_class = UserManager
+
+    async def create_user(self, request: str) -> str:
+        return await self._write(self.manager.create_user, request)
+
+    async def create_users_bulk(self, request: str) -> str:
+        return await self._write(self.manager.create_users_bulk, request)
+
+    async def list_users(self) -> str:
+        return await self._read(self.manager.list_users)
+
+    async def list_users_page(self, request: str) -> str:
+        return await self._read(self.manager.list_users_page, request)
+
+    async def stream_users(self, out):
+        return await self._read(self.manager.stream_users, out)
+
+    async def describe_user(self, request: str) -> str:
+        return await self._read(self.manager.describe_user, request)
+
+    async def update_user(self, request: str) -> str:
+        return await self._write(self.manager.update_user, request)
+
+    async def get_user_teams(self, request: str) -> str:
+        return await self._read(self.manager.get_user_teams, request)
+
+
+# AsyncTeamManager class
+class AsyncTeamManager(AsyncManager):
+    """
+    Async counterpart of TeamManager, with the same requests and responses.
+    """
+
+    manager_class = TeamManager
+
+    async def create_team(self, request: str) -> str:
+        return await self._write(self.manager.create_team, request)
+
+    async def list_teams(self) -> str:
+        return await self._read(self.manager.list_teams)
+
+    async def list_teams_page(self, request: str) -> str:
+        return await self._read(self.manager.list_teams_page, request)
+
+    async def stream_teams(self, out):
+        return await self._read(self.manager.stream_teams, out)
+
+    async def describe_team(self, request: str) -> str:
+        return await self._read(self.manager.describe_team, request)
+
+    async def update_team(self, request: str) -> str:
+        return await self._write(self.manager.update_team, request)
+
+    async def add_users_to_team(self, request: str):
+        return await self._write(self.manager.add_users_to_team, request)
+
+    async def add_users_to_teams(self, request: str) -> str:
+        return await self._write(self.manager.add_users_to_teams, request)
+
+    async def remove_users_from_team(self, request: str):
+        return await self._write(self.manager.remove_users_from_team, request)
+
+    async def get_user_team_ids(self, user_id):
+        return await self._read(self.manager.get_user_team_ids, user_id)
+
+    async def list_team_users(self, request: str):
+        return await self._read(self.manager.list_team_users, request)
+
+
+# AsyncProjectBoardManager class
+class AsyncProjectBoardManager(AsyncManager):
+    """
+    Async counterpart of ProjectBoardManager, with the same requests and responses.
+    """
+
+    manager_class = ProjectBoardManager
+
+    async def create_board(self, request: str) -> str:
+        return await self._write(self.manager.create_board, request)
+
+    async def create_boards_bulk(self, request: str) -> str:
+        return await self._write(self.manager.create_boards_bulk, request)
+
+    async def close_board(self, request: str) -> str:
+        return await self._write(self.manager.close_board, request)
+
+    async def add_task(self, request: str) -> str:
+        return await self._write(self.manager.add_task, request)
+
+    async def add_tasks_bulk(self, request: str) -> str:
+        return await self._write(self.manager.add_tasks_bulk, request)
+
+    async def update_task_status(self, request: str):
+        return await self._write(self.manager.update_task_status, request)
+
+    async def search_tasks(self, request: str) -> str:
+        return await self._read(self.manager.search_tasks, request)
+
+    async def list_boards(self, request: str) -> str:
+        return await self._read(self.manager.list_boards, request)
+
+    async def list_boards_page(self, request: str) -> str:
+        return await self._read(self.manager.list_boards_page, request)
+
+    async def stream_boards(self, request: str, out):
+        return await self._read(self.manager.stream_boards, request, out)
+
+    async def export_board(self, request: str) -> str:
+        # Writes the export file, not the db, so it runs alongside other reads
+        return await self._read(self.manager.export_board, request)
+
+    async def export_boards(self, request: str) -> str:
+        return await self._read(self.manager.export_boards, request)
+
+
+# AsyncAnalyticsManager class
+class AsyncAnalyticsManager(AsyncManager):
+    """
+    Async counterpart of AnalyticsManager, with the same requests and responses.
+    """
+
+    manager_class = AnalyticsManager
+
+    async def user_workload(self, request: str) -> str:
+        return await self._read(self.manager.user_workload, request)
+
+    async def board_progress(self, request: str) -> str:
+        return await self._read(self.manager.board_progress, request)
+
+    async def team_progress(self, request: str) -> str:
+        return await self._read(self.manager.team_progress, request)
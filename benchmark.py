@@ -0,0 +1,416 @@
+"""
+Benchmark suite for the user, team and project board managers.
+
+Generates a synthetic dataset at a chosen scale in a scratch directory, times every
+public manager method and reports ops/sec, p50/p99 latency, peak memory and bytes
+written per call. Results are saved as json so runs can be compared:
+
+    python benchmark.py --scale small --out before.json
+    python benchmark.py --scale small --out after.json --compare before.json
+
+The codec.* cases time encoding and decoding the full user list and the largest
+board with the selected --codec, so codecs can be compared the same way.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import codec
+import instrumentation
+from analytics import AnalyticsManager
+from project_board_base import ProjectBoardManager
+from cache import ResponseCache
+from repository import Repository
+from storage import JsonBackend, SqliteBackend
+from team_base import TeamManager
+from user_base import UserManager
+
+SCALES = {
+    'small': {"users": 1000, "teams": 100, "team_size": 20, "boards": 200, "tasks_per_board": 20,
+              "big_board_tasks": 1000},
+    'medium': {"users": 100000, "teams": 5000, "team_size": 50, "boards": 10000, "tasks_per_board": 20,
+               "big_board_tasks": 20000},
+    'large': {"users": 1000000, "teams": 20000, "team_size": 50, "boards": 50000, "tasks_per_board": 20,
+              "big_board_tasks": 100000},
+}
+
+BULK_CHUNK = 10000
+STATUSES = ["OPEN", "IN_PROGRESS", "COMPLETE"]
+
+
+# Helper functions
+def bytes_written():
+    """
+    Bytes this process has passed to write() so far, or None where /proc is unavailable.
+    """
+    try:
+        with open('/proc/self/io') as file:
+            for line in file:
+                if line.startswith('wchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def make_backend(name, root):
+    db_dir = os.path.join(root, 'db')
+    os.makedirs(db_dir, exist_ok=True)
+    if name == 'sqlite':
+        return SqliteBackend(os.path.join(db_dir, 'planner.sqlite3'))
+    return JsonBackend(db_dir)
+
+
+def chunks(items, size=BULK_CHUNK):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+# Dataset generation
+def generate_dataset(backend, scale, rng, cache=None, write_behind=None):
+    """
+    Populate the backend through the bulk APIs and return managers sharing one
+    repository over it, plus a description of what was created.
+    """
+    repository = Repository(backend, cache, write_behind)
+    users = UserManager(repository)
+    user_requests = [{"name": f"user_{i}", "display_name": f"User {i}"} for i in range(scale['users'])]
+    for chunk in chunks(user_requests):
+        users.create_users_bulk(json.dumps({"users": chunk}))
+
+    teams = TeamManager(repository)
+    for i in range(scale['teams']):
+        admin = str(rng.randint(1, scale['users']))
+        teams.create_team(json.dumps({"name": f"team_{i}", "description": f"Team {i}", "admin": admin}))
+    memberships = []
+    for team_id in teams.teams:
+        size = rng.randint(1, scale['team_size']) - 1
+        memberships.append({"id": team_id, "users": [str(rng.randint(1, scale['users'])) for _ in range(size)]})
+    for chunk in chunks(memberships, 1000):
+        teams.add_users_to_teams(json.dumps({"teams": chunk}))
+
+    boards = ProjectBoardManager(repository)
+    now = datetime.now().isoformat()
+    board_requests = [
+        {"name": f"board_{i}", "description": f"Board {i}", "team_id": str(rng.randint(1, scale['teams'])),
+         "creation_time": now}
+        for i in range(scale['boards'])
+    ]
+    board_ids = []
+    for chunk in chunks(board_requests):
+        board_ids.extend(json.loads(boards.create_boards_bulk(json.dumps({"boards": chunk})))['ids'])
+    for board_id in board_ids:
+        tasks = [
+            {"title": f"task_{i}", "description": f"Task {i}", "user_id": str(rng.randint(1, scale['users'])),
+             "creation_time": now}
+            for i in range(scale['tasks_per_board'])
+        ]
+        boards.add_tasks_bulk(json.dumps({"board_id": board_id, "tasks": tasks}))
+    big_board_id = board_ids[0]
+    big_tasks = [
+        {"title": f"big_task_{i}", "description": f"Task {i}", "user_id": str(rng.randint(1, scale['users'])),
+         "creation_time": now}
+        for i in range(scale['big_board_tasks'])
+    ]
+    for chunk in chunks(big_tasks):
+        boards.add_tasks_bulk(json.dumps({"board_id": big_board_id, "tasks": chunk}))
+
+    dataset = {
+        "users": len(users.users),
+        "teams": len(teams.teams),
+        "boards": len(boards.boards),
+        "big_board_id": big_board_id,
+        "big_board_tasks": len(boards.boards[big_board_id]['tasks']),
+    }
+    return users, teams, boards, dataset
+
+
+# Benchmark cases
+def build_cases(backend, users, teams, boards, dataset, rng):
+    """
+    :return: a list of (name, setup, call) tuples. setup(count) prepares state for count
+    calls and may be None; call(i) performs the i-th call.
+    """
+    counter = itertools.count()
+    n_users = dataset['users']
+    n_teams = dataset['teams']
+    n_boards = dataset['boards']
+    big_board = dataset['big_board_id']
+    n_big_tasks = dataset['big_board_tasks']
+    devnull = open(os.devnull, 'w')
+    state = {}
+    analytics = AnalyticsManager(boards.repository)
+    now = datetime.now().isoformat()
+
+    def random_user():
+        return str(rng.randint(1, n_users))
+
+    def setup_membership_teams(count):
+        state['membership_teams'] = [
+            json.loads(teams.create_team(json.dumps(
+                {"name": f"bench_team_{next(counter)}", "description": "", "admin": random_user()})))['id']
+            for _ in range(count)
+        ]
+
+    def setup_closable_boards(count):
+        request = [{"name": f"bench_closable_{next(counter)}", "description": "", "team_id": "1",
+                    "creation_time": now} for _ in range(count)]
+        state['closable_boards'] = json.loads(boards.create_boards_bulk(json.dumps({"boards": request})))['ids']
+
+    def setup_task_board(count):
+        state['task_board'] = json.loads(boards.create_board(json.dumps(
+            {"name": f"bench_board_{next(counter)}", "description": "", "team_id": "1",
+             "creation_time": now})))['id']
+
+    def membership_request(i):
+        teams_ = state['membership_teams']
+        return json.dumps({"id": teams_[i % len(teams_)], "users": [random_user(), random_user()]})
+
+    def setup_lazy_startup(count):
+        # Lazy startup reads the manifest written by compaction
+        for manager in (users, teams, boards):
+            manager.store.compact()
+        state['lazy_backend'] = JsonBackend(backend.db_dir, backend.compact_threshold, lazy=True)
+
+    def setup_payloads(count):
+        state['users_payload'] = list(users.users.values())
+        state['board_payload'] = boards.boards[big_board]
+        state['users_json'] = codec.dumps(state['users_payload'])
+        state['board_json'] = codec.dumps(state['board_payload'])
+
+    def lazy_startup_cases():
+        if not isinstance(backend, JsonBackend):
+            return []
+        return [
+            ('UserManager.__init__[lazy]', setup_lazy_startup,
+             lambda i: UserManager(backend=state['lazy_backend'])),
+            ('TeamManager.__init__[lazy]', setup_lazy_startup,
+             lambda i: TeamManager(backend=state['lazy_backend'])),
+            ('ProjectBoardManager.__init__[lazy]', setup_lazy_startup,
+             lambda i: ProjectBoardManager(backend=state['lazy_backend'])),
+        ]
+
+    return lazy_startup_cases() + [
+        ('UserManager.__init__', None, lambda i: UserManager(backend=backend)),
+        ('UserManager.create_user', None, lambda i: users.create_user(json.dumps(
+            {"name": f"bench_user_{next(counter)}", "display_name": "Bench"}))),
+        ('UserManager.create_users_bulk', None, lambda i: users.create_users_bulk(json.dumps(
+            {"users": [{"name": f"bench_bulk_user_{next(counter)}", "display_name": "Bench"}
+                       for _ in range(100)]}))),
+        ('UserManager.list_users', None, lambda i: users.list_users()),
+        ('UserManager.list_users_page', None, lambda i: users.list_users_page(json.dumps({"limit": 100}))),
+        ('UserManager.stream_users', None, lambda i: users.stream_users(devnull)),
+        ('UserManager.describe_user', None, lambda i: users.describe_user(json.dumps({"id": random_user()}))),
+        ('UserManager.update_user', None, lambda i: users.update_user(json.dumps(
+            {"id": random_user(), "user": {"display_name": f"Renamed {i}"}}))),
+        ('UserManager.get_user_teams', None, lambda i: users.get_user_teams(json.dumps({"id": random_user()}))),
+        ('TeamManager.__init__', None, lambda i: TeamManager(backend=backend)),
+        ('TeamManager.create_team', None, lambda i: teams.create_team(json.dumps(
+            {"name": f"bench_team_{next(counter)}", "description": "", "admin": random_user()}))),
+        ('TeamManager.list_teams', None, lambda i: teams.list_teams()),
+        ('TeamManager.list_teams_page', None, lambda i: teams.list_teams_page(json.dumps({"limit": 100}))),
+        ('TeamManager.stream_teams', None, lambda i: teams.stream_teams(devnull)),
+        ('TeamManager.describe_team', None, lambda i: teams.describe_team(json.dumps(
+            {"id": str(rng.randint(1, n_teams))}))),
+        ('TeamManager.update_team', None, lambda i: teams.update_team(json.dumps(
+            {"id": str(rng.randint(1, n_teams)), "team": {"description": f"Updated {i}"}}))),
+        ('TeamManager.add_users_to_team', setup_membership_teams, lambda i: teams.add_users_to_team(
+            membership_request(i))),
+        ('TeamManager.add_users_to_teams', setup_membership_teams, lambda i: teams.add_users_to_teams(json.dumps(
+            {"teams": [json.loads(membership_request(i + offset)) for offset in range(10)]}))),
+        ('TeamManager.remove_users_from_team', setup_membership_teams, lambda i: teams.remove_users_from_team(
+            membership_request(i))),
+        ('TeamManager.list_team_users', None, lambda i: teams.list_team_users(json.dumps(
+            {"id": str(rng.randint(1, n_teams))}))),
+        ('ProjectBoardManager.__init__', None, lambda i: ProjectBoardManager(backend=backend)),
+        ('ProjectBoardManager.create_board', None, lambda i: boards.create_board(json.dumps(
+            {"name": f"bench_board_{next(counter)}", "description": "", "team_id": str(rng.randint(1, n_teams)),
+             "creation_time": now}))),
+        ('ProjectBoardManager.create_boards_bulk', None, lambda i: boards.create_boards_bulk(json.dumps(
+            {"boards": [{"name": f"bench_bulk_board_{next(counter)}", "description": "", "team_id": "1",
+                         "creation_time": now} for _ in range(100)]}))),
+        ('ProjectBoardManager.close_board', setup_closable_boards, lambda i: boards.close_board(json.dumps(
+            {"id": state['closable_boards'][i]}))),
+        ('ProjectBoardManager.add_task', None, lambda i: boards.add_task(json.dumps(
+            {"board_id": big_board, "title": f"bench_task_{next(counter)}", "description": "",
+             "user_id": random_user(), "creation_time": now}))),
+        ('ProjectBoardManager.add_tasks_bulk', setup_task_board, lambda i: boards.add_tasks_bulk(json.dumps(
+            {"board_id": state['task_board'], "tasks": [
+                {"title": f"bench_bulk_task_{next(counter)}", "description": "", "user_id": random_user(),
+                 "creation_time": now} for _ in range(100)]}))),
+        ('ProjectBoardManager.update_task_status', None, lambda i: boards.update_task_status(json.dumps(
+            {"board_id": big_board, "task_id": str(rng.randint(1, n_big_tasks)),
+             "status": rng.choice(STATUSES)}))),
+        # The index is built by the setup, so the timings are of searches alone
+        ('ProjectBoardManager.search_tasks', lambda ops: boards.search_index(),
+         lambda i: boards.search_tasks(json.dumps({"query": f"task {rng.randint(1, n_big_tasks)}", "limit": 20}))),
+        ('ProjectBoardManager.list_boards', None, lambda i: boards.list_boards(json.dumps(
+            {"id": str(rng.randint(1, n_teams))}))),
+        ('ProjectBoardManager.list_boards_page', None, lambda i: boards.list_boards_page(json.dumps(
+            {"id": str(rng.randint(1, n_teams)), "limit": 100}))),
+        ('ProjectBoardManager.stream_boards', None, lambda i: boards.stream_boards(json.dumps(
+            {"id": str(rng.randint(1, n_teams))}), devnull)),
+        ('ProjectBoardManager.export_board', None, lambda i: boards.export_board(json.dumps(
+            {"id": str(rng.randint(1, n_boards))}))),
+        ('ProjectBoardManager.export_boards', None, lambda i: boards.export_boards(json.dumps(
+            {"ids": [str(rng.randint(1, n_boards)) for _ in range(100)], "format": "csv"}))),
+        # The counters are built by the setup, so the timings are of the lookups alone
+        ('AnalyticsManager.user_workload', lambda ops: boards.repository.counters(),
+         lambda i: analytics.user_workload(json.dumps({"id": random_user()}))),
+        ('AnalyticsManager.board_progress', lambda ops: boards.repository.counters(),
+         lambda i: analytics.board_progress(json.dumps({"id": str(rng.randint(1, n_boards))}))),
+        ('AnalyticsManager.team_progress', lambda ops: boards.repository.counters(),
+         lambda i: analytics.team_progress(json.dumps({"id": str(rng.randint(1, n_teams))}))),
+        ('codec.dumps[users]', setup_payloads, lambda i: codec.dumps(state['users_payload'])),
+        ('codec.loads[users]', setup_payloads, lambda i: codec.loads(state['users_json'])),
+        ('codec.dumps[board]', setup_payloads, lambda i: codec.dumps(state['board_payload'])),
+        ('codec.loads[board]', setup_payloads, lambda i: codec.loads(state['board_json'])),
+    ]
+
+
+def run_case(setup, call, ops, memory_ops):
+    if setup is not None:
+        setup(ops + memory_ops)
+    latencies = []
+    written_before = bytes_written()
+    started = time.perf_counter()
+    for i in range(ops):
+        call_started = time.perf_counter_ns()
+        call(i)
+        latencies.append(time.perf_counter_ns() - call_started)
+    elapsed = time.perf_counter() - started
+    written_after = bytes_written()
+
+    # Peak memory is measured on a separate short pass so tracemalloc does not skew the timings
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    for i in range(ops, ops + memory_ops):
+        call(i)
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "ops": ops,
+        "ops_per_sec": ops / elapsed if elapsed else None,
+        "p50_us": percentile(latencies, 0.50) / 1000,
+        "p99_us": percentile(latencies, 0.99) / 1000,
+        "peak_memory_bytes": peak,
+        "bytes_written_per_op": (written_after - written_before) / ops if written_before is not None else None,
+    }
+
+
+def print_results(results, previous=None):
+    header = f"{'method':45} {'ops/sec':>12} {'p50 us':>10} {'p99 us':>10} {'peak mem':>12} {'bytes/op':>10}"
+    if previous:
+        header += f" {'ops/sec vs prev':>16}"
+    print(header)
+    for name, result in results.items():
+        line = (f"{name:45} {result['ops_per_sec'] or 0:12.1f} {result['p50_us']:10.1f} {result['p99_us']:10.1f} "
+                f"{result['peak_memory_bytes']:12d} {result['bytes_written_per_op'] or 0:10.0f}")
+        before = (previous or {}).get(name)
+        if before and before.get('ops_per_sec'):
+            line += f" {(result['ops_per_sec'] / before['ops_per_sec'] - 1) * 100:+15.1f}%"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--users', type=int, help="override the number of users of the scale")
+    parser.add_argument('--teams', type=int, help="override the number of teams of the scale")
+    parser.add_argument('--team-size', type=int, help="override the max team size of the scale")
+    parser.add_argument('--boards', type=int, help="override the number of boards of the scale")
+    parser.add_argument('--big-board-tasks', type=int, help="override the task count of the largest board")
+    parser.add_argument('--backend', choices=['json', 'sqlite'], default='json')
+    parser.add_argument('--codec', choices=sorted(codec.CODECS), help="json codec, default the fastest installed")
+    parser.add_argument('--pretty', action='store_true', help="indent API responses")
+    parser.add_argument('--cache-mb', type=int, help="serve reads through a response cache of this size")
+    parser.add_argument('--instrument', action='store_true', help="record per-method and I/O statistics")
+    parser.add_argument('--write-behind', type=float, metavar='MS',
+                        help="flush writes in the background, gathering them for this many milliseconds")
+    parser.add_argument('--ops', type=int, default=200, help="timed calls per method")
+    parser.add_argument('--load-ops', type=int, default=3, help="timed calls per manager constructor")
+    parser.add_argument('--memory-ops', type=int, default=10, help="calls per method traced for peak memory")
+    parser.add_argument('--only', help="only run methods whose name contains this string")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help="write the results as json to this file")
+    parser.add_argument('--compare', help="json results of an earlier run to compare against")
+    args = parser.parse_args(argv)
+
+    scale = dict(SCALES[args.scale])
+    for key in ('users', 'teams', 'team_size', 'boards', 'big_board_tasks'):
+        if getattr(args, key) is not None:
+            scale[key] = getattr(args, key)
+    codec.configure(args.codec, args.pretty)
+    rng = random.Random(args.seed)
+    out_path = os.path.abspath(args.out) if args.out else None
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+
+    root = tempfile.mkdtemp(prefix='planner-bench-')
+    os.chdir(root)
+    os.makedirs('out', exist_ok=True)
+    backend = make_backend(args.backend, root)
+
+    started = time.perf_counter()
+    cache = ResponseCache(args.cache_mb * 1024 * 1024) if args.cache_mb else None
+    write_behind = args.write_behind / 1000 if args.write_behind is not None else None
+    users, teams, boards, dataset = generate_dataset(backend, scale, rng, cache, write_behind)
+    dataset['generation_seconds'] = time.perf_counter() - started
+    print(f"dataset: {json.dumps(dataset)} in {root}", file=sys.stderr)
+
+    if args.instrument:
+        instrumentation.enable()
+    results = {}
+    for name, setup, call in build_cases(backend, users, teams, boards, dataset, rng):
+        if args.only and args.only not in name:
+            continue
+        ops = args.load_ops if '__init__' in name else args.ops
+        memory_ops = min(args.memory_ops, ops)
+        results[name] = run_case(setup, call, ops, memory_ops)
+
+    previous = None
+    if compare_path:
+        with open(compare_path) as file:
+            previous = json.load(file)['results']
+    print_results(results, previous)
+    if cache is not None:
+        print(f"cache: {json.dumps(cache.stats())}", file=sys.stderr)
+
+    if out_path:
+        report = {
+            "meta": {
+                "timestamp": datetime.now().isoformat(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "backend": args.backend,
+                "codec": codec.codec.name,
+                "pretty": args.pretty,
+                "cache_mb": args.cache_mb,
+                "write_behind_ms": args.write_behind,
+                "cache": cache.stats() if cache is not None else None,
+                "instrumentation": instrumentation.snapshot(),
+                "scale": scale,
+                "dataset": dataset,
+            },
+            "results": results,
+        }
+        with open(out_path, 'w') as file:
+            json.dump(report, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
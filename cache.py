@@ -0,0 +1,129 @@
+import functools
+import sys
+import threading
+from collections import OrderedDict
+
+import codec
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+# ResponseCache class
+class ResponseCache:
+    """
+    LRU cache of serialized API responses, bounded by the memory the responses use.
+
+    Every entry carries tags naming the data it was built from, such as ('user', id) or
+    ('users',). Mutations invalidate the tags they affect, dropping exactly the entries
+    built from that data. Safe to use from concurrent readers.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # key -> (response, size, tags), least recently used first
+        self.entries = OrderedDict()
+        # tag -> keys of the entries carrying it
+        self.tagged = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, response, tags):
+        size = sys.getsizeof(response)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            self._drop(key)
+            tags = tuple(tags)
+            self.entries[key] = (response, size, tags)
+            self.bytes += size
+            for tag in tags:
+                self.tagged.setdefault(tag, set()).add(key)
+            while self.bytes > self.max_bytes:
+                self._drop(next(iter(self.entries)))
+                self.evictions += 1
+
+    def invalidate(self, *tags):
+        with self.lock:
+            for tag in tags:
+                for key in self.tagged.pop(tag, ()):
+                    if self._drop(key):
+                        self.invalidations += 1
+
+    def clear(self):
+        with self.lock:
+            self.invalidations += len(self.entries)
+            self.entries.clear()
+            self.tagged.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _drop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return False
+        self.bytes -= entry[1]
+        for tag in entry[2]:
+            keys = self.tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tagged[tag]
+        return True
+
+
+# Helper functions
+def cached(tags):
+    """
+    Serve a manager read method from its repository's response cache, if it has one.
+    Apply inside @reads, so other processes' writes are picked up before the lookup.
+
+    :param tags: callable(manager, *args) returning the tags of the response
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args):
+            cache = self.repository.cache
+            if cache is None:
+                return method(self, *args)
+            key = (method.__qualname__, codec.pretty) + args
+            response = cache.get(key)
+            if response is None:
+                response = method(self, *args)
+                cache.put(key, response, tags(self, *args))
+            return response
+        return wrapper
+    return decorator
+
+
+def id_tag(kind):
+    """
+    Tags function for methods whose request is {"id": ...}: tags the response (kind, id).
+    """
+    return lambda manager, request: [(kind, codec.loads(request)['id'])]
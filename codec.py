@@ -0,0 +1,159 @@
+import json
+from time import perf_counter
+
+from models import to_json, to_plain
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# Indentation of responses in pretty mode
+PRETTY_INDENT = 4
+
+
+# StdlibCodec class
+class StdlibCodec:
+    """
+    The json module from the standard library, always available.
+    """
+
+    name = 'json'
+
+    def loads(self, data):
+        return json.loads(data)
+
+    def dumps(self, value):
+        return json.dumps(value, separators=(',', ':'), default=to_json)
+
+    def dumpb(self, value):
+        # Non-ascii characters are escaped, so the text is ascii
+        return self.dumps(value).encode()
+
+
+# OrjsonCodec class
+class OrjsonCodec:
+    name = 'orjson'
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+    def dumps(self, value):
+        return orjson.dumps(value, default=to_json).decode()
+
+    def dumpb(self, value):
+        return orjson.dumps(value, default=to_json)
+
+
+# MsgspecCodec class
+class MsgspecCodec:
+    name = 'msgspec'
+
+    def __init__(self):
+        self.encoder = msgspec.json.Encoder(enc_hook=to_json)
+        self.decoder = msgspec.json.Decoder()
+
+    def loads(self, data):
+        try:
+            return self.decoder.decode(data)
+        except msgspec.DecodeError as error:
+            # Callers expect invalid json to raise ValueError, as json.loads does
+            raise ValueError(str(error)) from error
+
+    def dumps(self, value):
+        return self.encoder.encode(value).decode()
+
+    def dumpb(self, value):
+        return self.encoder.encode(value)
+
+
+# Codec name -> (class, whether its library is installed), fastest first
+CODECS = {
+    'orjson': (OrjsonCodec, orjson is not None),
+    'msgspec': (MsgspecCodec, msgspec is not None),
+    'json': (StdlibCodec, True),
+}
+
+
+# Helper functions
+def select_codec(name=None):
+    """
+    :param name: one of CODECS, or None for the fastest one installed
+    :return: a codec instance
+    """
+    if name is None:
+        name = next(name for name, (_, available) in CODECS.items() if available)
+    if name not in CODECS:
+        raise ValueError(f"Unknown codec: {name}")
+    codec_class, available = CODECS[name]
+    if not available:
+        raise ValueError(f"Codec not installed: {name}")
+    return codec_class()
+
+
+codec = select_codec()
+pretty = False
+# callable(kind, seconds, size) told about every encode and decode, see instrumentation
+observer = None
+
+
+def configure(name=None, pretty_responses=None):
+    """
+    Choose the codec every manager and store uses, and whether API responses are
+    indented for humans. Files on disk are always written compact.
+
+    :param name: a codec name, or None to keep the current one
+    :param pretty_responses: True for indented responses, False for compact ones, None to keep
+    """
+    global codec, pretty
+    if name is not None:
+        codec = select_codec(name)
+    if pretty_responses is not None:
+        pretty = pretty_responses
+
+
+def loads(data):
+    """
+    :param data: a json document as str or bytes
+    """
+    if observer is None:
+        return codec.loads(data)
+    started = perf_counter()
+    value = codec.loads(data)
+    observer('decode', perf_counter() - started, len(data))
+    return value
+
+
+def dumps(value):
+    """
+    Serialize an API response: compact by default, indented in pretty mode.
+    """
+    value = to_plain(value)
+    if observer is None and not pretty:
+        return codec.dumps(value)
+    started = perf_counter()
+    if pretty:
+        data = json.dumps(value, indent=PRETTY_INDENT, default=to_json)
+    else:
+        data = codec.dumps(value)
+    if observer is not None:
+        observer('encode', perf_counter() - started, len(data))
+    return data
+
+
+def dumpb(value):
+    """
+    Serialize to compact utf-8 bytes, for files on disk.
+    """
+    value = to_plain(value)
+    if observer is None:
+        return codec.dumpb(value)
+    started = perf_counter()
+    data = codec.dumpb(value)
+    observer('encode', perf_counter() - started, len(data))
+    return data
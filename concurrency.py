@@ -0,0 +1,216 @@
+import functools
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory file locks on this platform: only in-process locking applies
+    fcntl = None
+
+
+# ReadWriteLock class
+class ReadWriteLock:
+    """
+    Many concurrent readers or a single writer. Waiting writers hold back new readers
+    so a steady stream of reads cannot starve them, and are served in arrival order so
+    a thread writing back to back cannot starve the others. The writing thread may take
+    the lock again, for reading or writing, without blocking on itself.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.readers = 0
+        # Ident of the thread holding the write lock
+        self.writer = None
+        self.waiting_writers = 0
+        # Writers take a ticket and get the lock when it is served
+        self.next_ticket = 0
+        self.serving = 0
+        # Tickets of writers that gave up waiting, skipped when reached
+        self.abandoned = set()
+
+    def held_for_writing(self):
+        return self.writer == threading.get_ident()
+
+    @contextmanager
+    def read(self):
+        if self.held_for_writing():
+            yield
+            return
+        with self.condition:
+            while self.writer is not None or self.waiting_writers:
+                self.condition.wait()
+            self.readers += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.readers -= 1
+                if not self.readers:
+                    self.condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        if self.held_for_writing():
+            yield
+            return
+        with self.condition:
+            ticket = self.next_ticket
+            self.next_ticket += 1
+            self.waiting_writers += 1
+            try:
+                while self.writer is not None or self.readers or self.serving != ticket:
+                    self.condition.wait()
+            except BaseException:
+                self.waiting_writers -= 1
+                self.abandoned.add(ticket)
+                self._skip_abandoned()
+                self.condition.notify_all()
+                raise
+            self.waiting_writers -= 1
+            self.writer = threading.get_ident()
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.writer = None
+                self.serving += 1
+                self._skip_abandoned()
+                self.condition.notify_all()
+
+    def _skip_abandoned(self):
+        while self.serving in self.abandoned:
+            self.abandoned.remove(self.serving)
+            self.serving += 1
+
+
+# FileLock class
+class FileLock:
+    """
+    Advisory lock on a file shared by every process using the same db directory.
+
+    flock() locks belong to the open file, not to a thread, so the threads of a process
+    share one: it is held shared while any thread holds it shared, and exclusively while
+    the writing thread does. Only a thread holding the ReadWriteLock for writing takes
+    it exclusively, so there is at most one such thread at a time.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.shared = 0
+        self.exclusive = False
+        self.state_lock = threading.Lock()
+
+    @contextmanager
+    def hold(self, exclusive=True):
+        if fcntl is None or self.path is None:
+            yield
+            return
+        with self.state_lock:
+            if self.file is None:
+                self.file = open(self.path, 'a')
+            if exclusive:
+                fcntl.flock(self.file, fcntl.LOCK_EX)
+                self.exclusive = True
+            else:
+                if not self.shared and not self.exclusive:
+                    fcntl.flock(self.file, fcntl.LOCK_SH)
+                self.shared += 1
+        try:
+            yield
+        finally:
+            with self.state_lock:
+                if exclusive:
+                    self.exclusive = False
+                    fcntl.flock(self.file, fcntl.LOCK_SH if self.shared else fcntl.LOCK_UN)
+                else:
+                    self.shared -= 1
+                    if not self.shared and not self.exclusive:
+                        fcntl.flock(self.file, fcntl.LOCK_UN)
+
+
+# ConcurrencyGuard class
+class ConcurrencyGuard:
+    """
+    Coordinates access to a manager's in-memory data.
+
+    Readers share an in-process read lock. Writers take the write lock and the backend's
+    file lock exclusively, and catch up with other processes' writes before mutating.
+    When a store reports that it changed on disk, the new data is loaded under the locks
+    and on_reload is called with {store: ids of the records written} so the manager can
+    bring its indexes up to date for those records. Any other read of the files, such as
+    a store's first load, goes through loading().
+    """
+
+    def __init__(self, backend, stores, on_reload):
+        self.lock = ReadWriteLock()
+        self.file_lock = FileLock(backend.lock_path)
+        self.stores = stores
+        self.on_reload = on_reload
+
+    @contextmanager
+    def reading(self):
+        if self.lock.held_for_writing():
+            # Already up to date and exclusive
+            yield
+            return
+        if any(store.changed() for store in self.stores):
+            with self.lock.write(), self.file_lock.hold(exclusive=False):
+                self.refresh()
+        with self.lock.read():
+            yield
+
+    @contextmanager
+    def writing(self):
+        if self.lock.held_for_writing():
+            yield
+            return
+        with self.lock.write(), self.file_lock.hold():
+            self.refresh()
+            yield
+
+    @contextmanager
+    def loading(self):
+        """
+        Hold the file lock shared, so no other process is halfway through a write while
+        files are read, unless the calling thread is writing and holds it already.
+        """
+        if self.lock.held_for_writing():
+            yield
+            return
+        with self.file_lock.hold(exclusive=False):
+            yield
+
+    def refresh(self):
+        changes = {}
+        for store in self.stores:
+            keys = store.refresh()
+            if keys:
+                changes[store] = keys
+        if changes:
+            self.on_reload(changes)
+
+
+# Helper functions
+def reads(method):
+    """
+    Run a manager method under its guard's read lock.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.guard.reading():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def writes(method):
+    """
+    Run a manager method under its guard's write lock and the cross-process file lock.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.guard.writing():
+            return method(self, *args, **kwargs)
+    return wrapper
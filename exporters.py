@@ -0,0 +1,187 @@
+"""
+Board export formats.
+
+Each format writes one board, given as a plain dict with its tasks, to a text file.
+Output goes through a large write buffer, one task at a time, so a board is never
+rendered into a single string. export_chunk() is the unit of work handed to each
+process of a parallel export.
+"""
+import csv
+import html
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, repeat
+
+import codec
+
+DEFAULT_OUT_DIR = 'out'
+DEFAULT_FORMAT = 'txt'
+# Records the board version each export file was written from
+MANIFEST_FILE = 'export_manifest.json'
+WRITE_BUFFER = 256 * 1024
+# Below this many boards a process pool costs more than it saves
+PARALLEL_MIN_BOARDS = 64
+# Most boards sent to a worker process at a time
+MAX_CHUNK = 256
+# Most boards copied for an export at a time
+EXPORT_BATCH = 2048
+# Start method of the worker processes; forkserver where the platform has it, else spawn
+EXPORT_CONTEXT = multiprocessing.get_context(
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+
+TASK_COLUMNS = ('id', 'title', 'description', 'user_id', 'creation_time', 'status')
+
+
+# Helper functions
+def write_txt(board_id, board, out):
+    out.write(f"Board Name: {board['name']}\n")
+    out.write(f"Board Description: {board['description']}\n")
+    out.write(f"Team ID: {board['team_id']}\n")
+    out.write("Tasks:\n")
+    for task in board['tasks']:
+        out.write(
+            f"- Task ID: {task['id']}\n"
+            f"  Title: {task['title']}\n"
+            f"  Description: {task['description']}\n"
+            f"  Assigned User ID: {task['user_id']}\n"
+            f"  Creation Time: {task['creation_time']}\n"
+            f"  Status: {task['status']}\n\n"
+        )
+
+
+def markdown_cell(value):
+    return str(value).replace('|', '\\|').replace('\n', ' ')
+
+
+def write_markdown(board_id, board, out):
+    out.write(f"# {board['name']}\n\n")
+    if board['description']:
+        out.write(f"{board['description']}\n\n")
+    out.write(f"- Board ID: {board_id}\n- Team ID: {board['team_id']}\n")
+    out.write(f"- Status: {board.get('status', 'OPEN')}\n- Tasks: {len(board['tasks'])}\n\n")
+    out.write("| ID | Title | Description | Assigned User ID | Creation Time | Status |\n")
+    out.write("|----|-------|-------------|------------------|---------------|--------|\n")
+    for task in board['tasks']:
+        out.write('| ' + ' | '.join(markdown_cell(task.get(column, '')) for column in TASK_COLUMNS) + ' |\n')
+
+
+def write_csv(board_id, board, out):
+    writer = csv.writer(out)
+    writer.writerow(('board_id', 'board_name', 'team_id') + TASK_COLUMNS)
+    prefix = (board_id, board['name'], board['team_id'])
+    writer.writerows(prefix + tuple(task.get(column, '') for column in TASK_COLUMNS) for task in board['tasks'])
+
+
+def write_html(board_id, board, out):
+    escape = html.escape
+    name = escape(board['name'])
+    out.write(f"<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\">\n<title>{name}</title>\n</head>\n<body>\n")
+    out.write(f"<h1>{name}</h1>\n<p>{escape(board['description'])}</p>\n")
+    out.write(f"<p>Board ID: {escape(board_id)} &middot; Team ID: {escape(board['team_id'])} &middot; "
+              f"Status: {escape(str(board.get('status', 'OPEN')))}</p>\n")
+    out.write("<table>\n<tr><th>ID</th><th>Title</th><th>Description</th><th>Assigned User ID</th>"
+              "<th>Creation Time</th><th>Status</th></tr>\n")
+    for task in board['tasks']:
+        out.write('<tr>' + ''.join(f"<td>{escape(str(task.get(column, '')))}</td>" for column in TASK_COLUMNS)
+                  + '</tr>\n')
+    out.write("</table>\n</body>\n</html>\n")
+
+
+def write_ndjson(board_id, board, out):
+    # The board without its tasks, then one task per line
+    header = {key: value for key, value in board.items() if key != 'tasks'}
+    out.write(codec.dumps({"id": board_id, **header}) + '\n')
+    for task in board['tasks']:
+        out.write(codec.dumps(task) + '\n')
+
+
+# Format name -> (file extension, writer)
+FORMATS = {
+    'txt': ('txt', write_txt),
+    'md': ('md', write_markdown),
+    'csv': ('csv', write_csv),
+    'html': ('html', write_html),
+    'ndjson': ('ndjson', write_ndjson),
+}
+
+
+def check_format(name):
+    if name not in FORMATS:
+        raise ValueError(f"Unknown export format: {name}. Use one of {', '.join(FORMATS)}")
+
+
+def export_file_name(board_id, fmt):
+    return f"board_{board_id}.{FORMATS[fmt][0]}"
+
+
+def write_board(out_dir, board_id, board, fmt=DEFAULT_FORMAT):
+    """
+    :param board: a board record, or a plain dict with its tasks as a list of dicts
+    :return: name of the file written in out_dir
+    """
+    file_name = export_file_name(board_id, fmt)
+    writer = FORMATS[fmt][1]
+    # newline='' leaves csv's \r\n row endings alone; the other formats only write \n
+    with open(os.path.join(out_dir, file_name), 'w', buffering=WRITE_BUFFER, encoding='utf-8', newline='') as out:
+        writer(board_id, board, out)
+    return file_name
+
+
+def export_chunk(out_dir, fmt, boards):
+    """
+    Write a list of (board_id, board) pairs; run in the worker processes of a parallel export.
+    """
+    return [write_board(out_dir, board_id, board, fmt) for board_id, board in boards]
+
+
+def load_manifest(out_dir):
+    """
+    :return: format -> {board_id: version of the board when its file was written}
+    """
+    try:
+        with open(os.path.join(out_dir, MANIFEST_FILE), 'rb') as file:
+            return codec.loads(file.read())
+    except (OSError, ValueError):
+        # A missing or unreadable manifest only means every board is exported again
+        return {}
+
+
+def save_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    with open(path + '.tmp', 'wb') as file:
+        file.write(codec.dumpb(manifest))
+    os.replace(path + '.tmp', path)
+
+
+def snapshot(board):
+    """
+    Copy a board record into the plain dicts sent to the worker processes.
+    """
+    return board.to_dict()
+
+
+def export_parallel(out_dir, fmt, batches, workers=None):
+    """
+    Write (board_id, board) pairs spread over a pool of worker processes.
+
+    :param batches: iterable of lists of (board_id, board) pairs, taken one list at a
+    time, so only one batch of boards is held in memory
+    :param workers: number of processes, None for one per cpu
+    :return: names of the files written, in the order of boards
+    """
+    workers = workers or os.cpu_count() or 1
+    batches = iter(batches)
+    first = next(batches, [])
+    if workers == 1 or len(first) < PARALLEL_MIN_BOARDS:
+        return [name for batch in chain([first], batches) for name in export_chunk(out_dir, fmt, batch)]
+    # A few chunks per worker keeps them busy when board sizes vary
+    size = max(1, min(MAX_CHUNK, len(first) // (workers * 4)))
+    names = []
+    # Forking a process whose other threads may hold locks would copy them held, so the
+    # workers are started from a clean forkserver process instead
+    with ProcessPoolExecutor(max_workers=min(workers, -(-len(first) // size)), mp_context=EXPORT_CONTEXT) as pool:
+        for batch in chain([first], batches):
+            chunks = [batch[start:start + size] for start in range(0, len(batch), size)]
+            names += [name for names in pool.map(export_chunk, repeat(out_dir), repeat(fmt), chunks) for name in names]
+    return names
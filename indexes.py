@@ -0,0 +1,418 @@
+import heapq
+import math
+import re
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+
+# UniqueIndex class
+class UniqueIndex:
+    """
+    In-memory secondary index mapping a unique key to the id of the record that owns it.
+
+    The managers rebuild their indexes from the loaded data and keep them in step with
+    every create/update, so uniqueness checks are a dict lookup instead of a scan.
+    """
+
+    def __init__(self, entries=()):
+        self.entries = {}
+        self.rebuild(entries)
+
+    def rebuild(self, entries):
+        """
+        :param entries: iterable of (key, record_id) pairs
+        """
+        self.entries = dict(entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def is_taken(self, key, record_id=None):
+        """
+        True if key is owned by a record other than record_id.
+        """
+        owner = self.entries.get(key)
+        return owner is not None and owner != record_id
+
+    def add(self, key, record_id):
+        self.entries[key] = record_id
+
+    def remove(self, key):
+        self.entries.pop(key, None)
+
+    def replace(self, old_key, new_key, record_id):
+        if old_key != new_key:
+            self.remove(old_key)
+        self.add(new_key, record_id)
+
+
+# MembershipIndex class
+class MembershipIndex:
+    """
+    Reverse index of team membership: user_id -> set of team ids the user belongs to,
+    plus the members of each team it was given.
+    """
+
+    def __init__(self, teams=None):
+        self.entries = {}
+        self.members = {}
+        if teams:
+            self.rebuild(teams)
+
+    def rebuild(self, teams):
+        """
+        :param teams: iterable of (team_id, team) pairs, each team with a 'members' list
+        """
+        self.entries = {}
+        self.members = {}
+        for team_id, team in teams:
+            self.add(team_id, team['members'])
+
+    def teams_of(self, user_id):
+        return self.entries.get(user_id, set())
+
+    def members_of(self, team_id):
+        return self.members.get(team_id, set())
+
+    def add(self, team_id, user_ids):
+        for user_id in user_ids:
+            self.entries.setdefault(user_id, set()).add(team_id)
+        self.members.setdefault(team_id, set()).update(user_ids)
+
+    def remove(self, team_id, user_ids):
+        for user_id in user_ids:
+            team_ids = self.entries.get(user_id)
+            if team_ids is not None:
+                team_ids.discard(team_id)
+                if not team_ids:
+                    del self.entries[user_id]
+        members = self.members.get(team_id)
+        if members is not None:
+            members.difference_update(user_ids)
+            if not members:
+                del self.members[team_id]
+
+
+# TaskIndex class
+class TaskIndex:
+    """
+    Per-board task lookup: task_id -> position in the board's task list, task title ->
+    task_id for the uniqueness check, plus a live count of the board's tasks in each status.
+    """
+
+    def __init__(self, tasks=()):
+        self.positions = {}
+        self.titles = UniqueIndex()
+        self.status_counts = Counter()
+        for position, task in enumerate(tasks):
+            self.add(task, position)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def add(self, task, position):
+        self.positions[task['id']] = position
+        self.titles.add(task['title'], task['id'])
+        self.status_counts[task.get('status')] += 1
+
+    def position_of(self, task_id):
+        return self.positions.get(task_id)
+
+    def change_status(self, old_status, new_status):
+        self.status_counts[old_status] -= 1
+        self.status_counts[new_status] += 1
+
+    def incomplete_count(self):
+        return len(self.positions) - self.status_counts['COMPLETE']
+
+
+# TeamBoardIndex class
+class TeamBoardIndex:
+    """
+    team_id -> board ids in creation order, partitioned into OPEN and CLOSED boards.
+    """
+
+    def __init__(self, boards=None):
+        self.entries = {}
+        if boards:
+            self.rebuild(boards)
+
+    def rebuild(self, boards):
+        """
+        :param boards: iterable of (board_id, board) pairs
+        """
+        self.entries = {}
+        for board_id, board in boards:
+            self.add(board['team_id'], board_id, board.get('status', 'OPEN'))
+
+    def boards_of(self, team_id, status='OPEN'):
+        return self.entries.get(team_id, {}).get(status, [])
+
+    def add(self, team_id, board_id, status='OPEN'):
+        partitions = self.entries.setdefault(team_id, {'OPEN': [], 'CLOSED': []})
+        partitions[status].append(board_id)
+
+    def close(self, team_id, board_id):
+        partitions = self.entries[team_id]
+        partitions['OPEN'].remove(board_id)
+        partitions['CLOSED'].append(board_id)
+
+
+# TaskSearchIndex class
+class TaskSearchIndex:
+    """
+    Inverted index over the words of every task's title and description.
+
+    Tasks are numbered in the order they are indexed. Each word maps to the sorted
+    numbers of the tasks containing it, with a weight per task counting title words
+    double, so the postings of a million tasks take a few bytes per entry. The board,
+    position, assigned user and status of each task are kept alongside for filtering.
+
+    A board indexed again has its old task numbers marked dead and its tasks appended
+    under new ones, which keeps every posting list sorted. Once the dead numbers
+    outnumber the live ones the index is renumbered without them.
+    """
+
+    # Weights are stored in a byte each
+    MAX_WEIGHT = 255
+    TITLE_WEIGHT = 2
+
+    def __init__(self, boards=None):
+        self.postings = {}
+        self.board_of = []
+        self.position_of = array('l')
+        self.user_of = []
+        self.status_of = []
+        # board_id -> task number of each position
+        self.board_tasks = {}
+        # Numbers of tasks indexed again or removed since the last renumbering
+        self.dead = 0
+        if boards:
+            self.rebuild(boards)
+
+    def __len__(self):
+        return len(self.board_of) - self.dead
+
+    def rebuild(self, boards):
+        """
+        :param boards: iterable of (board_id, board) pairs
+        """
+        self.__init__()
+        for board_id, board in boards:
+            self.add_board(board_id, board['tasks'])
+
+    def add_board(self, board_id, tasks):
+        for position, task in enumerate(tasks):
+            self.add(board_id, position, task)
+
+    def update_board(self, board_id, tasks):
+        """
+        Index a board's tasks again, in place of the ones indexed for it before.
+
+        :param tasks: the board's tasks, None if the board is gone
+        """
+        numbers = self.board_tasks.pop(board_id, ())
+        for number in numbers:
+            self.board_of[number] = None
+        self.dead += len(numbers)
+        if tasks is not None:
+            self.add_board(board_id, tasks)
+        if self.dead > len(self):
+            self._renumber()
+
+    def add(self, board_id, position, task):
+        number = len(self.board_of)
+        self.board_of.append(board_id)
+        self.position_of.append(position)
+        self.user_of.append(task.get('user_id'))
+        self.status_of.append(task.get('status'))
+        self.board_tasks.setdefault(board_id, array('l')).append(number)
+        weights = {}
+        for word in tokenize(task.get('title', '')):
+            weights[word] = weights.get(word, 0) + self.TITLE_WEIGHT
+        for word in tokenize(task.get('description', '')):
+            weights[word] = weights.get(word, 0) + 1
+        postings = self.postings
+        for word, weight in weights.items():
+            entry = postings.get(word)
+            if entry is None:
+                entry = postings[word] = (array('l'), bytearray())
+            entry[0].append(number)
+            entry[1].append(weight if weight < self.MAX_WEIGHT else self.MAX_WEIGHT)
+
+    def change_status(self, board_id, position, status):
+        self.status_of[self.board_tasks[board_id][position]] = status
+
+    def search(self, query, board_ids=None, user_id=None, status=None, limit=None):
+        """
+        :param board_ids: only match tasks on these boards, None for any board
+        :param limit: rank only this many of the best matches, None for all of them
+        :return: ([(board_id, position, score)] of the best tasks containing all the words
+        of query and passing the filters, best match first; number of such tasks)
+        """
+        words = set(tokenize(query))
+        if not words:
+            raise ValueError("Query must contain at least one word")
+        entries = []
+        for word in words:
+            entry = self.postings.get(word)
+            if entry is None:
+                return [], 0
+            entries.append(entry)
+        # Walk the rarest word's tasks and look each one up in the other words' postings
+        entries.sort(key=lambda entry: len(entry[0]))
+        total = len(self)
+        idfs = [math.log(1 + total / len(numbers)) for numbers, _ in entries]
+        (first_numbers, first_weights), others = entries[0], entries[1:]
+        matches = []
+        for index, number in enumerate(first_numbers):
+            board_id = self.board_of[number]
+            if board_id is None or (board_ids is not None and board_id not in board_ids):
+                continue
+            if user_id is not None and self.user_of[number] != user_id:
+                continue
+            if status is not None and self.status_of[number] != status:
+                continue
+            score = first_weights[index] * idfs[0]
+            for (numbers, weights), idf in zip(others, idfs[1:]):
+                found = bisect_left(numbers, number)
+                if found == len(numbers) or numbers[found] != number:
+                    break
+                score += weights[found] * idf
+            else:
+                matches.append((-score, number))
+        # A page needs its own matches and the ones before it ranked, not all of them
+        ranked = sorted(matches) if limit is None else heapq.nsmallest(limit, matches)
+        return [(self.board_of[number], self.position_of[number], -score) for score, number in ranked], len(matches)
+
+    def _renumber(self):
+        live = [number for number, board_id in enumerate(self.board_of) if board_id is not None]
+        renumbered = dict(zip(live, range(len(live))))
+        for word, (numbers, weights) in list(self.postings.items()):
+            kept = [(renumbered[number], weight) for number, weight in zip(numbers, weights) if number in renumbered]
+            if kept:
+                self.postings[word] = (array('l', [number for number, _ in kept]),
+                                       bytearray(weight for _, weight in kept))
+            else:
+                del self.postings[word]
+        self.board_of = [self.board_of[number] for number in live]
+        self.position_of = array('l', [self.position_of[number] for number in live])
+        self.user_of = [self.user_of[number] for number in live]
+        self.status_of = [self.status_of[number] for number in live]
+        self.board_tasks = {board_id: array('l', [renumbered[number] for number in numbers])
+                            for board_id, numbers in self.board_tasks.items()}
+        self.dead = 0
+
+
+# TaskCounters class
+class TaskCounters:
+    """
+    Task counts by status for every user, board and team, plus each team's open and
+    closed boards and the incomplete tasks assigned to its current members.
+
+    Built once from every board, then moved by each task, board and membership change,
+    so the aggregates are read without scanning any task. A task is incomplete until
+    its status is COMPLETE. What each board adds to the counts is kept as well, so a
+    board reloaded from disk is swapped in with update_board() rather than a rebuild.
+    """
+
+    def __init__(self, membership=None, boards=None):
+        # MembershipIndex the member counts follow
+        self.membership = membership if membership is not None else MembershipIndex()
+        self.users = {}
+        self.boards = {}
+        self.teams = {}
+        # team_id -> Counter of board statuses
+        self.team_boards = {}
+        # team_id -> incomplete tasks assigned to its members
+        self.member_incomplete = Counter()
+        # board_id -> (team_id, board status), and Counter of its tasks' (user_id, status)
+        self.board_teams = {}
+        self.board_tasks = {}
+        if boards:
+            self.rebuild(boards)
+
+    def rebuild(self, boards):
+        """
+        :param boards: iterable of (board_id, board) pairs
+        """
+        self.__init__(self.membership)
+        for board_id, board in boards:
+            self.update_board(board_id, board)
+
+    def add_board(self, team_id, board_id, status='OPEN'):
+        self.boards.setdefault(board_id, Counter())
+        self.team_boards.setdefault(team_id, Counter())[status] += 1
+        self.board_teams[board_id] = (team_id, status)
+        self.board_tasks[board_id] = Counter()
+
+    def close_board(self, team_id, board_id):
+        boards = self.team_boards[team_id]
+        boards['OPEN'] -= 1
+        boards['CLOSED'] += 1
+        self.board_teams[board_id] = (team_id, 'CLOSED')
+
+    def update_board(self, board_id, board):
+        """
+        Take back what a board added to the counts, then count it as it is now.
+
+        :param board: the board, None if it is gone
+        """
+        if board_id in self.board_teams:
+            team_id, status = self.board_teams.pop(board_id)
+            self.team_boards[team_id][status] -= 1
+            for (user_id, task_status), count in self.board_tasks.pop(board_id).items():
+                self.move(team_id, board_id, user_id, task_status, -count)
+            del self.board_tasks[board_id]
+            del self.boards[board_id]
+        if board is not None:
+            self.add_board(board['team_id'], board_id, board.get('status', 'OPEN'))
+            for task in board['tasks']:
+                self.add_task(board['team_id'], board_id, task['user_id'], task.get('status'))
+
+    def add_task(self, team_id, board_id, user_id, status):
+        self.move(team_id, board_id, user_id, status, 1)
+
+    def change_status(self, team_id, board_id, user_id, old_status, new_status):
+        self.move(team_id, board_id, user_id, old_status, -1)
+        self.move(team_id, board_id, user_id, new_status, 1)
+
+    def move(self, team_id, board_id, user_id, status, delta):
+        self.users.setdefault(user_id, Counter())[status] += delta
+        self.boards.setdefault(board_id, Counter())[status] += delta
+        self.board_tasks.setdefault(board_id, Counter())[(user_id, status)] += delta
+        self.teams.setdefault(team_id, Counter())[status] += delta
+        if status != 'COMPLETE':
+            for member_team_id in self.membership.teams_of(user_id):
+                self.member_incomplete[member_team_id] += delta
+
+    def add_members(self, team_id, user_ids):
+        """
+        :param user_ids: users who were not already members
+        """
+        self.member_incomplete[team_id] += sum(self.incomplete(self.users, user_id) for user_id in user_ids)
+
+    def remove_members(self, team_id, user_ids):
+        """
+        :param user_ids: users who were members
+        """
+        self.member_incomplete[team_id] -= sum(self.incomplete(self.users, user_id) for user_id in user_ids)
+
+    def incomplete(self, counters, key):
+        counts = counters.get(key)
+        return sum(counts.values()) - counts['COMPLETE'] if counts else 0
+
+
+# Helper functions
+WORD = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return WORD.findall(text.lower())
@@ -0,0 +1,227 @@
+"""
+Per-method latency and I/O statistics for the managers.
+
+Disabled by default. enable() starts recording, for every public manager method, a
+call count, an error count and a latency histogram, plus the time and bytes spent
+loading and saving the stores and encoding and decoding json. snapshot() returns the
+numbers as a dict and prometheus() as Prometheus text exposition format.
+
+The same per-method hook runs the calls sampled by the profiling module.
+While both are disabled, each instrumented call costs two checks of module globals,
+and each store or json hook one.
+"""
+import functools
+import threading
+from bisect import bisect_left
+from time import perf_counter
+
+import codec
+import profiling
+
+# Upper bounds in seconds of the latency histogram buckets
+BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+           2.5, 5.0, 10.0)
+
+# The active Registry, None while disabled
+registry = None
+
+
+# Histogram class
+class Histogram:
+    __slots__ = ('counts', 'total', 'count', 'errors')
+
+    def __init__(self):
+        # counts[i] holds the observations in (BUCKETS[i - 1], BUCKETS[i]]; the last one those above every bound
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.errors = 0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def cumulative(self):
+        running = 0
+        for bound, count in zip(BUCKETS + (float('inf'),), self.counts):
+            running += count
+            yield bound, running
+
+
+# IoCounter class
+class IoCounter:
+    __slots__ = ('operations', 'seconds', 'bytes')
+
+    def __init__(self):
+        self.operations = 0
+        self.seconds = 0.0
+        self.bytes = 0
+
+
+# Registry class
+class Registry:
+    """
+    The statistics recorded since instrumentation was enabled or last reset.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # 'Manager.method' -> Histogram
+        self.methods = {}
+        # 'load' | 'save' | 'compact' -> IoCounter for the stores
+        self.io = {}
+        # 'encode' | 'decode' -> IoCounter for the json codec
+        self.codec = {}
+
+    def observe_call(self, name, seconds, failed):
+        with self.lock:
+            histogram = self.methods.get(name)
+            if histogram is None:
+                histogram = self.methods[name] = Histogram()
+            histogram.observe(seconds)
+            if failed:
+                histogram.errors += 1
+
+    def observe_io(self, counters, kind, seconds, size):
+        with self.lock:
+            counter = counters.get(kind)
+            if counter is None:
+                counter = counters[kind] = IoCounter()
+            counter.operations += 1
+            counter.seconds += seconds
+            counter.bytes += size
+
+
+# Helper functions
+def enable():
+    """
+    Start recording, keeping what was recorded before if already enabled.
+    """
+    global registry
+    if registry is None:
+        registry = Registry()
+    codec.observer = observe_codec
+
+
+def disable():
+    global registry
+    registry = None
+    codec.observer = None
+
+
+def reset():
+    global registry
+    if registry is not None:
+        registry = Registry()
+
+
+def instrumented(base):
+    """
+    Class decorator timing every method of a manager that implements a public method
+    of its base class.
+    """
+    def decorator(cls):
+        for name, member in vars(base).items():
+            if not name.startswith('_') and callable(member) and name in vars(cls):
+                setattr(cls, name, timed(f"{cls.__name__}.{name}", vars(cls)[name]))
+        return cls
+    return decorator
+
+
+def timed(name, method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        stats = registry
+        sampler = profiling.sampler
+        if stats is None and sampler is None:
+            return method(*args, **kwargs)
+        started = perf_counter()
+        failed = True
+        try:
+            if sampler is not None and sampler.should_sample():
+                result = sampler.run(name, method, args, kwargs)
+            else:
+                result = method(*args, **kwargs)
+            failed = False
+            return result
+        finally:
+            if stats is not None:
+                stats.observe_call(name, perf_counter() - started, failed)
+    return wrapper
+
+
+def record_io(kind, started, size):
+    """
+    Count a store operation of size bytes that began at perf_counter() time started.
+
+    :param kind: 'load', 'save' or 'compact'
+    """
+    stats = registry
+    if stats is not None:
+        stats.observe_io(stats.io, kind, perf_counter() - started, size)
+
+
+def observe_codec(kind, seconds, size):
+    stats = registry
+    if stats is not None:
+        stats.observe_io(stats.codec, kind, seconds, size)
+
+
+def snapshot():
+    """
+    :return: the statistics as a dict, or None while disabled
+    """
+    stats = registry
+    if stats is None:
+        return None
+    with stats.lock:
+        return {
+            "methods": {
+                name: {
+                    "calls": histogram.count,
+                    "errors": histogram.errors,
+                    "seconds": histogram.total,
+                    "buckets": {str(bound): count for bound, count in histogram.cumulative()},
+                }
+                for name, histogram in stats.methods.items()
+            },
+            "io": {kind: {"operations": counter.operations, "seconds": counter.seconds, "bytes": counter.bytes}
+                   for kind, counter in stats.io.items()},
+            "codec": {kind: {"operations": counter.operations, "seconds": counter.seconds, "bytes": counter.bytes}
+                      for kind, counter in stats.codec.items()},
+        }
+
+
+def prometheus():
+    """
+    :return: the statistics in Prometheus text exposition format, empty while disabled
+    """
+    stats = snapshot()
+    if stats is None:
+        return ''
+    lines = [
+        "# HELP planner_method_duration_seconds Latency of the manager methods.",
+        "# TYPE planner_method_duration_seconds histogram",
+    ]
+    for name, method in sorted(stats['methods'].items()):
+        for bound, count in method['buckets'].items():
+            le = '+Inf' if bound == 'inf' else bound
+            lines.append(f'planner_method_duration_seconds_bucket{{method="{name}",le="{le}"}} {count}')
+        lines.append(f'planner_method_duration_seconds_sum{{method="{name}"}} {method["seconds"]}')
+        lines.append(f'planner_method_duration_seconds_count{{method="{name}"}} {method["calls"]}')
+    lines += [
+        "# HELP planner_method_errors_total Manager method calls that raised.",
+        "# TYPE planner_method_errors_total counter",
+    ]
+    lines += [f'planner_method_errors_total{{method="{name}"}} {method["errors"]}'
+              for name, method in sorted(stats['methods'].items())]
+    for section, label, subject in (('io', 'op', 'store'), ('codec', 'op', 'json')):
+        for field, help_text in (('operations', 'Number of {} operations.'),
+                                 ('seconds', 'Seconds spent in {} operations.'),
+                                 ('bytes', 'Bytes processed by {} operations.')):
+            metric = f"planner_{section}_{field}_total"
+            lines += [f"# HELP {metric} {help_text.format(subject)}", f"# TYPE {metric} counter"]
+            lines += [f'{metric}{{{label}="{kind}"}} {counter[field]}'
+                      for kind, counter in sorted(stats[section].items())]
+    return '\n'.join(lines) + '\n'
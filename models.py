@@ -0,0 +1,257 @@
+import sys
+from collections.abc import MutableMapping
+from datetime import datetime, timedelta
+from enum import Enum
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+MICROSECONDS_PER_DAY = 86400 * 10 ** 6
+
+# Marks an unset slot in getattr lookups
+MISSING = object()
+
+
+# Status class
+class Status(str, Enum):
+    """
+    Board and task statuses. Members are str subclasses, so they compare equal to and
+    serialize as the plain strings the API uses, while each record shares one object.
+    """
+
+    OPEN = 'OPEN'
+    IN_PROGRESS = 'IN_PROGRESS'
+    COMPLETE = 'COMPLETE'
+    CLOSED = 'CLOSED'
+
+    __str__ = str.__str__
+    __format__ = str.__format__
+
+
+STATUSES = {status.value: status for status in Status}
+
+
+# Timestamp class
+class Timestamp(int):
+    """
+    Microseconds since the epoch that to_timestamp parsed from a date:time string. Being
+    their own type tells them apart from integers a client stored, which are exported
+    unchanged.
+    """
+
+    __slots__ = ()
+
+
+# Helper functions
+def to_timestamp(value):
+    """
+    Turn a naive ISO date:time string as written by datetime.isoformat() into integer
+    microseconds since the epoch. Strings in any other format are kept as is, so every
+    timestamp formats back to exactly the string it was created from.
+    """
+    # YYYY-MM-DDTHH:MM:SS, optionally followed by .ffffff with non-zero microseconds
+    if not isinstance(value, str) or len(value) not in (19, 26) or value[10] != 'T' \
+            or value[19:20] not in ('', '.') or value.endswith('.000000'):
+        return value
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        return value
+    delta = moment - EPOCH
+    return Timestamp(delta.days * MICROSECONDS_PER_DAY + delta.seconds * 10 ** 6 + delta.microseconds)
+
+
+def from_timestamp(value):
+    if type(value) is Timestamp:
+        return (EPOCH + value * MICROSECOND).isoformat()
+    return value
+
+
+def intern_str(value):
+    # sys.intern only takes exact strs; ids of any other type are kept as they are
+    return sys.intern(value) if type(value) is str else value
+
+
+def to_status(value):
+    # Unknown statuses are kept as plain strings rather than rejected
+    return STATUSES.get(value, value)
+
+
+def to_plain(value):
+    """
+    Turn a record, nested records included, into the plain dict it reads as, so it is
+    encoded in one pass instead of through a to_json call per nested record.
+    """
+    return value.to_dict() if isinstance(value, Record) else value
+
+
+def to_json(value):
+    """
+    default= hook for json.dumps, turning records and member sets into json values
+    that to_plain did not convert up front.
+    """
+    if isinstance(value, Record):
+        return value.to_dict()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+# Record class
+class Record(MutableMapping):
+    """
+    Slotted record that reads and writes like the dict it replaces.
+
+    The slots of a subclass are its FIELDS, converted on the way in by COERCE and back
+    to their API form on the way out by EXPORT, so callers keep indexing records with
+    string keys and get the same values as before. Keys outside FIELDS go to an extra
+    dict, created only for records that have any.
+    """
+
+    __slots__ = ('extra',)
+    FIELDS = ()
+    COERCE = {}
+    EXPORT = {}
+
+    def __init__(self, data=()):
+        self.extra = None
+        fields = self.FIELDS
+        coerce = self.COERCE
+        for key, value in (data if isinstance(data, dict) else dict(data)).items():
+            if key in fields:
+                setattr(self, key, coerce[key](value) if key in coerce else value)
+            else:
+                self[key] = value
+
+    @classmethod
+    def from_dict(cls, data):
+        return data if isinstance(data, cls) else cls(data)
+
+    def __getitem__(self, key):
+        if key in self.FIELDS:
+            try:
+                value = getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+            export = self.EXPORT.get(key)
+            return export(value) if export else value
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self.FIELDS:
+            coerce = self.COERCE.get(key)
+            setattr(self, key, coerce(value) if coerce else value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __delitem__(self, key):
+        if key in self.FIELDS:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self.extra and key in self.extra:
+            del self.extra[key]
+        else:
+            raise KeyError(key)
+
+    def __iter__(self):
+        # Declared order, matching the key order of the dicts the managers create
+        for field in self.__slots__:
+            if getattr(self, field, MISSING) is not MISSING:
+                yield field
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def to_dict(self):
+        data = {}
+        export = self.EXPORT
+        for field in self.__slots__:
+            value = getattr(self, field, MISSING)
+            if value is not MISSING:
+                data[field] = export[field](value) if field in export else value
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+
+# TaskList class
+class TaskList(list):
+    """
+    A board's tasks, turning task dicts into Task records as they are added.
+    """
+
+    __slots__ = ()
+
+    def append(self, task):
+        super().append(Task.from_dict(task))
+
+    def __setitem__(self, position, task):
+        super().__setitem__(position, Task.from_dict(task))
+
+
+TIMESTAMPS = {'creation_time': to_timestamp, 'end_time': to_timestamp}
+EXPORT_TIMESTAMPS = {'creation_time': from_timestamp, 'end_time': from_timestamp}
+
+
+# User class
+class User(Record):
+    __slots__ = ('name', 'display_name', 'creation_time')
+    FIELDS = frozenset(__slots__)
+    COERCE = TIMESTAMPS
+    EXPORT = EXPORT_TIMESTAMPS
+
+
+# Team class
+class Team(Record):
+    __slots__ = ('name', 'description', 'admin', 'id', 'creation_time', 'members')
+    FIELDS = frozenset(__slots__)
+    COERCE = {**TIMESTAMPS, 'admin': intern_str, 'id': intern_str,
+              'members': lambda members: set(map(intern_str, members))}
+    EXPORT = EXPORT_TIMESTAMPS
+
+    def to_dict(self):
+        data = super().to_dict()
+        if 'members' in data:
+            data['members'] = list(data['members'])
+        return data
+
+
+# Board class
+class Board(Record):
+    __slots__ = ('name', 'description', 'team_id', 'creation_time', 'tasks', 'status', 'end_time', 'version')
+    FIELDS = frozenset(__slots__)
+    COERCE = {**TIMESTAMPS, 'team_id': intern_str, 'status': to_status,
+              'tasks': lambda tasks: TaskList(map(Task.from_dict, tasks))}
+    EXPORT = EXPORT_TIMESTAMPS
+
+    def to_dict(self):
+        data = super().to_dict()
+        if 'tasks' in data:
+            data['tasks'] = [task.to_dict() if isinstance(task, Record) else task for task in data['tasks']]
+        return data
+
+
+# Task class
+class Task(Record):
+    __slots__ = ('id', 'title', 'description', 'user_id', 'creation_time', 'status')
+    FIELDS = frozenset(__slots__)
+    COERCE = {**TIMESTAMPS, 'id': intern_str, 'user_id': intern_str, 'status': to_status}
+    EXPORT = EXPORT_TIMESTAMPS
+
+
+# Collection name -> record class
+MODELS = {
+    'users': User,
+    'teams': Team,
+    'boards': Board,
+}
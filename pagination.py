@@ -0,0 +1,76 @@
+import base64
+
+import codec
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Most items a stream encodes under one read lock
+STREAM_BATCH = 1000
+
+
+# Helper functions
+def encode_cursor(position):
+    return base64.urlsafe_b64encode(str(position).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    :param cursor: a cursor returned by a previous page, or None for the first page
+    :return: the position the next page starts at
+    """
+    if cursor is None:
+        return 0
+    if not isinstance(cursor, str):
+        raise ValueError("Invalid cursor")
+    try:
+        position = int(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except ValueError:
+        position = -1
+    if position < 0:
+        raise ValueError("Invalid cursor")
+    return position
+
+
+def page_range(request_data):
+    """
+    :return: the (start, end) positions a page request asks for, before they are bound by
+    the number of items
+    """
+    limit = request_data.get('limit', DEFAULT_PAGE_SIZE)
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"Limit must be between 1 and {MAX_PAGE_SIZE}")
+    start = decode_cursor(request_data.get('cursor'))
+    return start, start + limit
+
+
+def page_bounds(request_data, total):
+    """
+    Resolve the limit and cursor of a page request into a (start, end, next_cursor) triple
+    of positions into a sequence of total items.
+    """
+    start, end = page_range(request_data)
+    end = min(end, total)
+    next_cursor = encode_cursor(end) if end < total else None
+    return start, end, next_cursor
+
+
+def stream_json_array(keys, item, reading, out):
+    """
+    Write a json list of the items of keys to out one item at a time, encoding them
+    STREAM_BATCH at a time. Each batch is encoded under reading(), a context manager
+    taking the read lock, and written once it is released, so a slow client holds up
+    no writer and only one batch is held in memory.
+
+    :param keys: the keys of the items, taken under the read lock
+    :param item: returns the item of a key
+    """
+    out.write('[')
+    separator = ''
+    for start in range(0, len(keys), STREAM_BATCH):
+        with reading():
+            chunks = [codec.dumps(item(key)) for key in keys[start:start + STREAM_BATCH]]
+        for chunk in chunks:
+            out.write(separator)
+            out.write(chunk)
+            separator = ','
+    out.write(']')
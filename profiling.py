@@ -0,0 +1,135 @@
+"""
+Opt-in sampling profiler for the manager methods.
+
+When enabled, a fraction of manager calls run under cProfile and tracemalloc. A
+sampled call that takes longer than the threshold has its profiles written to the
+output directory as <Manager.method>-<timestamp>.prof, readable with pstats or
+snakeviz, and <Manager.method>-<timestamp>.alloc.txt with its top allocation sites.
+
+Enable it from code with enable(), or for a whole process through the environment:
+
+    PLANNER_PROFILE_RATE=0.01 PLANNER_PROFILE_THRESHOLD_MS=50 PLANNER_PROFILE_DIR=profiles python server.py
+
+Only one call is profiled at a time, since tracemalloc traces the whole process;
+calls sampled while another one is being profiled run normally. Durations of
+profiled calls include the profilers' own overhead.
+"""
+import cProfile
+import os
+import random
+import threading
+import tracemalloc
+import warnings
+from datetime import datetime
+from time import perf_counter
+
+DEFAULT_THRESHOLD_MS = 100
+DEFAULT_DIR = 'profiles'
+# Allocation sites listed in each .alloc.txt
+TOP_ALLOCATIONS = 25
+
+# The active Sampler, None while disabled
+sampler = None
+
+
+# Sampler class
+class Sampler:
+    def __init__(self, rate, threshold_ms=DEFAULT_THRESHOLD_MS, out_dir=DEFAULT_DIR, memory=True):
+        if not 0 < rate <= 1:
+            raise ValueError("Sample rate must be in (0, 1]")
+        self.rate = rate
+        self.threshold = threshold_ms / 1000
+        self.out_dir = out_dir
+        self.memory = memory
+        self.lock = threading.Lock()
+        self.random = random.Random()
+        self.sampled = 0
+        self.dumped = 0
+
+    def should_sample(self):
+        return self.random.random() < self.rate
+
+    def run(self, name, method, args, kwargs):
+        """
+        Call method under the profilers if no other call is being profiled, else plainly.
+        """
+        if not self.lock.acquire(blocking=False):
+            return method(*args, **kwargs)
+        try:
+            self.sampled += 1
+            # Leave tracemalloc alone if someone else already started it
+            trace_memory = self.memory and not tracemalloc.is_tracing()
+            if trace_memory:
+                tracemalloc.start()
+            profile = cProfile.Profile()
+            started = perf_counter()
+            try:
+                return profile.runcall(method, *args, **kwargs)
+            finally:
+                seconds = perf_counter() - started
+                allocations = None
+                if trace_memory:
+                    allocations = (tracemalloc.take_snapshot(), tracemalloc.get_traced_memory()[1])
+                    tracemalloc.stop()
+                if seconds >= self.threshold:
+                    self.dump(name, seconds, profile, allocations)
+        finally:
+            self.lock.release()
+
+    def dump(self, name, seconds, profile, allocations):
+        os.makedirs(self.out_dir, exist_ok=True)
+        prefix = os.path.join(self.out_dir, f"{name}-{datetime.now().strftime('%Y%m%dT%H%M%S%f')}")
+        profile.dump_stats(prefix + '.prof')
+        if allocations is not None:
+            snapshot, peak = allocations
+            statistics = snapshot.statistics('lineno')[:TOP_ALLOCATIONS]
+            with open(prefix + '.alloc.txt', 'w') as file:
+                file.write(f"{name} took {seconds * 1000:.1f} ms, peak traced memory {peak} bytes\n")
+                file.write(f"Top {len(statistics)} allocation sites still held at return:\n")
+                for statistic in statistics:
+                    file.write(f"{statistic}\n")
+        self.dumped += 1
+
+    def stats(self):
+        return {"rate": self.rate, "threshold_ms": self.threshold * 1000, "out_dir": self.out_dir,
+                "sampled": self.sampled, "dumped": self.dumped}
+
+
+# Helper functions
+def enable(rate, threshold_ms=DEFAULT_THRESHOLD_MS, out_dir=DEFAULT_DIR, memory=True):
+    """
+    :param rate: fraction of calls to profile, in (0, 1]
+    :param threshold_ms: only calls at least this slow have their profiles written
+    :param out_dir: directory the profiles are written to
+    :param memory: also trace allocations with tracemalloc
+    """
+    global sampler
+    sampler = Sampler(rate, threshold_ms, out_dir, memory)
+    return sampler
+
+
+def disable():
+    global sampler
+    sampler = None
+
+
+def enable_from_environment(environ=os.environ):
+    """
+    Enable profiling if PLANNER_PROFILE_RATE is set, configured by PLANNER_PROFILE_THRESHOLD_MS,
+    PLANNER_PROFILE_DIR and PLANNER_PROFILE_MEMORY (0 to skip tracemalloc). Invalid
+    values leave profiling off with a warning rather than failing the import.
+    """
+    rate = environ.get('PLANNER_PROFILE_RATE')
+    try:
+        if not rate or float(rate) == 0:
+            return None
+        return enable(float(rate),
+                      float(environ.get('PLANNER_PROFILE_THRESHOLD_MS', DEFAULT_THRESHOLD_MS)),
+                      environ.get('PLANNER_PROFILE_DIR', DEFAULT_DIR),
+                      environ.get('PLANNER_PROFILE_MEMORY', '1') != '0')
+    except ValueError as error:
+        warnings.warn(f"Profiling left off, invalid PLANNER_PROFILE_* setting: {error}", RuntimeWarning)
+        return None
+
+
+enable_from_environment()
@@ -1,24 +1,21 @@
 import json
 import os
+import threading
+from bisect import bisect_right
 from datetime import datetime
 
-DB_DIR = 'db'
+import codec
+from cache import cached, id_tag
+from concurrency import reads, writes
+from exporters import (DEFAULT_FORMAT, DEFAULT_OUT_DIR, EXPORT_BATCH, check_format, export_file_name,
+                       export_parallel, load_manifest, save_manifest, snapshot, write_board)
+from indexes import TaskIndex, TaskSearchIndex, TeamBoardIndex, UniqueIndex
+from instrumentation import instrumented
+from pagination import encode_cursor, page_bounds, page_range, stream_json_array
+from repository import Repository
 
-if not os.path.exists(DB_DIR):
-    os.makedirs(DB_DIR)
-
-# Helper functions
-def load_data(file_name):
-    file_path = os.path.join(DB_DIR, file_name)
-    if os.path.exists(file_path):
-        with open(file_path, 'r') as file:
-            return json.load(file)
-    return {}
-
-def save_data(file_name, data):
-    file_path = os.path.join(DB_DIR, file_name)
-    with open(file_path, 'w') as file:
-        json.dump(data, file, indent=4)
+# Boards indexed under each read lock while the task search index is built, see search_index()
+SEARCH_BATCH = 256
 
 # ProjectBoardBase class
 class ProjectBoardBase:
@@ -45,6 +42,29 @@ class ProjectBoardBase:
         """
         pass
 
+    # create many boards at once
+    def create_boards_bulk(self, request: str) -> str:
+        """
+        :param request: A json string with the boards to create
+        {
+            "boards" : [
+                {
+                    "name" : "<board_name>",
+                    "description" : "<description>",
+                    "team_id" : "<team id>"
+                    "creation_time" : "<date:time when board was created>"
+                }
+            ]
+        }
+        :return: A json string with the response {"ids" : ["<board_id>"]}
+
+        Constraint:
+         * same constraints as create_board, checked for the whole batch first
+         * board names must also be unique for a team within the batch
+         * either every board is created or none is
+        """
+        pass
+
     # close a board
     def close_board(self, request: str) -> str:
         """
@@ -83,6 +103,30 @@ class ProjectBoardBase:
         """
         pass
 
+    # add many tasks to a board at once
+    def add_tasks_bulk(self, request: str) -> str:
+        """
+        :param request: A json string with the board and the tasks to add
+        {
+            "board_id" : "<board_id>",
+            "tasks" : [
+                {
+                    "title" : "<task_title>",
+                    "description" : "<description>",
+                    "user_id" : "<user_id>"
+                    "creation_time" : "<date:time when task was created>"
+                }
+            ]
+        }
+        :return: A json string with the response {"ids" : ["<task_id>"]}
+
+        Constraint:
+         * same constraints as add_task, checked for the whole batch first
+         * task titles must also be unique within the batch
+         * either every task is added or none is
+        """
+        pass
+
     # update the status of a task
     def update_task_status(self, request: str):
         """
@@ -94,6 +138,39 @@ class ProjectBoardBase:
         """
         pass
 
+    # find tasks by the words of their title and description
+    def search_tasks(self, request: str) -> str:
+        """
+        :param request: A json string with the words to look for, optional filters and the page to fetch
+        {
+          "query" : "<words every matching task contains, in any case>",
+          "board_id" : "<only tasks of this board>" (optional),
+          "team_id" : "<only tasks of this team's boards>" (optional),
+          "user_id" : "<only tasks assigned to this user>" (optional),
+          "status" : "OPEN | IN_PROGRESS | COMPLETE" (optional),
+          "limit" : <max tasks in the page, default 100>,
+          "cursor" : "<next_cursor of the previous page, omitted for the first page>"
+        }
+        :return: A json string with the response, best matches first. Words found in the
+        title count for more than words found in the description, and rare words for more
+        than common ones.
+        {
+          "tasks" : [
+            {
+              "board_id" : "<board_id>",
+              "id" : "<task_id>",
+              "title" : "<task_title>",
+              "description" : "<task_description>",
+              "user_id" : "<assigned user_id>",
+              "status" : "<task_status>",
+              "score" : <relevance of the task to the query>
+            }
+          ],
+          "next_cursor" : "<cursor of the next page, null on the last page>"
+        }
+        """
+        pass
+
     # list all open boards for a team
     def list_boards(self, request: str) -> str:
         """
@@ -112,13 +189,45 @@ class ProjectBoardBase:
         """
         pass
 
+    # list the boards of a team a page at a time
+    def list_boards_page(self, request: str) -> str:
+        """
+        :param request: A json string with the team identifier and the page to fetch
+        {
+          "id" : "<team_id>",
+          "limit" : <max boards in the page, default 100>,
+          "cursor" : "<next_cursor of the previous page, omitted for the first page>"
+        }
+        :return: A json string with the response
+        {
+          "boards" : [<same entries as list_boards>],
+          "next_cursor" : "<cursor of the next page, null on the last page>"
+        }
+        A cursor resumes after the last board of its page, so closing boards between two
+        pages never skips an open board.
+        """
+        pass
+
+    # write the boards of a team as a json list to a file-like object
+    def stream_boards(self, request: str, out):
+        """
+        :param request: A json string with the team identifier
+        {
+          "id" : "<team_id>"
+        }
+        :param out: A writable text file-like object. The same json list as list_boards is
+        written to it incrementally, one board at a time.
+        """
+        pass
+
     def export_board(self, request: str) -> str:
         """
         Export a board in the out folder. The output will be a txt file.
         We want you to be creative. Output a presentable view of the board and its tasks with the available data.
         :param request:
         {
-          "id" : "<board_id>"
+          "id" : "<board_id>",
+          "format" : "txt | md | csv | html | ndjson, default txt"
         }
         :return:
         {
@@ -127,103 +236,414 @@ class ProjectBoardBase:
         """
         pass
 
+    # export many boards at once, in parallel, skipping the ones unchanged since their last export
+    def export_boards(self, request: str) -> str:
+        """
+        Export boards in the out folder, one file per board, as export_board does.
+        A board whose file is still there and which has not changed since export_boards
+        last wrote it is skipped, unless force is set.
+        :param request:
+        {
+          "ids" : ["<board_id>", ...] (optional, all boards when omitted),
+          "format" : "txt | md | csv | html | ndjson, default txt",
+          "force" : <true to rewrite every file, default false>
+        }
+        :return:
+        {
+          "out_files" : ["<name of a file created>", ...],
+          "skipped" : ["<board_id of an unchanged board>", ...]
+        }
+        """
+        pass
+
 # ProjectBoardManager class
+@instrumented(ProjectBoardBase)
 class ProjectBoardManager(ProjectBoardBase):
-    def __init__(self):
-        self.boards_file = 'boards.json'
-        self.boards = load_data(self.boards_file)
+    # Directory exports are written to, and processes used by export_boards (None for one per cpu)
+    out_dir = DEFAULT_OUT_DIR
+    export_workers = None
+
+    def __init__(self, repository=None, backend=None):
+        self.repository = repository or Repository(backend)
+        self.store, self.boards = self.repository.open('boards')
+        self.guard = self.repository.guard
+        # (team_id, board name) -> board_id
+        self.board_name_index = UniqueIndex()
+        # board_id -> task positions, titles and status counters, see task_index()
+        self.task_indexes = {}
+        self.team_boards = TeamBoardIndex()
+        # Words of every task's title and description, see search_index()
+        self.task_search = None
+        self.search_lock = threading.Lock()
+        # Serializes export_boards calls, which share the export manifest
+        self.export_lock = threading.Lock()
+        self.rebuild_indexes()
+        self.repository.on_reload(self.rebuild_indexes)
+
+    def rebuild_indexes(self, changes=None):
+        """
+        :param changes: collection name -> ids of the records reloaded, None to build from scratch
+        """
+        if changes is not None and 'boards' not in changes:
+            return
+        # Built from the summaries, which are in memory
+        summaries = list(self.store.summaries())
+        self.board_name_index.rebuild(((board['team_id'], board['name']), board_id) for board_id, board in summaries)
+        self.team_boards.rebuild(summaries)
+        if changes is None:
+            self.task_indexes = {}
+            return
+        for board_id in changes['boards']:
+            self.task_indexes.pop(board_id, None)
+            if self.task_search is not None:
+                self.task_search.update_board(board_id, self.boards[board_id]['tasks'] if board_id in self.boards
+                                              else None)
+
+    def board_version(self, board_id):
+        # Boards created before versions were tracked count as version 0
+        return self.store.summary(board_id).get('version', 0)
+
+    def next_version(self, board_id):
+        """
+        The (path, value) pair bumping a board's version, written with every change to
+        its tasks or status so exports can tell which boards changed.
+        """
+        return [board_id, 'version'], self.board_version(board_id) + 1
+
+    def task_index(self, board_id):
+        # Built the first time a board's tasks are needed, so boards never touched stay on disk
+        index = self.task_indexes.get(board_id)
+        if index is None:
+            index = self.task_indexes[board_id] = TaskIndex(self.boards[board_id]['tasks'])
+        return index
 
+    def search_index(self):
+        """
+        The task search index, built by the first search, since indexing every task
+        loads every board. Call without holding the guard: boards are indexed
+        SEARCH_BATCH at a time, each batch under a read lock of its own, and the
+        boards written in the meantime are indexed again before the index is used.
+        """
+        with self.search_lock:
+            if self.task_search is not None:
+                return self.task_search
+            index = TaskSearchIndex()
+            with self.guard.reading():
+                board_ids = list(self.boards)
+            # Version of each board as indexed
+            indexed = {}
+            for start in range(0, len(board_ids), SEARCH_BATCH):
+                with self.guard.reading():
+                    for board_id in board_ids[start:start + SEARCH_BATCH]:
+                        if board_id in self.boards:
+                            indexed[board_id] = self.board_version(board_id)
+                            index.add_board(board_id, self.boards[board_id]['tasks'])
+            with self.guard.reading():
+                # Every change to a board's tasks bumps its version
+                for board_id in self.boards:
+                    if indexed.pop(board_id, None) != self.board_version(board_id):
+                        index.update_board(board_id, self.boards[board_id]['tasks'])
+                for board_id in indexed:
+                    index.update_board(board_id, None)
+                # Kept up to date by the writers from now on
+                self.task_search = index
+            return index
+
+    @writes
     def create_board(self, request: str) -> str:
-        board_data = json.loads(request)
+        board_data = codec.loads(request)
         board_id = str(len(self.boards) + 1)
-        for board in self.boards.values():
-            if board_data['name'] == board['name'] and board_data['team_id'] == board['team_id']:
-                raise ValueError("Board name must be unique for the team")
+        if (board_data['team_id'], board_data['name']) in self.board_name_index:
+            raise ValueError("Board name must be unique for the team")
         if len(board_data['name']) > 64 or len(board_data['description']) > 128:
             raise ValueError("Board name or description exceeds max length")
-        self.boards[board_id] = {
+        self.repository.require_team(board_data['team_id'])
+        self.store.set([board_id], {
             "name": board_data['name'],
             "description": board_data['description'],
             "team_id": board_data['team_id'],
             "creation_time": board_data['creation_time'],
             "tasks": []
-        }
-        save_data(self.boards_file, self.boards)
-        return json.dumps({"id": board_id})
-
+        })
+        self.board_name_index.add((board_data['team_id'], board_data['name']), board_id)
+        self.team_boards.add(board_data['team_id'], board_id)
+        self.task_indexes[board_id] = TaskIndex()
+        if self.repository.task_counters is not None:
+            self.repository.task_counters.add_board(board_data['team_id'], board_id)
+        self.repository.invalidate(('team_boards', board_data['team_id']), ('board', board_id))
+        return codec.dumps({"id": board_id})
+
+    @writes
+    def create_boards_bulk(self, request: str) -> str:
+        boards = codec.loads(request)['boards']
+        batch_keys = set()
+        for board_data in boards:
+            key = (board_data['team_id'], board_data['name'])
+            if key in self.board_name_index or key in batch_keys:
+                raise ValueError("Board name must be unique for the team")
+            if len(board_data['name']) > 64 or len(board_data['description']) > 128:
+                raise ValueError("Board name or description exceeds max length")
+            self.repository.require_team(board_data['team_id'])
+            batch_keys.add(key)
+
+        first_id = len(self.boards) + 1
+        board_ids = [str(first_id + offset) for offset in range(len(boards))]
+        self.store.set_many([
+            ([board_id], {
+                "name": board_data['name'],
+                "description": board_data['description'],
+                "team_id": board_data['team_id'],
+                "creation_time": board_data['creation_time'],
+                "tasks": []
+            })
+            for board_id, board_data in zip(board_ids, boards)
+        ])
+        for board_id, board_data in zip(board_ids, boards):
+            self.board_name_index.add((board_data['team_id'], board_data['name']), board_id)
+            self.team_boards.add(board_data['team_id'], board_id)
+            self.task_indexes[board_id] = TaskIndex()
+            if self.repository.task_counters is not None:
+                self.repository.task_counters.add_board(board_data['team_id'], board_id)
+            self.repository.invalidate(('team_boards', board_data['team_id']), ('board', board_id))
+        return codec.dumps({"ids": board_ids})
+
+    @writes
     def close_board(self, request: str) -> str:
-        board_id = json.loads(request)['id']
+        board_id = codec.loads(request)['id']
         board = self.boards.get(board_id)
         if board:
+            if board.get('status') == 'CLOSED':
+                return codec.dumps({"error": "Board already closed"})
             # Check if all tasks are marked as COMPLETE
-            if all(task.get('status') == 'COMPLETE' for task in board['tasks']):
-                board['status'] = 'CLOSED'
-                board['end_time'] = datetime.now().isoformat()
-                save_data(self.boards_file, self.boards)
-                return json.dumps({"status": "Board closed"})
+            if self.task_index(board_id).incomplete_count() == 0:
+                self.store.set_many([
+                    ([board_id, 'status'], 'CLOSED'),
+                    ([board_id, 'end_time'], datetime.now().isoformat()),
+                    self.next_version(board_id),
+                ])
+                self.team_boards.close(board['team_id'], board_id)
+                if self.repository.task_counters is not None:
+                    self.repository.task_counters.close_board(board['team_id'], board_id)
+                self.repository.invalidate(('team_boards', board['team_id']), ('board', board_id))
+                return codec.dumps({"status": "Board closed"})
             else:
-                return json.dumps({"error": "Cannot close board, some tasks are not complete"})
+                return codec.dumps({"error": "Cannot close board, some tasks are not complete"})
         else:
-            return json.dumps({"error": "Board not found"})
+            return codec.dumps({"error": "Board not found"})
 
+    @writes
     def add_task(self, request: str) -> str:
-        task_data = json.loads(request)
+        task_data = codec.loads(request)
         board_id = task_data['board_id']
+        self.repository.require_board(board_id)
         task_id = str(len(self.boards[board_id]['tasks']) + 1)
         # Check if task title is unique for the board
-        if any(task['title'] == task_data['title'] for task in self.boards[board_id]['tasks']):
+        if task_data['title'] in self.task_index(board_id).titles:
             raise ValueError("Task title must be unique for the board")
         if len(task_data['title']) > 64 or len(task_data['description']) > 128:
             raise ValueError("Task title or description exceeds max length")
-        self.boards[board_id]['tasks'].append({
+        self.repository.require_users([task_data['user_id']])
+        position = len(self.boards[board_id]['tasks'])
+        task = {
             "id": task_id,
             "title": task_data['title'],
             "description": task_data['description'],
             "user_id": task_data['user_id'],
             "creation_time": task_data['creation_time'],
             "status": "OPEN"
-        })
-        save_data(self.boards_file, self.boards)
-        return json.dumps({"id": task_id})
-
+        }
+        # Setting the slot one past the end appends the task
+        self.store.set_many([([board_id, 'tasks', position], task), self.next_version(board_id)])
+        self.task_index(board_id).add(task, position)
+        if self.task_search is not None:
+            self.task_search.add(board_id, position, task)
+        if self.repository.task_counters is not None:
+            self.repository.task_counters.add_task(self.store.summary(board_id)['team_id'], board_id, task['user_id'],
+                                                   task['status'])
+        self.repository.invalidate(('board', board_id))
+        return codec.dumps({"id": task_id})
+
+    @writes
+    def add_tasks_bulk(self, request: str) -> str:
+        request_data = codec.loads(request)
+        board_id = request_data['board_id']
+        tasks = request_data['tasks']
+        self.repository.require_board(board_id)
+        batch_titles = set()
+        for task_data in tasks:
+            if task_data['title'] in self.task_index(board_id).titles or task_data['title'] in batch_titles:
+                raise ValueError("Task title must be unique for the board")
+            if len(task_data['title']) > 64 or len(task_data['description']) > 128:
+                raise ValueError("Task title or description exceeds max length")
+            self.repository.require_users([task_data['user_id']])
+            batch_titles.add(task_data['title'])
+
+        first_index = len(self.boards[board_id]['tasks'])
+        task_ids = [str(first_index + offset + 1) for offset in range(len(tasks))]
+        self.store.set_many([
+            ([board_id, 'tasks', first_index + offset], {
+                "id": task_id,
+                "title": task_data['title'],
+                "description": task_data['description'],
+                "user_id": task_data['user_id'],
+                "creation_time": task_data['creation_time'],
+                "status": "OPEN"
+            })
+            for offset, (task_id, task_data) in enumerate(zip(task_ids, tasks))
+        ] + [self.next_version(board_id)])
+        board_tasks = self.boards[board_id]['tasks']
+        task_index = self.task_index(board_id)
+        counters = self.repository.task_counters
+        team_id = self.store.summary(board_id)['team_id']
+        for position in range(first_index, first_index + len(tasks)):
+            task_index.add(board_tasks[position], position)
+            if self.task_search is not None:
+                self.task_search.add(board_id, position, board_tasks[position])
+            if counters is not None:
+                counters.add_task(team_id, board_id, board_tasks[position]['user_id'], board_tasks[position]['status'])
+        self.repository.invalidate(('board', board_id))
+        return codec.dumps({"ids": task_ids})
+
+    @writes
     def update_task_status(self, request: str):
-        task_data = json.loads(request)
+        task_data = codec.loads(request)
         board_id = task_data['board_id']
         task_id = task_data['task_id']
         status = task_data['status']
-        task = next((t for t in self.boards[board_id]['tasks'] if t['id'] == task_id), None)
-        if task:
-            task['status'] = status
-            save_data(self.boards_file, self.boards)
-            return json.dumps({"status": "Task status updated"})
+        self.repository.require_board(board_id)
+        position = self.task_index(board_id).position_of(task_id)
+        if position is not None:
+            task = self.boards[board_id]['tasks'][position]
+            old_status = task['status']
+            self.store.set_many([([board_id, 'tasks', position, 'status'], status), self.next_version(board_id)])
+            self.task_index(board_id).change_status(old_status, status)
+            if self.task_search is not None:
+                self.task_search.change_status(board_id, position, status)
+            if self.repository.task_counters is not None:
+                self.repository.task_counters.change_status(self.store.summary(board_id)['team_id'], board_id,
+                                                            task['user_id'], old_status, status)
+            self.repository.invalidate(('board', board_id))
+            return codec.dumps({"status": "Task status updated"})
         else:
-            return json.dumps({"error": "Task not found"})
-
+            return codec.dumps({"error": "Task not found"})
+
+    def search_tasks(self, request: str) -> str:
+        request_data = codec.loads(request)
+        # Taken before the read lock, since a first search builds the index batch by batch
+        index = self.search_index()
+        with self.guard.reading():
+            return self.search_page(index, request_data)
+
+    def search_page(self, index, request_data):
+        board_ids = None
+        if 'team_id' in request_data:
+            team_id = request_data['team_id']
+            board_ids = {*self.team_boards.boards_of(team_id, 'OPEN'), *self.team_boards.boards_of(team_id, 'CLOSED')}
+        if 'board_id' in request_data:
+            board_ids = {request_data['board_id']} & board_ids if board_ids is not None else {request_data['board_id']}
+        matches, total = index.search(request_data['query'], board_ids, request_data.get('user_id'),
+                                                    request_data.get('status'), page_range(request_data)[1])
+        start, end, next_cursor = page_bounds(request_data, total)
+        tasks = []
+        for board_id, position, score in matches[start:end]:
+            task = self.boards[board_id]['tasks'][position]
+            tasks.append({"board_id": board_id, "id": task['id'], "title": task['title'],
+                          "description": task['description'], "user_id": task['user_id'],
+                          "status": task['status'], "score": round(score, 6)})
+        return codec.dumps({"tasks": tasks, "next_cursor": next_cursor})
+
+    @reads
+    @cached(id_tag('team_boards'))
     def list_boards(self, request: str) -> str:
-        team_id = json.loads(request)['id']
-        team_boards = [{"id": board_id, "name": board['name']} for board_id, board in self.boards.items() if board['team_id'] == team_id]
-        return json.dumps(team_boards, indent=4)
+        team_id = codec.loads(request)['id']
+        team_boards = [
+            {"id": board_id, "name": self.store.summary(board_id)['name']}
+            for board_id in self.team_boards.boards_of(team_id)
+        ]
+        return codec.dumps(team_boards)
+
+    @reads
+    @cached(id_tag('team_boards'))
+    def list_boards_page(self, request: str) -> str:
+        request_data = codec.loads(request)
+        board_ids = self.team_boards.boards_of(request_data['id'])
+        # The cursor holds the last board id returned rather than a position, so boards closed
+        # between two pages shift none of the others. Ids grow in the creation order boards_of keeps
+        last_id, end = page_range(request_data)
+        start = bisect_right(board_ids, last_id, key=int)
+        page_ids = board_ids[start:start + end - last_id]
+        next_cursor = encode_cursor(page_ids[-1]) if start + len(page_ids) < len(board_ids) else None
+        boards = [{"id": board_id, "name": self.store.summary(board_id)['name']} for board_id in page_ids]
+        return codec.dumps({"boards": boards, "next_cursor": next_cursor})
+
+    def stream_boards(self, request: str, out):
+        team_id = codec.loads(request)['id']
+        with self.guard.reading():
+            board_ids = list(self.team_boards.boards_of(team_id))
+        stream_json_array(board_ids, lambda board_id: {"id": board_id, "name": self.store.summary(board_id)['name']},
+                          self.guard.reading, out)
 
     def export_board(self, request: str) -> str:
-        board_id = json.loads(request)['id']
-        board = self.boards.get(board_id)
+        request_data = codec.loads(request)
+        board_id = request_data['id']
+        export_format = request_data.get('format', DEFAULT_FORMAT)
+        check_format(export_format)
+        # Copied under the read lock, so writers are not held up while the file is written
+        with self.guard.reading():
+            board = self.boards.get(board_id)
+            board = snapshot(board) if board else None
         if board:
-            out_file_name = f"board_{board_id}.txt"
-            with open(os.path.join("out", out_file_name), 'w') as out_file:
-                out_file.write(f"Board Name: {board['name']}\n")
-                out_file.write(f"Board Description: {board['description']}\n")
-                out_file.write(f"Team ID: {board['team_id']}\n")
-                out_file.write("Tasks:\n")
-                for task in board['tasks']:
-                    out_file.write(f"- Task ID: {task['id']}\n")
-                    out_file.write(f"  Title: {task['title']}\n")
-                    out_file.write(f"  Description: {task['description']}\n")
-                    out_file.write(f"  Assigned User ID: {task['user_id']}\n")
-                    out_file.write(f"  Creation Time: {task['creation_time']}\n")
-                    out_file.write(f"  Status: {task['status']}\n\n")
-            return json.dumps({"out_file": out_file_name})
+            os.makedirs(self.out_dir, exist_ok=True)
+            out_file_name = write_board(self.out_dir, board_id, board, export_format)
+            return codec.dumps({"out_file": out_file_name})
         else:
-            return json.dumps({"error": "Board not found"})
+            return codec.dumps({"error": "Board not found"})
+
+    def snapshot_batches(self, board_ids):
+        """
+        Copy the boards EXPORT_BATCH at a time, each batch under the read lock, which is
+        released before the batch is handed out so writers are not held up while the
+        files are written.
+        """
+        for start in range(0, len(board_ids), EXPORT_BATCH):
+            with self.guard.reading():
+                batch = [(board_id, snapshot(self.boards[board_id]))
+                         for board_id in board_ids[start:start + EXPORT_BATCH]]
+            yield batch
+
+    def export_boards(self, request: str) -> str:
+        request_data = codec.loads(request)
+        export_format = request_data.get('format', DEFAULT_FORMAT)
+        check_format(export_format)
+        board_ids = request_data.get('ids')
+        force = request_data.get('force', False)
+        with self.export_lock:
+            os.makedirs(self.out_dir, exist_ok=True)
+            manifest = load_manifest(self.out_dir)
+            exported = manifest.setdefault(export_format, {})
+            existing_files = set(os.listdir(self.out_dir))
+            with self.guard.reading():
+                if board_ids is None:
+                    board_ids = list(self.boards)
+                missing = [board_id for board_id in board_ids if board_id not in self.boards]
+                if missing:
+                    return codec.dumps({"error": f"Board not found: {', '.join(missing)}"})
+                # Versions come from the summaries, so unchanged boards are never loaded
+                versions = {board_id: self.board_version(board_id) for board_id in board_ids}
+                changed = [
+                    board_id for board_id in board_ids
+                    if force or exported.get(board_id) != versions[board_id]
+                    or export_file_name(board_id, export_format) not in existing_files
+                ]
+            out_files = export_parallel(self.out_dir, export_format, self.snapshot_batches(changed),
+                                        self.export_workers)
+            for board_id in changed:
+                exported[board_id] = versions[board_id]
+            if changed:
+                save_manifest(self.out_dir, manifest)
+        changed = set(changed)
+        skipped = [board_id for board_id in board_ids if board_id not in changed]
+        return codec.dumps({"out_files": out_files, "skipped": skipped})
 
 # Usage Example
 if __name__ == "__main__":
@@ -0,0 +1,189 @@
+import threading
+from contextlib import ExitStack, contextmanager
+
+from concurrency import ConcurrencyGuard
+from indexes import MembershipIndex, TaskCounters
+from storage import Compactor, JsonBackend, WriteBehind
+
+COLLECTIONS = ('users', 'teams', 'boards')
+
+
+# Repository class
+class Repository:
+    """
+    One in-memory copy of users, teams and boards shared by the managers.
+
+    Hand the same repository to UserManager, TeamManager and ProjectBoardManager so each
+    collection is loaded once, every manager sees the others' changes immediately and
+    cross-entity references are checked against memory. Collections are loaded the first
+    time a manager opens them. All managers on a repository share one ConcurrencyGuard.
+
+    Pass a ResponseCache to serve repeated describe/list calls from memory; the
+    managers invalidate it as they write. When another process's writes are loaded,
+    only the responses built from the records they changed are dropped, and the task
+    counters and membership index are moved for those records alone.
+
+    Logs due for compaction are compacted by a background Compactor rather than by
+    the write that made them due.
+
+    Pass write_behind, in seconds, to keep writes in memory and have them flushed in
+    the background that long after the first one, see WriteBehind. flush() and close()
+    write out what is pending.
+    """
+
+    def __init__(self, backend=None, cache=None, write_behind=None):
+        self.backend = backend or JsonBackend()
+        self.cache = cache
+        self.stores = {}
+        self.data = {}
+        self.reload_hooks = []
+        self.open_lock = threading.Lock()
+        # user_id -> team ids, used by both the user and the team manager
+        self.membership_index = MembershipIndex()
+        # Task counts by user, board and team, see counters()
+        self.task_counters = None
+        self.counters_lock = threading.Lock()
+        self.guard = ConcurrencyGuard(self.backend, [], self.reload)
+        self.compactor = Compactor(self.guard.writing)
+        # Flushes the stores' writes in the background while set; writers are locked out as it writes
+        self.flusher = WriteBehind(write_behind, self.guard.writing) if write_behind is not None else None
+
+    def open(self, name):
+        """
+        :param name: one of 'users', 'teams' or 'boards'
+        :return: (store, data) for the collection, loading it on first use
+        """
+        if name not in COLLECTIONS:
+            raise ValueError(f"Unknown collection: {name}")
+        with self.open_lock:
+            if name not in self.stores:
+                store = self.backend.open(name)
+                with self.guard.loading():
+                    self.data[name] = store.load()
+                store.load_inside(self.guard.loading)
+                store.compact_in_background(self.compactor)
+                if self.flusher is not None:
+                    store.defer_writes(self.flusher)
+                if name == 'teams':
+                    self.membership_index.rebuild(store.summaries())
+                self.stores[name] = store
+                self.guard.stores.append(store)
+            return self.stores[name], self.data[name]
+
+    @property
+    def users(self):
+        return self.open('users')[1]
+
+    @property
+    def teams(self):
+        return self.open('teams')[1]
+
+    @property
+    def boards(self):
+        return self.open('boards')[1]
+
+    def counters(self):
+        """
+        :return: the TaskCounters of every board, built on first use since that loads every board
+        """
+        with self.counters_lock:
+            if self.task_counters is None:
+                # Member counts need the membership index, filled when teams are opened
+                self.open('teams')
+                self.task_counters = TaskCounters(self.membership_index, self.boards.items())
+            return self.task_counters
+
+    def on_reload(self, hook):
+        """
+        Register a callable run after another process's writes have been loaded, so
+        derived state such as indexes can be brought up to date. It is passed
+        {collection name: set of ids of the records written}.
+        """
+        self.reload_hooks.append(hook)
+
+    def reload(self, store_changes):
+        """
+        :param store_changes: {store: ids of the records another process wrote}, see ConcurrencyGuard
+        """
+        changes = {name: store_changes[store] for name, store in self.stores.items() if store in store_changes}
+        tags = []
+        for user_id in changes.get('users', ()):
+            tags += [('users',), ('user', user_id)]
+        teams = self.data.get('teams', {})
+        for team_id in changes.get('teams', ()):
+            tags += [('teams',), ('team', team_id), ('team_members', team_id)]
+            tags += [('user_teams', user_id) for user_id in self.update_members(
+                team_id, self.stores['teams'].summary(team_id)['members'] if team_id in teams else ())]
+        boards = self.data.get('boards', {})
+        for board_id in changes.get('boards', ()):
+            if board_id in boards:
+                tags += [('board', board_id), ('team_boards', self.stores['boards'].summary(board_id)['team_id'])]
+            elif self.cache is not None:
+                # Deleted, which the managers never do, so the team that listed it is not known
+                self.cache.clear()
+            if self.task_counters is not None:
+                self.task_counters.update_board(board_id, boards[board_id] if board_id in boards else None)
+        self.invalidate(*tags)
+        for hook in self.reload_hooks:
+            hook(changes)
+
+    def update_members(self, team_id, members):
+        """
+        Bring the membership index and task counters up to date with a team's members as reloaded.
+
+        :return: the users who joined or left the team
+        """
+        old = set(self.membership_index.members_of(team_id))
+        added, removed = set(members) - old, old - set(members)
+        if self.task_counters is not None:
+            self.task_counters.remove_members(team_id, removed)
+        self.membership_index.remove(team_id, removed)
+        self.membership_index.add(team_id, added)
+        if self.task_counters is not None:
+            self.task_counters.add_members(team_id, added)
+        return added | removed
+
+    @contextmanager
+    def batch(self):
+        """
+        Flush the writes made to every open collection inside the block together.
+        """
+        with ExitStack() as stack:
+            for store in list(self.stores.values()):
+                stack.enter_context(store.batch())
+            yield
+
+    def invalidate(self, *tags):
+        """
+        Drop cached responses built from the data named by tags, see ResponseCache.
+        """
+        if self.cache is not None:
+            self.cache.invalidate(*tags)
+
+    def require_users(self, user_ids):
+        users = self.users
+        missing = [user_id for user_id in user_ids if user_id not in users]
+        if missing:
+            raise ValueError(f"User not found: {', '.join(missing)}")
+
+    def require_team(self, team_id):
+        if team_id not in self.teams:
+            raise ValueError(f"Team not found: {team_id}")
+
+    def require_board(self, board_id):
+        if board_id not in self.boards:
+            raise ValueError(f"Board not found: {board_id}")
+
+    def flush(self):
+        """
+        Write out and fsync the writes still pending in write-behind mode.
+        """
+        if self.flusher is not None:
+            self.flusher.flush()
+
+    def close(self):
+        if self.flusher is not None:
+            self.flusher.close()
+        self.compactor.close()
+        for store in self.stores.values():
+            store.close()
@@ -0,0 +1,477 @@
+"""
+HTTP/JSON front-end for the planner APIs.
+
+Every public method of UserBase, TeamBase, ProjectBoardBase and AnalyticsBase is served at
+POST /<collection>/<method>, with the method's json request as the body and its json
+response as the reply:
+
+    python server.py --port 8080 --workers 16
+    curl -d '{"name": "jane", "display_name": "Jane"}' localhost:8080/users/create_user
+
+The stream_* methods reply with a chunked body. GET /health reports liveness and
+GET /metrics request counts, latencies and cache statistics; with --instrument,
+GET /metrics/prometheus exposes the manager, store and codec statistics of the
+instrumentation module in Prometheus text format. Connections are kept
+alive between requests; one pool of worker threads serves them all over one shared
+Repository, and an idle connection waits in a selector instead of holding a worker.
+"""
+import argparse
+import inspect
+import os
+import selectors
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import codec
+import instrumentation
+import profiling
+from analytics import AnalyticsBase, AnalyticsManager
+from cache import ResponseCache
+from project_board_base import ProjectBoardBase, ProjectBoardManager
+from repository import Repository
+from storage import JsonBackend, SqliteBackend
+from team_base import TeamBase, TeamManager
+from user_base import UserBase, UserManager
+
+DEFAULT_WORKERS = 16
+DEFAULT_MAX_BODY = 1024 * 1024
+# Seconds an idle keep-alive connection is kept open
+DEFAULT_KEEP_ALIVE = 5
+# Bytes gathered before a chunk of a streamed response is sent
+STREAM_CHUNK = 64 * 1024
+
+# Collection -> (base class defining the API, manager implementing it)
+APIS = {
+    'users': (UserBase, UserManager),
+    'teams': (TeamBase, TeamManager),
+    'boards': (ProjectBoardBase, ProjectBoardManager),
+    'analytics': (AnalyticsBase, AnalyticsManager),
+}
+
+
+# Route class
+class Route:
+    __slots__ = ('method', 'takes_request', 'streams', 'calls', 'errors', 'seconds')
+
+    def __init__(self, method, takes_request, streams):
+        self.method = method
+        self.takes_request = takes_request
+        self.streams = streams
+        self.calls = 0
+        self.errors = 0
+        self.seconds = 0.0
+
+
+# PlannerService class
+class PlannerService:
+    """
+    The managers behind the server, their routes and the request metrics.
+    """
+
+    def __init__(self, repository=None):
+        self.repository = repository or Repository()
+        self.routes = {}
+        for collection, (base, manager_class) in APIS.items():
+            manager = manager_class(self.repository)
+            for name, member in vars(base).items():
+                if name.startswith('_') or not callable(member):
+                    continue
+                parameters = list(inspect.signature(member).parameters)
+                self.routes[f"/{collection}/{name}"] = Route(
+                    getattr(manager, name), 'request' in parameters, 'out' in parameters)
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.in_flight = 0
+        self.rejected = 0
+
+    def record(self, route, seconds, failed):
+        with self.lock:
+            route.calls += 1
+            route.seconds += seconds
+            if failed:
+                route.errors += 1
+
+    def metrics(self):
+        with self.lock:
+            routes = {
+                path: {"calls": route.calls, "errors": route.errors,
+                       "mean_ms": route.seconds * 1000 / route.calls if route.calls else 0.0}
+                for path, route in self.routes.items() if route.calls
+            }
+            metrics = {
+                "uptime_seconds": time.time() - self.started,
+                "in_flight": self.in_flight,
+                "rejected": self.rejected,
+                "requests": sum(route.calls for route in self.routes.values()),
+                "routes": routes,
+            }
+        if self.repository.cache is not None:
+            metrics["cache"] = self.repository.cache.stats()
+        if self.repository.flusher is not None:
+            metrics["write_behind"] = self.repository.flusher.stats()
+        metrics["compaction"] = self.repository.compactor.stats()
+        instrumented = instrumentation.snapshot()
+        if instrumented is not None:
+            metrics["instrumentation"] = instrumented
+        sampler = profiling.sampler
+        if sampler is not None:
+            metrics["profiling"] = sampler.stats()
+        return metrics
+
+
+# ChunkedWriter class
+class ChunkedWriter:
+    """
+    Text file-like object sending what is written to it as HTTP/1.1 chunks. The
+    response headers go out with the first chunk, so a method failing before it has
+    written anything can still be answered with an error status.
+    """
+
+    def __init__(self, handler, chunk_size=STREAM_CHUNK):
+        self.handler = handler
+        self.wfile = handler.wfile
+        self.chunk_size = chunk_size
+        self.parts = []
+        self.size = 0
+        self.started = False
+
+    def write(self, text):
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.started:
+            self.started = True
+            self.handler.send_response(200)
+            self.handler.send_header('Content-Type', 'application/json')
+            self.handler.send_header('Transfer-Encoding', 'chunked')
+            self.handler.end_headers()
+        if self.parts:
+            data = ''.join(self.parts).encode()
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+            self.parts = []
+            self.size = 0
+
+    def close(self):
+        self.flush()
+        self.wfile.write(b'0\r\n\r\n')
+
+
+# PlannerRequestHandler class
+class PlannerRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'Planner/1.0'
+
+    def __init__(self, request, client_address, server):
+        # Lives as long as the connection: PlannerServer calls serve() each time a
+        # request arrives on it and finish() once it is closed
+        self.request = request
+        self.client_address = client_address
+        self.server = server
+        self.setup()
+
+    def setup(self):
+        # Applied to the socket by StreamRequestHandler: a request that stops arriving halfway times out
+        self.timeout = self.server.keep_alive
+        super().setup()
+
+    def serve(self):
+        """
+        Handle the requests that have arrived on the connection.
+
+        :return: True if the connection stays open for further requests
+        """
+        while True:
+            self.close_connection = True
+            self.handle_one_request()
+            if self.close_connection:
+                return False
+            if not self.request_buffered():
+                return True
+
+    def request_buffered(self):
+        # A pipelined request may already sit in the read buffer, where the selector cannot see it
+        self.connection.setblocking(False)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
+    def do_GET(self):
+        service = self.server.service
+        if self.path == '/health':
+            self.reply(200, codec.dumps({"status": "ok"}))
+        elif self.path == '/metrics':
+            self.reply(200, codec.dumps(service.metrics()))
+        elif self.path == '/metrics/prometheus':
+            self.reply(200, instrumentation.prometheus(), {}, 'text/plain; version=0.0.4')
+        elif self.path in service.routes:
+            self.reply(405, codec.dumps({"error": "Use POST"}), {"Allow": "POST"})
+        else:
+            self.reply(404, codec.dumps({"error": "Not found"}))
+
+    def do_POST(self):
+        service = self.server.service
+        route = service.routes.get(self.path)
+        body = self.read_body()
+        if body is None:
+            return
+        if route is None:
+            self.reply(404, codec.dumps({"error": "Not found"}))
+            return
+
+        with service.lock:
+            service.in_flight += 1
+        started = time.perf_counter()
+        failed = True
+        self.out = None
+        try:
+            args = (body.decode(),) if route.takes_request else ()
+            if route.streams:
+                self.stream(route, args)
+            else:
+                self.reply(200, route.method(*args))
+            failed = False
+        except Exception as error:
+            if self.out is not None and self.out.started:
+                # The status line has gone out, so the only way to signal failure is to
+                # cut the response short
+                self.close_connection = True
+                self.log_error("%s failed while streaming: %r", self.path, error)
+            elif isinstance(error, (ValueError, KeyError, TypeError)):
+                # Invalid json, missing fields, unknown ids and rejected values are the client's to fix
+                message = key_error_message(body, error.args[0]) if isinstance(error, KeyError) else str(error)
+                self.reply(400, codec.dumps({"error": message}))
+            else:
+                self.log_error("%s failed: %r", self.path, error)
+                self.reply(500, codec.dumps({"error": "Internal error"}))
+        finally:
+            service.record(route, time.perf_counter() - started, failed)
+            with service.lock:
+                service.in_flight -= 1
+
+    def read_body(self):
+        """
+        :return: the request body, or None once an error reply has been sent
+        """
+        length = self.headers.get('Content-Length')
+        if length is None:
+            if self.headers.get('Transfer-Encoding'):
+                self.reject(411, "Content-Length required")
+                return None
+            return b''
+        try:
+            length = int(length)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.reject(400, "Invalid Content-Length")
+            return None
+        if length > self.server.max_body:
+            self.reject(413, f"Request body exceeds {self.server.max_body} bytes")
+            return None
+        return self.rfile.read(length)
+
+    def reject(self, status, message):
+        with self.server.service.lock:
+            self.server.service.rejected += 1
+        # The unread body would be parsed as the next request
+        self.close_connection = True
+        self.reply(status, codec.dumps({"error": message}), {"Connection": "close"})
+
+    def reply(self, status, response, headers=None, content_type='application/json'):
+        data = response.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def stream(self, route, args):
+        self.out = ChunkedWriter(self)
+        route.method(*args, self.out)
+        self.out.close()
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+# PlannerServer class
+class PlannerServer(HTTPServer):
+    """
+    HTTP server handing requests to a bounded pool of worker threads instead of a new
+    thread per connection. Between requests a kept-alive connection is parked in a
+    selector watched by one thread, which hands it back to the pool once its next
+    request arrives and closes it after keep_alive idle seconds, so idle connections
+    hold no worker.
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, service, workers=DEFAULT_WORKERS, max_body=DEFAULT_MAX_BODY,
+                 keep_alive=DEFAULT_KEEP_ALIVE, verbose=False):
+        self.service = service
+        self.max_body = max_body
+        self.verbose = verbose
+        self.keep_alive = keep_alive
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='planner-http')
+        # Connections handed to the parking thread, which registers them with its selector
+        self.selector = selectors.DefaultSelector()
+        self.parking = []
+        self.parking_lock = threading.Lock()
+        self.wakeup_read, self.wakeup_write = socket.socketpair()
+        self.wakeup_read.setblocking(False)
+        self.selector.register(self.wakeup_read, selectors.EVENT_READ)
+        self.closing = False
+        self.parker = threading.Thread(target=self.watch_idle_connections, name='planner-keep-alive', daemon=True)
+        super().__init__(address, PlannerRequestHandler)
+        self.parker.start()
+
+    def server_bind(self):
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        super().server_bind()
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_request_worker, request, client_address)
+
+    def process_request_worker(self, request, client_address, handler=None):
+        try:
+            if handler is None:
+                handler = self.RequestHandlerClass(request, client_address, self)
+            if handler.serve() and not self.closing:
+                self.park(handler)
+                return
+        except Exception:
+            self.handle_error(request, client_address)
+        self.drop_connection(handler, request)
+
+    def drop_connection(self, handler, request):
+        try:
+            if handler is not None:
+                handler.finish()
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def park(self, handler):
+        with self.parking_lock:
+            self.parking.append(handler)
+        self.wakeup_write.send(b'\0')
+
+    def watch_idle_connections(self):
+        # Idle handler -> time after which it is closed
+        idle = {}
+        while not self.closing:
+            timeout = max(0.0, min(idle.values()) - time.monotonic()) if idle else None
+            for key, _ in self.selector.select(timeout):
+                if key.fileobj is self.wakeup_read:
+                    try:
+                        self.wakeup_read.recv(4096)
+                    except BlockingIOError:
+                        pass
+                    continue
+                handler = key.data
+                self.selector.unregister(handler.connection)
+                del idle[handler]
+                self.executor.submit(self.process_request_worker, handler.request, handler.client_address, handler)
+            with self.parking_lock:
+                parked, self.parking = self.parking, []
+            for handler in parked:
+                self.selector.register(handler.connection, selectors.EVENT_READ, handler)
+                idle[handler] = time.monotonic() + self.keep_alive
+            now = time.monotonic()
+            for handler in [handler for handler, deadline in idle.items() if deadline <= now]:
+                self.selector.unregister(handler.connection)
+                del idle[handler]
+                self.drop_connection(handler, handler.request)
+        for handler in idle:
+            self.drop_connection(handler, handler.request)
+
+    def server_close(self):
+        super().server_close()
+        self.closing = True
+        self.wakeup_write.send(b'\0')
+        self.parker.join()
+        self.executor.shutdown(wait=True)
+        # Connections parked by requests that were still running
+        with self.parking_lock:
+            for handler in self.parking:
+                self.drop_connection(handler, handler.request)
+            self.parking = []
+        self.selector.close()
+        self.wakeup_read.close()
+        self.wakeup_write.close()
+        self.service.repository.close()
+
+
+# Helper functions
+def key_error_message(body, key):
+    """
+    :return: the error for a KeyError raised on key: an id named by a field of the json
+    request was not found, or else the request lacks the field key
+    """
+    try:
+        request_data = codec.loads(body)
+    except ValueError:
+        request_data = None
+    if isinstance(request_data, dict) and key in request_data.values():
+        return f"Not found: {key}"
+    return f"Missing field: {key}"
+
+
+def make_repository(backend='json', db_dir='db', lazy=False, cache_mb=0, write_behind_ms=None):
+    if backend == 'sqlite':
+        os.makedirs(db_dir, exist_ok=True)
+        store = SqliteBackend(os.path.join(db_dir, 'planner.sqlite3'))
+    else:
+        store = JsonBackend(db_dir, lazy=lazy)
+    cache = ResponseCache(cache_mb * 1024 * 1024) if cache_mb else None
+    write_behind = write_behind_ms / 1000 if write_behind_ms is not None else None
+    return Repository(store, cache, write_behind)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the planner APIs over HTTP/JSON")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="worker threads")
+    parser.add_argument('--max-body', type=int, default=DEFAULT_MAX_BODY, help="largest request body in bytes")
+    parser.add_argument('--keep-alive', type=float, default=DEFAULT_KEEP_ALIVE,
+                        help="seconds an idle connection is kept open")
+    parser.add_argument('--backend', choices=['json', 'sqlite'], default='json')
+    parser.add_argument('--db', default='db', help="db directory")
+    parser.add_argument('--lazy', action='store_true', help="load json records on first use")
+    parser.add_argument('--cache-mb', type=int, default=0, help="response cache size, 0 to disable")
+    parser.add_argument('--write-behind', type=float, metavar='MS',
+                        help="flush writes in the background, gathering them for this many milliseconds")
+    parser.add_argument('--verbose', action='store_true', help="log every request")
+    parser.add_argument('--instrument', action='store_true', help="record per-method and I/O statistics")
+    args = parser.parse_args()
+
+    if args.instrument:
+        instrumentation.enable()
+    service = PlannerService(make_repository(args.backend, args.db, args.lazy, args.cache_mb, args.write_behind))
+    server = PlannerServer((args.host, args.port), service, args.workers, args.max_body, args.keep_alive,
+                           args.verbose)
+    print(f"Serving {len(service.routes)} routes on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
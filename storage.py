@@ -0,0 +1,1564 @@
+import atexit
+import os
+import sqlite3
+import threading
+from collections.abc import Mapping, MutableMapping
+from contextlib import ExitStack, contextmanager, nullcontext
+from time import perf_counter
+
+from codec import dumpb, loads
+from instrumentation import record_io
+from models import MISSING, MODELS, to_plain
+
+DB_DIR = 'db'
+
+# Fewest log records before the log is folded into a fresh snapshot, so small
+# stores are not rewritten on every write
+COMPACT_THRESHOLD = 1000
+
+# Seconds a write-behind flusher lets writes pile up before writing them together
+DEFAULT_FLUSH_WINDOW = 0.05
+
+# Fields of each record copied into the snapshot manifest, enough to build the
+# managers' indexes without reading the records themselves
+SUMMARY_FIELDS = {
+    'users': ('name',),
+    'teams': ('name', 'members'),
+    'boards': ('team_id', 'name', 'status', 'version'),
+}
+
+# Collections the json backend stores one file per record, so that writing to a
+# board and its tasks never rewrites the other boards
+SHARDED_COLLECTIONS = ('boards',)
+
+# Versions of each collection the sqlite backend keeps the changed record ids of, so
+# readers that fell further behind reload the whole collection
+SQLITE_CHANGES_KEPT = 1000
+
+
+# Helper functions
+def fsync_dir(path):
+    # Makes the renames done in a directory survive a crash, where the platform allows it
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def close_all(fds):
+    for fd in fds:
+        os.close(fd)
+
+
+def fsync_all(fds):
+    try:
+        for fd in fds:
+            os.fsync(fd)
+    finally:
+        close_all(fds)
+
+
+def file_stat(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def journal_position(path):
+    """
+    :return: (inode, size) of the file, (None, 0) if there is none
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None, 0
+    return stat.st_ino, stat.st_size
+
+
+def file_size(path):
+    try:
+        return os.stat(path).st_size
+    except FileNotFoundError:
+        return 0
+
+
+def encode_batch(items):
+    return dumpb({"b": [{"p": path, "v": to_plain(value)} for path, value in items]})
+
+
+def encode_record(path, value=None, delete=False):
+    if delete:
+        return dumpb({"p": path})
+    return dumpb({"p": path, "v": to_plain(value)})
+
+
+def apply_record(data, record, model=None):
+    """
+    Apply one log record to the in-memory data. With a model, whole records are stored
+    as instances of that record class.
+
+    Records are {"p": [...], "v": <value>} for a set, {"p": [...]} for a delete
+    of a dict key and {"b": [<record>, ...]} for a batch written as one line.
+    Setting the index one past the end of a list appends to it, so replaying a record
+    on top of a snapshot that already contains it leaves the data unchanged.
+    """
+    if 'b' in record:
+        for item in record['b']:
+            apply_record(data, item, model)
+        return
+    *parents, last = record['p']
+    if model is not None and not parents and 'v' in record:
+        record = {"p": record['p'], "v": model.from_dict(record['v'])}
+    target = data
+    for key in parents:
+        target = target[key]
+    if 'v' not in record:
+        target.pop(last, None)
+    elif isinstance(target, list) and last == len(target):
+        target.append(record['v'])
+    else:
+        target[last] = record['v']
+
+
+# LazyDict class
+class LazyDict(MutableMapping):
+    """
+    Dict of id -> record whose records stay in the snapshot file until first accessed.
+
+    The snapshot manifest gives the byte range of every record and a summary of its
+    indexed fields, so keys, len() and summaries() never touch the records. A record
+    is parsed the first time it is looked up and kept in memory from then on.
+    """
+
+    def __init__(self, model=None):
+        self.model = model
+        self.order = {}
+        self.loaded = {}
+        self.snapshot_fd = None
+        # Manifest columns for the records still on disk, addressed through slots
+        self.slots = {}
+        self.offsets = []
+        self.lengths = []
+        self.fields = {}
+
+    def reset(self, keys=(), records=None, snapshot_fd=None, offsets=(), lengths=(), fields=None):
+        """
+        :param keys: every key, in order
+        :param records: the records already in memory
+        :param snapshot_fd: file descriptor of the snapshot the offsets point into
+        :param offsets, lengths: byte range of each key's record in the snapshot
+        :param fields: summary field -> list of each key's value
+        """
+        if self.snapshot_fd is not None and self.snapshot_fd != snapshot_fd:
+            os.close(self.snapshot_fd)
+        self.loaded = dict(records or {})
+        self.order = dict.fromkeys(keys)
+        self.order.update(dict.fromkeys(self.loaded))
+        self.snapshot_fd = snapshot_fd
+        self.slots = {key: slot for slot, key in enumerate(keys)} if snapshot_fd is not None else {}
+        self.offsets = offsets
+        self.lengths = lengths
+        self.fields = fields or {}
+
+    def __getitem__(self, key):
+        record = self.loaded.get(key)
+        if record is not None:
+            return record
+        record = loads(self.raw(key))
+        if self.model is not None:
+            record = self.model(record)
+        # Concurrent readers may fault in the same record; keep the first copy
+        return self.loaded.setdefault(key, record)
+
+    def __setitem__(self, key, value):
+        self.loaded[key] = value
+        self.order[key] = None
+
+    def __delitem__(self, key):
+        del self.order[key]
+        self.loaded.pop(key, None)
+        self.slots.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self.order
+
+    def __iter__(self):
+        return iter(self.order)
+
+    def __len__(self):
+        return len(self.order)
+
+    def clear(self):
+        self.reset()
+
+    def is_loaded(self, key):
+        return key in self.loaded
+
+    def raw(self, key):
+        """
+        The serialized record as stored in the snapshot, for a key not loaded yet.
+        """
+        slot = self.slots[key]
+        return os.pread(self.snapshot_fd, self.lengths[slot], self.offsets[slot])
+
+    def header(self, key):
+        # Fields a record lacks are stored as null in their column
+        slot = self.slots[key]
+        return {field: values[slot] for field, values in self.fields.items() if values[slot] is not None}
+
+    def summaries(self):
+        for key in self.order:
+            record = self.loaded.get(key)
+            yield key, record if record is not None else self.header(key)
+
+
+# LogStore class
+class LogStore:
+    """
+    Log-structured storage for one entity file.
+
+    The snapshot is kept in <file_name> as a json object with one record per line, and
+    every mutation since the last snapshot is appended as one compact json line to
+    <file_name>.log. Loading replays the log tail on top of the snapshot. Once the log
+    holds compact_threshold records and has grown as large as the snapshot it is folded
+    into a new snapshot, so the bytes compaction rewrites stay proportional to the bytes
+    appended however large the store is.
+
+    Each snapshot is written with a <file_name>.manifest holding the byte range and
+    summary fields of every record. In lazy mode only the manifest is read at startup
+    and records are faulted in on first access; snapshots written by older versions
+    are loaded eagerly until the next compaction writes a manifest for them.
+
+    After compact_in_background(compactor), a write making compaction due hands the
+    store to the compactor instead of compacting it itself, see Compactor.
+
+    After defer_writes(flusher), appends are buffered in memory and written to the log
+    by write_pending(), which the flusher calls in the background, see WriteBehind.
+    """
+
+    def __init__(self, file_name, db_dir=DB_DIR, compact_threshold=COMPACT_THRESHOLD,
+                 summary_fields=(), lazy=False, model=None):
+        self.file_name = file_name
+        self.db_dir = db_dir
+        self.snapshot_path = os.path.join(db_dir, file_name)
+        self.log_path = self.snapshot_path + '.log'
+        self.manifest_path = self.snapshot_path + '.manifest'
+        self.compact_threshold = compact_threshold
+        self.summary_fields = summary_fields
+        self.lazy = lazy
+        self.model = model
+        self.data = LazyDict(model) if lazy else {}
+        self.log_records = 0
+        self.log_file = None
+        # Nesting depth of batch(); appends are flushed when the outermost batch ends
+        self.batching = 0
+        # What has been read from disk so far, to notice writes by other processes
+        self.snapshot_stat = None
+        self.log_offset = 0
+        # Size of the log when last read; past log_offset it ends in a torn record
+        self.log_size = 0
+        # Set when a lazy store had to load a snapshot without a usable manifest
+        self.needs_manifest = False
+        # Write-behind mode: whoever is told of pending appends, and the appends not yet written
+        self.flusher = None
+        self.pending = []
+        self.pending_records = 0
+        # Whoever is told when compaction is due, None to compact inline
+        self.compactor = None
+        # Set when an append created the log, whose directory entry write_pending() makes durable
+        self.log_created = False
+
+    def load(self):
+        started = perf_counter()
+        self.close()
+        self.snapshot_stat = file_stat(self.snapshot_path)
+        self.needs_manifest = False
+        if self.lazy:
+            read = self._load_lazy()
+        else:
+            data = {}
+            read = 0
+            if self.snapshot_stat is not None:
+                with open(self.snapshot_path, 'rb') as file:
+                    snapshot = file.read()
+                read = len(snapshot)
+                data = self._records(loads(snapshot))
+            # Refill the same dict so references held by the managers stay valid
+            self.data.clear()
+            self.data.update(data)
+        self.log_records = 0
+        self.log_offset = 0
+        self.log_size = 0
+        # A torn record at the end of the log is skipped here and truncated by the next
+        # writer, which holds the file lock exclusively
+        self._replay_log()
+        record_io('load', started, read + self.log_offset)
+        return self.data
+
+    def summaries(self):
+        """
+        (id, summary) pairs for every record, where a summary holds at least the
+        SUMMARY_FIELDS of the collection. Does not fault in lazy records.
+        """
+        if self.lazy:
+            return self.data.summaries()
+        return self.data.items()
+
+    def summary(self, key):
+        if self.lazy and not self.data.is_loaded(key):
+            return self.data.header(key)
+        return self.data[key]
+
+    def changed(self):
+        """
+        True if another process has written to the files since they were last read.
+        """
+        return file_size(self.log_path) != self.log_size or file_stat(self.snapshot_path) != self.snapshot_stat
+
+    def refresh(self):
+        """
+        Catch up with writes made by other processes: replay only the new log tail, or
+        reload everything if the snapshot was compacted in the meantime.
+
+        :return: the set of ids of the records written, empty if there were none
+        """
+        if not self.changed():
+            return set()
+        if file_stat(self.snapshot_path) != self.snapshot_stat or file_size(self.log_path) < self.log_offset:
+            return self._reload()
+        return self._replay_log()
+
+    def set(self, path, value):
+        apply_record(self.data, {"p": path, "v": value}, self.model)
+        self._append(encode_record(path, value))
+
+    def set_many(self, items):
+        """
+        Group commit: apply a list of (path, value) pairs and persist them as a single
+        log line, so a crash either keeps the whole batch or none of it.
+        """
+        if not items:
+            return
+        for path, value in items:
+            apply_record(self.data, {"p": path, "v": value}, self.model)
+        self._append(encode_batch(items), len(items))
+
+    def delete(self, path):
+        apply_record(self.data, {"p": path})
+        self._append(encode_record(path, delete=True))
+
+    @contextmanager
+    def batch(self):
+        """
+        Buffer the log appends made inside the block and flush them together at its end.
+        """
+        self.batching += 1
+        try:
+            yield
+        finally:
+            self.batching -= 1
+            if not self.batching and self.log_file is not None:
+                self.log_file.flush()
+
+    def defer_writes(self, flusher):
+        """
+        Switch to write-behind mode: appends are kept in memory and flusher.mark(self)
+        is called, until flusher calls write_pending().
+        """
+        self.flusher = flusher
+
+    def compact_in_background(self, compactor):
+        """
+        Have compactor.schedule(self) called when compaction is due, instead of
+        compacting in the middle of the write that made it due.
+        """
+        self.compactor = compactor
+
+    def compaction_due(self):
+        snapshot_size = self.snapshot_stat[2] if self.snapshot_stat is not None else 0
+        return self.needs_manifest or (self.log_records >= self.compact_threshold and self.log_offset >= snapshot_size)
+
+    def compact_if_due(self):
+        """
+        Compact if still due, which it may no longer be once another process has
+        compacted the files. Call with writers locked out.
+
+        :return: True if compacted
+        """
+        if not self.compaction_due():
+            return False
+        self.compact()
+        return True
+
+    def load_inside(self, loading):
+        # Lazy records are read from the snapshot already open, which compaction renames
+        # over but never rewrites, so they need no file lock
+        pass
+
+    def write_pending(self):
+        """
+        Append the buffered records to the log, compacting it if it is due. Call with
+        writers locked out.
+
+        :return: file descriptors to fsync, and then close, to make the records durable
+        """
+        if not self.pending:
+            return []
+        self._write_log(b'\n'.join(self.pending) + b'\n', self.pending_records)
+        self.pending = []
+        self.pending_records = 0
+        if self.log_created:
+            fsync_dir(self.db_dir)
+            self.log_created = False
+        if self.log_file is None:
+            # Compacted, and the snapshot already fsynced
+            return []
+        fd = os.dup(self.log_file.fileno())
+        # Opened again on the next flush, so a store with many shards holds no descriptors
+        self.close()
+        return [fd]
+
+    def compact(self):
+        """
+        Write the current data as a new snapshot plus manifest and empty the log.
+        Records of a lazy store that were never loaded are copied over without parsing.
+        The new files are fsynced before they are renamed over the old ones.
+        """
+        started = perf_counter()
+        # The snapshot holds every buffered record
+        self.pending = []
+        self.pending_records = 0
+        os.makedirs(self.db_dir, exist_ok=True)
+        tmp_path = self.snapshot_path + '.tmp'
+        keys, offsets, lengths = [], [], []
+        fields = {field: [] for field in self.summary_fields}
+        with open(tmp_path, 'wb') as file:
+            file.write(b'{')
+            for key in self.data:
+                file.write((b',\n' if keys else b'\n') + dumpb(key) + b': ')
+                if self.lazy and not self.data.is_loaded(key):
+                    raw = self.data.raw(key)
+                    header = self.data.header(key)
+                else:
+                    header = self.data[key]
+                    raw = dumpb(header)
+                keys.append(key)
+                offsets.append(file.tell())
+                lengths.append(len(raw))
+                for field, values in fields.items():
+                    values.append(header.get(field))
+                file.write(raw)
+            file.write(b'\n}\n')
+            file.flush()
+            os.fsync(file.fileno())
+        snapshot = os.stat(tmp_path)
+        manifest = {
+            "snapshot": {"size": snapshot.st_size, "mtime_ns": snapshot.st_mtime_ns},
+            "keys": keys,
+            "offsets": offsets,
+            "lengths": lengths,
+            "fields": fields,
+        }
+        with open(self.manifest_path + '.tmp', 'wb') as file:
+            file.write(dumpb(manifest))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        # A crash before the manifest is replaced leaves a manifest that does not match
+        # the snapshot's size and mtime, which load() detects and ignores
+        os.replace(self.manifest_path + '.tmp', self.manifest_path)
+        fsync_dir(self.db_dir)
+        self.close()
+        # Records still in the log are idempotent, so a crash before this point is safe
+        open(self.log_path, 'w').close()
+        self.log_records = 0
+        self.log_offset = 0
+        self.log_size = 0
+        self.needs_manifest = False
+        self.snapshot_stat = file_stat(self.snapshot_path)
+        if self.lazy:
+            # Point unloaded records at the new snapshot
+            self.data.reset(keys, self.data.loaded, os.open(self.snapshot_path, os.O_RDONLY),
+                            offsets, lengths, fields)
+        record_io('compact', started, snapshot.st_size)
+
+    def close(self):
+        if self.log_file is not None:
+            self.log_file.close()
+            self.log_file = None
+
+    def _load_lazy(self):
+        """
+        :return: the number of bytes read
+        """
+        manifest = None
+        read = 0
+        if self.snapshot_stat is not None and os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'rb') as file:
+                data = file.read()
+            read = len(data)
+            manifest = loads(data)
+            snapshot = os.stat(self.snapshot_path)
+            if manifest['snapshot'] != {"size": snapshot.st_size, "mtime_ns": snapshot.st_mtime_ns}:
+                manifest = None
+        if manifest is not None:
+            self.data.reset(manifest['keys'], None, os.open(self.snapshot_path, os.O_RDONLY),
+                            manifest['offsets'], manifest['lengths'], manifest['fields'])
+        elif self.snapshot_stat is not None:
+            with open(self.snapshot_path, 'rb') as file:
+                data = file.read()
+            read += len(data)
+            records = self._records(loads(data))
+            self.data.reset(records.keys(), records)
+            self.needs_manifest = True
+        else:
+            self.data.reset()
+        return read
+
+    def _reload(self):
+        """
+        Load everything again.
+
+        :return: the ids of the records that differ from the ones loaded before, or of
+        every record in lazy mode, where comparing them would read them all
+        """
+        if self.lazy:
+            keys = set(self.data)
+            self.load()
+            return keys | set(self.data)
+        old = dict(self.data)
+        self.load()
+        return {key for key in old.keys() | self.data.keys() if old.get(key, MISSING) != self.data.get(key, MISSING)}
+
+    def _records(self, data):
+        if self.model is None:
+            return data
+        return {key: self.model(record) for key, record in data.items()}
+
+    def _append(self, line, records=1):
+        if self.flusher is not None:
+            self.pending.append(line)
+            self.pending_records += records
+            self.flusher.mark(self)
+            return
+        self._write_log(line + b'\n', records)
+
+    def _write_log(self, lines, records):
+        started = perf_counter()
+        if self.log_file is None:
+            os.makedirs(self.db_dir, exist_ok=True)
+            if self.log_size > self.log_offset:
+                # Torn record from a crash in the middle of an append. Writers hold the
+                # file lock exclusively, so it is not another process's append
+                os.truncate(self.log_path, self.log_offset)
+            elif not self.log_offset and not os.path.exists(self.log_path):
+                self.log_created = True
+            self.log_file = open(self.log_path, 'ab')
+        self.log_file.write(lines)
+        if not self.batching:
+            self.log_file.flush()
+        self.log_offset += len(lines)
+        self.log_size = self.log_offset
+        record_io('save', started, len(lines))
+        self.log_records += records
+        if self.compaction_due():
+            if self.compactor is not None:
+                self.compactor.schedule(self)
+            else:
+                self.compact()
+
+    def _replay_log(self):
+        """
+        :return: the set of ids of the records written by the replayed log records
+        """
+        keys = set()
+        if not os.path.exists(self.log_path):
+            return keys
+        with open(self.log_path, 'rb') as file:
+            self.log_size = os.fstat(file.fileno()).st_size
+            file.seek(self.log_offset)
+            for line in file:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    record = loads(line)
+                except ValueError:
+                    break
+                apply_record(self.data, record, self.model)
+                keys.update(item['p'][0] for item in record.get('b', (record,)))
+                self.log_records += len(record.get('b', ())) or 1
+                self.log_offset += len(line)
+        return keys
+
+
+# ShardedDict class
+class ShardedDict(Mapping):
+    """
+    Read-only view of a ShardedStore as a dict of id -> record. Keys come from the
+    catalog; a record's shard is loaded the first time the record is looked up.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, key):
+        if key not in self.store.catalog.data:
+            raise KeyError(key)
+        return self.store.shard(key).data[key]
+
+    def __contains__(self, key):
+        return key in self.store.catalog.data
+
+    def __iter__(self):
+        return iter(self.store.catalog.data)
+
+    def __len__(self):
+        return len(self.store.catalog.data)
+
+
+# ShardedStore class
+class ShardedStore:
+    """
+    Store keeping every record of a collection in its own LogStore shard under
+    <db_dir>/<name>/, plus a catalog LogStore holding only the summary fields of each
+    record.
+
+    Writes touch the catalog only when a summary field changes, and each shard is
+    compacted on its own, so the bytes written per mutation scale with the size of the
+    record being changed rather than with the whole collection. Shards are written
+    before the catalog, so a record whose catalog entry was lost to a crash is simply
+    never listed. A single-file snapshot left by an older version is split into shards
+    on first load.
+
+    Every write also appends the ids it touched to a shared changes.log, so noticing
+    another process's writes costs one stat instead of one per loaded shard. The
+    journal is rotated by renaming a fresh file over it, never emptied in place, so a
+    reader tells a new journal from the one it read by its inode rather than its size.
+    The reader keeps the journal it read open, which stops the filesystem from handing
+    its inode to a later journal.
+
+    In write-behind mode the shards and catalog buffer their appends and report them
+    to the store, whose write_pending() writes the shards and fsyncs them before it
+    writes the catalog and then the journal, so the order above holds across a power
+    loss as well as a process crash.
+    """
+
+    def __init__(self, name, db_dir=DB_DIR, compact_threshold=COMPACT_THRESHOLD, summary_fields=(), model=None):
+        self.name = name
+        self.db_dir = db_dir
+        self.shard_dir = os.path.join(db_dir, name)
+        self.compact_threshold = compact_threshold
+        self.summary_fields = summary_fields
+        self.model = model
+        self.catalog = LogStore('catalog.json', self.shard_dir, compact_threshold)
+        self.journal_path = os.path.join(self.shard_dir, 'changes.log')
+        self.journal_file = None
+        # The journal read so far, held open so its inode is not reused, and its inode;
+        # None while there is none
+        self.journal_reader = None
+        self.journal_inode = None
+        self.journal_offset = 0
+        # Size of the journal when last read; past journal_offset it ends in a torn line
+        self.journal_size = 0
+        self.journal_records = 0
+        # Set when the journal file was created or replaced, see write_pending()
+        self.journal_created = False
+        self.batching = 0
+        # Batches of the shards written inside batch(), closed when it ends
+        self.shard_batches = ExitStack()
+        self.batched_shards = set()
+        self.shards = {}
+        self.shard_lock = threading.Lock()
+        # Shards are faulted in inside it, see load_inside()
+        self.loading = nullcontext
+        self.data = ShardedDict(self)
+        # Write-behind mode: the flusher, the shards and catalog with buffered appends, and the buffered journal ids
+        self.flusher = None
+        self.dirty = {}
+        self.pending_keys = []
+        # Background compaction: the compactor, and the shards and catalog due
+        self.compactor = None
+        self.due = {}
+
+    def load(self):
+        self.close()
+        self.shards = {}
+        self.catalog.load()
+        self.journal_inode, self.journal_size = self._open_journal_reader()
+        self.journal_offset = self._journal_end()
+        self.journal_records = 0
+        if not self.catalog.data:
+            self._split_legacy_snapshot()
+        return self.data
+
+    def shard(self, key):
+        shard = self.shards.get(key)
+        if shard is None:
+            # Concurrent readers may load the same shard; keep the first one
+            with self.shard_lock:
+                shard = self.shards.get(key)
+                if shard is None:
+                    shard = LogStore(key + '.json', self.shard_dir, self.compact_threshold, model=self.model)
+                    with self.loading():
+                        shard.load()
+                    if self.flusher is not None:
+                        shard.defer_writes(self)
+                    if self.compactor is not None:
+                        shard.compact_in_background(self)
+                    self.shards[key] = shard
+        return shard
+
+    def summaries(self):
+        return self.catalog.data.items()
+
+    def summary(self, key):
+        return self.catalog.data[key]
+
+    def changed(self):
+        return (self.catalog.changed()
+                or journal_position(self.journal_path) != (self.journal_inode, self.journal_size))
+
+    def refresh(self):
+        """
+        :return: the set of ids of the records written by other processes: those whose
+        summary changed, and those whose loaded shard did
+        """
+        changed = self.catalog.refresh()
+        if changed:
+            # Drop shards of records another process deleted
+            for key in [key for key in self.shards if key not in self.catalog.data]:
+                del self.shards[key]
+        touched = self._read_journal()
+        for key in touched:
+            shard = self.shards.get(key)
+            if shard is not None and shard.refresh():
+                changed.add(key)
+        return changed
+
+    def set(self, path, value):
+        self.set_many([(path, value)])
+
+    def set_many(self, items):
+        """
+        Apply a list of (path, value) pairs, written as one log line per affected shard
+        plus at most one catalog line.
+        """
+        by_key = {}
+        catalog_items = []
+        for path, value in items:
+            by_key.setdefault(path[0], []).append((path, value))
+            if len(path) == 1:
+                catalog_items.append((path, self._summarize(value)))
+            elif len(path) == 2 and path[1] in self.summary_fields:
+                catalog_items.append((path, value))
+        for key, shard_items in by_key.items():
+            shard = self.shard(key)
+            if self.batching and key not in self.batched_shards:
+                self.shard_batches.enter_context(shard.batch())
+                self.batched_shards.add(key)
+            shard.set_many(shard_items)
+            if not self.batching:
+                # One open log file per shard would exhaust file descriptors on big collections
+                shard.close()
+        self.catalog.set_many(catalog_items)
+        self._append_journal(by_key)
+
+    def delete(self, path):
+        shard = self.shard(path[0])
+        shard.delete(path)
+        shard.close()
+        if len(path) == 1 or (len(path) == 2 and path[1] in self.summary_fields):
+            self.catalog.delete(path)
+        if len(path) == 1:
+            self.shards.pop(path[0], None)
+        self._append_journal([path[0]])
+
+    @contextmanager
+    def batch(self):
+        """
+        Buffer the catalog, shard and journal appends made inside the block and flush
+        them at its end.
+        """
+        self.batching += 1
+        try:
+            with self.catalog.batch():
+                yield
+        finally:
+            self.batching -= 1
+            if not self.batching:
+                self.shard_batches.close()
+                for key in self.batched_shards:
+                    if key in self.shards:
+                        self.shards[key].close()
+                self.batched_shards = set()
+                if self.journal_file is not None:
+                    self.journal_file.flush()
+
+    def compact(self):
+        self.catalog.compact()
+        for shard in self.shards.values():
+            shard.compact()
+
+    def compact_in_background(self, compactor):
+        self.compactor = compactor
+        self.catalog.compact_in_background(self)
+        for shard in self.shards.values():
+            shard.compact_in_background(self)
+
+    def schedule(self, store):
+        # A shard or the catalog is due for compaction
+        self.due[store] = True
+        self.compactor.schedule(self)
+
+    def compact_if_due(self):
+        due, self.due = self.due, {}
+        compacted = False
+        for store in due:
+            # A shard dropped since, by a delete here or in another process, must not
+            # write its files again
+            if store is self.catalog or self.shards.get(store.file_name[:-len('.json')]) is store:
+                compacted = store.compact_if_due() or compacted
+        return compacted
+
+    def load_inside(self, loading):
+        self.loading = loading
+
+    def defer_writes(self, flusher):
+        self.flusher = flusher
+        self.catalog.defer_writes(self)
+        for shard in self.shards.values():
+            shard.defer_writes(self)
+
+    def mark(self, store):
+        # A shard or the catalog has buffered appends
+        self.dirty[store] = True
+        self.flusher.mark(self)
+
+    def write_pending(self):
+        fds = []
+        try:
+            for store in self.dirty:
+                if store is not self.catalog:
+                    fds += store.write_pending()
+            if self.catalog in self.dirty:
+                # On disk before the catalog can name them, however the kernel orders its writeback
+                shard_fds, fds = fds, []
+                fsync_all(shard_fds)
+                fds += self.catalog.write_pending()
+            if self.pending_keys:
+                self._write_journal(self.pending_keys)
+                self.pending_keys = []
+                fds.append(os.dup(self.journal_file.fileno()))
+                if self.journal_created:
+                    fsync_dir(self.shard_dir)
+                    self.journal_created = False
+        except BaseException:
+            close_all(fds)
+            raise
+        self.dirty = {}
+        return fds
+
+    def close(self):
+        self.catalog.close()
+        for shard in self.shards.values():
+            shard.close()
+        self._close_journal()
+        # Its inode may be reused once closed, so the next refresh treats the journal as new
+        self._close_journal_reader()
+        self.journal_inode = None
+
+    def _append_journal(self, keys):
+        if self.flusher is not None:
+            self.pending_keys.extend(keys)
+            self.flusher.mark(self)
+            return
+        self._write_journal(keys)
+
+    def _write_journal(self, keys):
+        # Writers hold the exclusive file lock and have caught up with the journal,
+        # so it can be replaced by an empty one once it grows past the threshold. A
+        # torn line left by a crash is dropped the same way, which makes every other
+        # process check its loaded shards for the write it may have named
+        if self.journal_records >= self.compact_threshold or self.journal_size > self.journal_offset:
+            self._rotate_journal()
+        if self.journal_file is None:
+            os.makedirs(self.shard_dir, exist_ok=True)
+            self.journal_file = open(self.journal_path, 'a')
+            inode = os.fstat(self.journal_file.fileno()).st_ino
+            if inode != self.journal_inode:
+                self.journal_created = True
+                self.journal_inode, _ = self._open_journal_reader()
+        lines = ''.join(key + '\n' for key in keys)
+        self.journal_file.write(lines)
+        if not self.batching:
+            self.journal_file.flush()
+        self.journal_offset += len(lines.encode())
+        self.journal_size = self.journal_offset
+        self.journal_records += len(keys)
+
+    def _rotate_journal(self):
+        self._close_journal()
+        tmp_path = self.journal_path + '.tmp'
+        open(tmp_path, 'w').close()
+        os.replace(tmp_path, self.journal_path)
+        self.journal_created = True
+        self.journal_inode, self.journal_offset = self._open_journal_reader()
+        self.journal_size = self.journal_offset
+        self.journal_records = 0
+
+    def _close_journal(self):
+        if self.journal_file is not None:
+            self.journal_file.close()
+            self.journal_file = None
+
+    def _open_journal_reader(self):
+        """
+        Open the journal now at journal_path for reading, in place of the one read so far.
+
+        :return: (inode, size) of the journal, (None, 0) if there is none
+        """
+        self._close_journal_reader()
+        try:
+            self.journal_reader = open(self.journal_path, 'rb')
+        except FileNotFoundError:
+            return None, 0
+        stat = os.fstat(self.journal_reader.fileno())
+        return stat.st_ino, stat.st_size
+
+    def _close_journal_reader(self):
+        if self.journal_reader is not None:
+            self.journal_reader.close()
+            self.journal_reader = None
+
+    def _journal_end(self):
+        """
+        :return: the offset just past the last complete line of the journal
+        """
+        if not self.journal_size:
+            return 0
+        file = self.journal_reader
+        file.seek(max(0, self.journal_size - 4096))
+        tail = file.read(self.journal_size - file.tell())
+        return self.journal_size - len(tail) + tail.rfind(b'\n') + 1
+
+    def _read_journal(self):
+        """
+        :return: the ids written by other processes since the journal was last read;
+        every loaded shard if the journal was replaced in the meantime
+        """
+        inode, size = journal_position(self.journal_path)
+        if inode != self.journal_inode:
+            # Rotated or created by another process: the ids written before that are
+            # gone, so every loaded shard checks its own files
+            self._close_journal()
+            self.journal_inode, self.journal_size = self._open_journal_reader()
+            self.journal_offset = self._journal_end()
+            self.journal_records = 0
+            return list(self.shards)
+        if size == self.journal_size:
+            return ()
+        self.journal_size = size
+        self.journal_reader.seek(self.journal_offset)
+        lines = self.journal_reader.read(size - self.journal_offset).split(b'\n')
+        # Keep a torn last line for the next read
+        complete = lines[:-1]
+        self.journal_offset += sum(len(line) + 1 for line in complete)
+        self.journal_records += len(complete)
+        return {line.decode() for line in complete}
+
+    def _summarize(self, record):
+        return {field: record[field] for field in self.summary_fields if field in record}
+
+    def _split_legacy_snapshot(self):
+        legacy = LogStore(self.name + '.json', self.db_dir, self.compact_threshold)
+        records = legacy.load()
+        if not records:
+            return
+        for key, record in records.items():
+            shard = LogStore(key + '.json', self.shard_dir, self.compact_threshold)
+            shard.data[key] = record
+            shard.compact()
+        self.catalog.set_many([([key], self._summarize(record)) for key, record in records.items()])
+        self.catalog.compact()
+        # The shards and catalog now hold everything; keep the old files out of the way
+        for path in (legacy.snapshot_path, legacy.log_path, legacy.manifest_path):
+            if os.path.exists(path):
+                os.replace(path, path + '.migrated')
+
+
+# StorageBackend class
+class StorageBackend:
+    """
+    Base interface for the storage the managers persist through.
+
+    open() returns a store for one entity collection ('users', 'teams' or 'boards').
+    Every store offers the same methods as LogStore: load() returning the collection as
+    a dict of id -> record, set(path, value), set_many(items), delete(path), close(),
+    batch() to flush the writes of a block together, summaries() for the (id, record
+    summary) pairs the indexes are built from, summary(id) for a single record's
+    summary, plus changed() and refresh() to pick up writes made through other stores,
+    refresh() returning the set of ids of the records they wrote.
+    lock_path is the file writers lock to coordinate with other processes; load() is
+    called holding it shared, and load_inside(loading) has a store read any files it
+    loads later inside loading(), a context manager doing the same.
+    compact_in_background(compactor) hands compactions to a Compactor.
+    """
+
+    lock_path = None
+
+    def open(self, name):
+        """
+        :param name: the collection name
+        :return: a store for the collection
+        """
+        pass
+
+    def close(self):
+        pass
+
+
+# JsonBackend class
+class JsonBackend(StorageBackend):
+    """
+    One json snapshot plus append-only log per collection in db_dir, except for the
+    SHARDED_COLLECTIONS which get one shard per record, see ShardedStore.
+    With lazy=True records are read from the snapshot on first access only.
+    """
+
+    def __init__(self, db_dir=DB_DIR, compact_threshold=COMPACT_THRESHOLD, lazy=False):
+        self.db_dir = db_dir
+        self.compact_threshold = compact_threshold
+        self.lazy = lazy
+        self.lock_path = os.path.join(db_dir, 'db.lock')
+        os.makedirs(db_dir, exist_ok=True)
+
+    def open(self, name):
+        if name in SHARDED_COLLECTIONS:
+            return ShardedStore(name, self.db_dir, self.compact_threshold, SUMMARY_FIELDS.get(name, ()),
+                                MODELS.get(name))
+        return LogStore(name + '.json', self.db_dir, self.compact_threshold, SUMMARY_FIELDS.get(name, ()), self.lazy,
+                        MODELS.get(name))
+
+
+# versions holds one row per collection, bumped by every commit to it, and changes the
+# ids of the records each version wrote, down to the version pruned, so a reader only
+# reloads the rows other processes changed.
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (id TEXT PRIMARY KEY, name TEXT NOT NULL, data TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS users_name ON users (name);
+CREATE TABLE IF NOT EXISTS teams (id TEXT PRIMARY KEY, name TEXT NOT NULL, data TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS teams_name ON teams (name);
+CREATE TABLE IF NOT EXISTS team_members (
+    team_id TEXT NOT NULL, user_id TEXT NOT NULL, PRIMARY KEY (team_id, user_id));
+CREATE INDEX IF NOT EXISTS team_members_user_id ON team_members (user_id);
+CREATE TABLE IF NOT EXISTS boards (id TEXT PRIMARY KEY, team_id TEXT NOT NULL, name TEXT NOT NULL, data TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS boards_team_id ON boards (team_id, name);
+CREATE TABLE IF NOT EXISTS tasks (
+    board_id TEXT NOT NULL, position INTEGER NOT NULL, id TEXT NOT NULL, title TEXT NOT NULL,
+    user_id TEXT, status TEXT, data TEXT NOT NULL, PRIMARY KEY (board_id, position));
+CREATE INDEX IF NOT EXISTS tasks_board_id ON tasks (board_id, title);
+CREATE INDEX IF NOT EXISTS tasks_user_id ON tasks (user_id);
+CREATE TABLE IF NOT EXISTS versions (
+    collection TEXT PRIMARY KEY, version INTEGER NOT NULL, pruned INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS changes (
+    collection TEXT NOT NULL, version INTEGER NOT NULL, record_id TEXT NOT NULL,
+    PRIMARY KEY (collection, version, record_id));
+"""
+
+
+# SqliteBackend class
+class SqliteBackend(StorageBackend):
+    """
+    Embedded SQLite database in WAL mode.
+
+    Users, teams and boards are one row each, with team members and board tasks in
+    their own tables, so a mutation only rewrites the rows it touches. Statements are
+    parameterised and reused through sqlite3's statement cache.
+    """
+
+    def __init__(self, path=os.path.join(DB_DIR, 'planner.sqlite3')):
+        self.lock_path = path + '.lock'
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # One connection shared by every store of the backend, used by one thread at a time
+        self.mutex = threading.RLock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SQLITE_SCHEMA)
+        # data_version when the versions table was last read, and the collection versions
+        # read then or committed through this connection since
+        self.data_version = None
+        self.versions = {}
+
+    def open(self, name):
+        return SqliteStore(self, name)
+
+    def version(self, name):
+        # data_version only moves when another connection commits, so most checks never read the versions table
+        data_version = self.connection.execute('PRAGMA data_version').fetchone()[0]
+        if data_version != self.data_version:
+            self.data_version = data_version
+            self.versions = dict(self.connection.execute('SELECT collection, version FROM versions'))
+        return self.versions.get(name, 0)
+
+    def close(self):
+        self.connection.close()
+
+
+# SqliteStore class
+class SqliteStore:
+    """
+    Store for one collection of a SqliteBackend.
+
+    Mutations are applied to the in-memory data first, then the affected rows are
+    written back from it inside one transaction. In write-behind mode the paths are
+    queued instead, and write_pending() writes back every queued row in one transaction.
+    Every commit bumps the collection's version and records the ids it wrote, which
+    refresh() reads back to reload only the records other processes changed.
+    """
+
+    def __init__(self, backend, name):
+        self.backend = backend
+        self.connection = backend.connection
+        self.name = name
+        self.model = MODELS.get(name)
+        self.data = {}
+        self.seen_version = 0
+        # Json bytes read by the last load and written since the last commit, for instrumentation
+        self.read_bytes = 0
+        self.written_bytes = 0
+        # Write-behind mode: the flusher, and the paths written since the last flush
+        self.flusher = None
+        self.pending = {}
+
+    def load(self):
+        started = perf_counter()
+        with self.backend.mutex:
+            self.seen_version = self.backend.version(self.name)
+            self._load()
+        record_io('load', started, self.read_bytes)
+        return self.data
+
+    def changed(self):
+        with self.backend.mutex:
+            return self.backend.version(self.name) != self.seen_version
+
+    def refresh(self):
+        if not self.changed():
+            return set()
+        started = perf_counter()
+        with self.backend.mutex:
+            version, pruned = self.connection.execute(
+                'SELECT version, pruned FROM versions WHERE collection = ?', (self.name,)).fetchone()
+            if pruned > self.seen_version:
+                # Fell behind past the changes kept
+                keys = set(self.data)
+                self.load()
+                return keys | set(self.data)
+            # In the order the records were first written, so new records follow the others as on a load
+            rows = self.connection.execute(
+                'SELECT record_id FROM changes WHERE collection = ? AND version > ? '
+                'GROUP BY record_id ORDER BY MIN(version)', (self.name, self.seen_version))
+            keys = [record_id for record_id, in rows]
+            self.seen_version = version
+            self._load_records(keys)
+        record_io('load', started, self.read_bytes)
+        return set(keys)
+
+    def summaries(self):
+        return self.data.items()
+
+    def summary(self, key):
+        return self.data[key]
+
+    def _load(self):
+        records = {}
+        read = 0
+        rows = self.connection.execute(f'SELECT id, data FROM {self.name} ORDER BY rowid')
+        for record_id, data in rows:
+            read += len(data)
+            records[record_id] = loads(data)
+        if self.name == 'teams':
+            for record in records.values():
+                record['members'] = []
+            rows = self.connection.execute('SELECT team_id, user_id FROM team_members ORDER BY rowid')
+            for team_id, user_id in rows:
+                records[team_id]['members'].append(user_id)
+        elif self.name == 'boards':
+            for record in records.values():
+                record['tasks'] = []
+            rows = self.connection.execute('SELECT board_id, data FROM tasks ORDER BY board_id, position')
+            for board_id, data in rows:
+                read += len(data)
+                records[board_id]['tasks'].append(loads(data))
+        self.read_bytes = read
+        # Refill the same dict so references held by the managers stay valid
+        self.data.clear()
+        for record_id, record in records.items():
+            self.data[record_id] = self.model(record) if self.model is not None else record
+        return self.data
+
+    def _load_records(self, record_ids):
+        read = 0
+        for record_id in record_ids:
+            row = self.connection.execute(f'SELECT data FROM {self.name} WHERE id = ?', (record_id,)).fetchone()
+            if row is None:
+                self.data.pop(record_id, None)
+                continue
+            read += len(row[0])
+            record = loads(row[0])
+            if self.name == 'teams':
+                rows = self.connection.execute(
+                    'SELECT user_id FROM team_members WHERE team_id = ? ORDER BY rowid', (record_id,))
+                record['members'] = [user_id for user_id, in rows]
+            elif self.name == 'boards':
+                record['tasks'] = []
+                rows = self.connection.execute(
+                    'SELECT data FROM tasks WHERE board_id = ? ORDER BY position', (record_id,))
+                for data, in rows:
+                    read += len(data)
+                    record['tasks'].append(loads(data))
+            self.data[record_id] = self.model(record) if self.model is not None else record
+        self.read_bytes = read
+
+    def set(self, path, value):
+        self.set_many([(path, value)])
+
+    def set_many(self, items):
+        for path, value in items:
+            apply_record(self.data, {"p": path, "v": value}, self.model)
+        self._save([path for path, value in items])
+
+    def delete(self, path):
+        apply_record(self.data, {"p": path})
+        self._save([path])
+
+    def load_inside(self, loading):
+        # SQLite locks its own files
+        pass
+
+    def compact_in_background(self, compactor):
+        # SQLite reclaims its own pages
+        pass
+
+    def defer_writes(self, flusher):
+        self.flusher = flusher
+
+    def write_pending(self):
+        if self.pending:
+            # Rows are written from the data as it is now, so a path written many times is written once
+            self._commit(list(self.pending))
+            self.pending = {}
+        # Committed by sqlite, which syncs its own files
+        return []
+
+    def _save(self, paths):
+        if self.flusher is not None:
+            self.pending.update(dict.fromkeys(map(tuple, paths)))
+            self.flusher.mark(self)
+            return
+        self._commit(paths)
+
+    def _commit(self, paths):
+        started = perf_counter()
+        with self.backend.mutex, self.connection:
+            for path in paths:
+                self._write(path)
+            self._committed({path[0] for path in paths})
+        record_io('save', started, self.written_bytes)
+        self.written_bytes = 0
+
+    @contextmanager
+    def batch(self):
+        # Every write is already committed as one transaction of its own
+        yield
+
+    def _committed(self, record_ids):
+        # Runs inside the transaction, whose writes hold sqlite's write lock
+        row = self.connection.execute(
+            'SELECT version, pruned FROM versions WHERE collection = ?', (self.name,)).fetchone()
+        previous, pruned = row or (0, 0)
+        version = previous + 1
+        self.connection.execute(
+            'INSERT INTO versions (collection, version, pruned) VALUES (?, ?, ?) '
+            'ON CONFLICT (collection) DO UPDATE SET version = excluded.version',
+            (self.name, version, pruned))
+        self.connection.executemany(
+            'INSERT INTO changes (collection, version, record_id) VALUES (?, ?, ?)',
+            [(self.name, version, record_id) for record_id in record_ids])
+        if version - pruned > 2 * SQLITE_CHANGES_KEPT:
+            pruned = version - SQLITE_CHANGES_KEPT
+            self.connection.execute(
+                'DELETE FROM changes WHERE collection = ? AND version <= ?', (self.name, pruned))
+            self.connection.execute('UPDATE versions SET pruned = ? WHERE collection = ?', (pruned, self.name))
+        self.backend.versions[self.name] = version
+        if previous == self.seen_version:
+            # Nothing written by others in between, so the data is up to date
+            self.seen_version = version
+
+    def close(self):
+        pass
+
+    def _write(self, path):
+        record_id = path[0]
+        record = self.data.get(record_id)
+        if record is None:
+            self._delete_record(record_id)
+        elif self.name == 'boards' and len(path) > 2 and path[1] == 'tasks':
+            self._write_task(record_id, path[2], record['tasks'][path[2]])
+        elif self.name == 'boards' and len(path) == 2 and path[1] == 'tasks':
+            self._write_tasks(record_id, record['tasks'])
+        elif self.name == 'teams' and len(path) > 1 and path[1] == 'members':
+            self._write_members(record_id, record['members'])
+        else:
+            self._write_record(record_id, record)
+            if self.name == 'teams' and len(path) == 1:
+                self._write_members(record_id, record['members'])
+            elif self.name == 'boards' and len(path) == 1:
+                self._write_tasks(record_id, record['tasks'])
+
+    def _write_record(self, record_id, record):
+        if self.name == 'users':
+            self.connection.execute(
+                'INSERT INTO users (id, name, data) VALUES (?, ?, ?) '
+                'ON CONFLICT (id) DO UPDATE SET name = excluded.name, data = excluded.data',
+                (record_id, record['name'], self._encode(record)))
+        elif self.name == 'teams':
+            data = {key: value for key, value in record.items() if key != 'members'}
+            self.connection.execute(
+                'INSERT INTO teams (id, name, data) VALUES (?, ?, ?) '
+                'ON CONFLICT (id) DO UPDATE SET name = excluded.name, data = excluded.data',
+                (record_id, record['name'], self._encode(data)))
+        else:
+            data = {key: value for key, value in record.items() if key != 'tasks'}
+            self.connection.execute(
+                'INSERT INTO boards (id, team_id, name, data) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (id) DO UPDATE SET team_id = excluded.team_id, name = excluded.name, '
+                'data = excluded.data',
+                (record_id, record['team_id'], record['name'], self._encode(data)))
+
+    def _encode(self, value):
+        data = dumpb(value).decode()
+        self.written_bytes += len(data)
+        return data
+
+    def _write_members(self, team_id, members):
+        self.connection.execute('DELETE FROM team_members WHERE team_id = ?', (team_id,))
+        self.connection.executemany(
+            'INSERT OR IGNORE INTO team_members (team_id, user_id) VALUES (?, ?)',
+            [(team_id, user_id) for user_id in members])
+
+    def _write_task(self, board_id, position, task):
+        self.connection.execute(
+            'INSERT OR REPLACE INTO tasks (board_id, position, id, title, user_id, status, data) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (board_id, position, task['id'], task['title'], task.get('user_id'), task.get('status'),
+             self._encode(task)))
+
+    def _write_tasks(self, board_id, tasks):
+        self.connection.execute('DELETE FROM tasks WHERE board_id = ?', (board_id,))
+        for position, task in enumerate(tasks):
+            self._write_task(board_id, position, task)
+
+    def _delete_record(self, record_id):
+        self.connection.execute(f'DELETE FROM {self.name} WHERE id = ?', (record_id,))
+        if self.name == 'teams':
+            self.connection.execute('DELETE FROM team_members WHERE team_id = ?', (record_id,))
+        elif self.name == 'boards':
+            self.connection.execute('DELETE FROM tasks WHERE board_id = ?', (record_id,))
+
+
+# WriteBehind class
+class WriteBehind:
+    """
+    Background flusher for stores in write-behind mode.
+
+    Stores switched over with store.defer_writes(flusher) keep their mutations in memory
+    and mark themselves dirty. A background thread wakes on the first mark, lets the
+    writes of the next window seconds pile up, then writes every dirty store's pending
+    records under lock() and fsyncs them once it is released, so writers never wait on
+    disk I/O. Compactions due by then run inside the same flush, unless the stores hand
+    them to a Compactor.
+
+    flush() does the same at once and close() flushes and stops the thread; close() is
+    also run at interpreter exit. Writes made within the last window are lost if the
+    process is killed, but a crash never leaves a torn file behind: log appends past the
+    last complete record are skipped on load and snapshots are replaced by renaming a
+    fsynced temp file over them. A log or journal created by a flush also has its
+    directory fsynced.
+
+    After a process crash the files hold the flushes that were written. A power loss
+    before a flush's fsyncs are done may keep some of its stores' appends and not
+    others, except that a ShardedStore fsyncs its shards before appending to its
+    catalog, see ShardedStore.
+
+    Other processes see the writes once they are flushed. Only one process should write
+    to the db in this mode, since another writer cannot see what is still pending.
+    """
+
+    def __init__(self, window=DEFAULT_FLUSH_WINDOW, lock=None):
+        """
+        :param window: seconds writes are gathered for before they are flushed together
+        :param lock: callable returning the context manager that locks out the writers,
+        such as a ConcurrencyGuard's writing
+        """
+        self.window = window
+        if lock is None:
+            mutex = threading.Lock()
+            lock = lambda: mutex
+        self.lock = lock
+        # Dirty stores in the order they were first written to, guarded by lock()
+        self.dirty = {}
+        # Serializes flushes, so a flush() returns only once everything before it is on disk
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+        self.flushes = 0
+        # Last exception raised by a background flush, whose stores are retried on the next one
+        self.error = None
+        atexit.register(self.close)
+
+    def mark(self, store):
+        """
+        Called by a store, with lock() held, when it has pending writes.
+        """
+        self.dirty[store] = True
+        if self.thread is None and not self.stopping.is_set():
+            self.thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self.thread.start()
+        self.wakeup.set()
+
+    def flush(self):
+        """
+        Write and fsync everything pending now.
+        """
+        with self.flush_lock:
+            fds = []
+            try:
+                with self.lock():
+                    while self.dirty:
+                        store = next(iter(self.dirty))
+                        fds += store.write_pending()
+                        del self.dirty[store]
+                for fd in fds:
+                    os.fsync(fd)
+            finally:
+                close_all(fds)
+            self.flushes += 1
+
+    def close(self):
+        """
+        Stop the background thread and flush what is left.
+        """
+        self.stopping.set()
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.flush()
+        atexit.unregister(self.close)
+
+    def stats(self):
+        return {"window": self.window, "flushes": self.flushes, "dirty": len(self.dirty),
+                "error": repr(self.error) if self.error is not None else None}
+
+    def _run(self):
+        while True:
+            self.wakeup.wait()
+            # Let the writes of the window pile up; close() cuts the wait short
+            self.stopping.wait(self.window)
+            self.wakeup.clear()
+            if self.stopping.is_set():
+                # close() flushes what is left
+                return
+            try:
+                self.flush()
+                self.error = None
+            except Exception as error:
+                self.error = error
+
+
+# Compactor class
+class Compactor:
+    """
+    Background thread compacting the stores due, so the write that makes a compaction
+    due does not wait for the snapshot to be rewritten.
+
+    Stores switched over with store.compact_in_background(compactor) call schedule()
+    with lock() held once their log is due. The thread then calls compact_if_due() on
+    each of them under lock(), which checks again, since another process may have
+    compacted the files in the meantime. Until then the log just keeps growing, so a
+    compaction that fails or never runs costs replay time on load, not data.
+    """
+
+    def __init__(self, lock=None):
+        """
+        :param lock: callable returning the context manager that locks out the writers,
+        such as a ConcurrencyGuard's writing
+        """
+        if lock is None:
+            mutex = threading.Lock()
+            lock = lambda: mutex
+        self.lock = lock
+        # Stores due in the order they were scheduled, guarded by lock()
+        self.due = {}
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+        self.compactions = 0
+        # Last exception raised by a background compaction
+        self.error = None
+
+    def schedule(self, store):
+        """
+        Called by a store, with lock() held, when it is due for compaction.
+        """
+        self.due[store] = True
+        if self.thread is None and not self.stopping.is_set():
+            self.thread = threading.Thread(target=self._run, name='compactor', daemon=True)
+            self.thread.start()
+        self.wakeup.set()
+
+    def compact(self):
+        """
+        Compact every store due now.
+        """
+        with self.lock():
+            while self.due:
+                store = next(iter(self.due))
+                del self.due[store]
+                if store.compact_if_due():
+                    self.compactions += 1
+
+    def close(self):
+        """
+        Stop the background thread once the compaction under way is done.
+        """
+        self.stopping.set()
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def stats(self):
+        return {"compactions": self.compactions, "due": len(self.due),
+                "error": repr(self.error) if self.error is not None else None}
+
+    def _run(self):
+        while True:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            if self.stopping.is_set():
+                return
+            try:
+                self.compact()
+                self.error = None
+            except Exception as error:
+                self.error = error
@@ -1,20 +1,28 @@
 import json
-import os 
 from datetime import datetime
 
-DB_DIR ="db"
-if not os.path.exists(DB_DIR):
-  os.makedirs(DB_DIR)
-def load_data(file_name):
-  file_path = os.path.join(DB_DIR,file_name)
-  if os.path.exists(file_path):
-    with open(file_path,'r') as file:
-      return json.load(file)
-  return{}
-def save_data(file_name):
-  file_path = os.path.join(DB_DIR,file_name)
-  with open(file_path,'w') as file:
-     json.dumps(data,file,indent =4)
+import codec
+from cache import cached, id_tag
+from concurrency import reads, writes
+from indexes import UniqueIndex
+from instrumentation import instrumented
+from pagination import page_bounds, stream_json_array
+from repository import Repository
+
+# Fields of a team update_team may change; members are changed by add_users_to_team and remove_users_from_team
+UPDATABLE_FIELDS = ('name', 'description', 'admin')
+
+
+# Helper functions
+def team_summary(team):
+    return {
+        "name": team['name'],
+        "description": team['description'],
+        "creation_time": team['creation_time'],
+        "admin": team['admin']
+    }
+
+
 class TeamBase:
     """
     Base interface implementation for API's to manage teams.
@@ -55,6 +63,30 @@ class TeamBase:
         """
         pass
 
+    # list teams a page at a time
+    def list_teams_page(self, request: str) -> str:
+        """
+        :param request: A json string with the page to fetch
+        {
+          "limit" : <max teams in the page, default 100>,
+          "cursor" : "<next_cursor of the previous page, omitted for the first page>"
+        }
+        :return: A json string with the response
+        {
+          "teams" : [<same entries as list_teams>],
+          "next_cursor" : "<cursor of the next page, null on the last page>"
+        }
+        """
+        pass
+
+    # write all teams as a json list to a file-like object
+    def stream_teams(self, out):
+        """
+        :param out: A writable text file-like object. The same json list as list_teams is
+        written to it incrementally, one team at a time.
+        """
+        pass
+
     # describe team
     def describe_team(self, request: str) -> str:
         """
@@ -94,6 +126,7 @@ class TeamBase:
             * Team name must be unique
             * Name can be max 64 characters
             * Description can be max 128 characters
+            * Only name, description and admin can be updated
         """
         pass
 
@@ -113,6 +146,27 @@ class TeamBase:
         """
         pass
 
+    # add users to many teams at once
+    def add_users_to_teams(self, request: str) -> str:
+        """
+        :param request: A json string with the memberships to add
+        {
+          "teams" : [
+            {
+              "id" : "<team_id>",
+              "users" : ["user_id 1", "user_id2"]
+            }
+          ]
+        }
+
+        :return:
+
+        Constraint:
+        * same constraints as add_users_to_team, checked for the whole batch first
+        * either every membership is added or none is
+        """
+        pass
+
     # add users to team
     def remove_users_from_team(self, request: str):
         """
@@ -147,70 +201,107 @@ class TeamBase:
         ]
         """
         pass
+
+@instrumented(TeamBase)
 class TeamManager(TeamBase):
-  def __init__(self):
-    self.teams = load_data('teams.json')
-    self.users = load_data('users.json')
-  def create_team(self,request:str)->str:
-    team = json.loads(request)
-    team_id = str(len(self.teams)+1)
-    team['id']=team_id
-    team['creation_time'] = datetime.now().isoformat()
-    team['members'] = [team['admin']]
-     if any(t['name'] == team['name'] for t in self.teams.values()):
+    def __init__(self, repository=None, backend=None):
+        self.repository = repository or Repository(backend)
+        self.store, self.teams = self.repository.open('teams')
+        self.users = self.repository.users
+        self.guard = self.repository.guard
+        # Shared with UserManager.get_user_teams, rebuilt by the repository on reload
+        self.membership_index = self.repository.membership_index
+        self.name_index = UniqueIndex()
+        self.rebuild_indexes()
+        self.repository.on_reload(self.rebuild_indexes)
+
+    def rebuild_indexes(self, changes=None):
+        """
+        :param changes: collection name -> ids of the records reloaded, None to build from scratch
+        """
+        if changes is None or 'teams' in changes:
+            self.name_index.rebuild((team['name'], team_id) for team_id, team in self.store.summaries())
+
+    @writes
+    def create_team(self, request: str) -> str:
+        team = codec.loads(request)
+        team_id = str(len(self.teams) + 1)
+        team['id'] = team_id
+        team['creation_time'] = datetime.now().isoformat()
+        team['members'] = [team['admin']]
+        if team['name'] in self.name_index:
             raise ValueError("Team name must be unique.")
         if len(team['name']) > 64:
             raise ValueError("Name can be max 64 characters.")
         if len(team['description']) > 128:
             raise ValueError("Description can be max 128 characters.")
-
-        self.teams[team_id] = team
-        save_data('teams.json', self.teams)
-        return json.dumps({"id": team_id})
-
+        self.repository.require_users([team['admin']])
+
+        self.store.set([team_id], team)
+        self.name_index.add(team['name'], team_id)
+        self.membership_index.add(team_id, team['members'])
+        if self.repository.task_counters is not None:
+            self.repository.task_counters.add_members(team_id, team['members'])
+        self.repository.invalidate(('teams',), ('team', team_id), ('team_members', team_id),
+                                   ('user_teams', team['admin']))
+        return codec.dumps({"id": team_id})
+
+    @reads
+    @cached(lambda manager: [('teams',)])
     def list_teams(self) -> str:
-        return json.dumps([
-            {
-                "name": t['name'],
-                "description": t['description'],
-                "creation_time": t['creation_time'],
-                "admin": t['admin']
-            }
-            for t in self.teams.values()
-        ])
-
+        return codec.dumps([team_summary(t) for t in self.teams.values()])
+
+    @reads
+    @cached(lambda manager, request: [('teams',)])
+    def list_teams_page(self, request: str) -> str:
+        start, end, next_cursor = page_bounds(codec.loads(request), len(self.teams))
+        # Team ids are assigned sequentially from 1, so a position maps straight to an id
+        teams = [team_summary(self.teams[str(position + 1)]) for position in range(start, end)]
+        return codec.dumps({"teams": teams, "next_cursor": next_cursor})
+
+    def stream_teams(self, out):
+        with self.guard.reading():
+            team_ids = list(self.teams)
+        stream_json_array(team_ids, lambda team_id: team_summary(self.teams[team_id]), self.guard.reading, out)
+
+    @reads
+    @cached(id_tag('team'))
     def describe_team(self, request: str) -> str:
-        request_data = json.loads(request)
+        request_data = codec.loads(request)
         team_id = request_data['id']
         if team_id not in self.teams:
             raise ValueError("Team not found.")
-        team = self.teams[team_id]
-        return json.dumps({
-            "name": team['name'],
-            "description": team['description'],
-            "creation_time": team['creation_time'],
-            "admin": team['admin']
-        })
+        return codec.dumps(team_summary(self.teams[team_id]))
 
+    @writes
     def update_team(self, request: str) -> str:
-        request_data = json.loads(request)
+        request_data = codec.loads(request)
         team_id = request_data['id']
         team_data = request_data['team']
         if team_id not in self.teams:
             raise ValueError("Team not found.")
-        if any(t['name'] == team_data['name'] and t['id'] != team_id for t in self.teams.values()):
+        unknown = sorted(set(team_data).difference(UPDATABLE_FIELDS))
+        if unknown:
+            raise ValueError(f"Team fields cannot be updated: {', '.join(unknown)}")
+        if 'name' in team_data and self.name_index.is_taken(team_data['name'], team_id):
             raise ValueError("Team name must be unique.")
         if len(team_data.get('name', '')) > 64:
             raise ValueError("Name can be max 64 characters.")
         if len(team_data.get('description', '')) > 128:
             raise ValueError("Description can be max 128 characters.")
+        if 'admin' in team_data:
+            self.repository.require_users([team_data['admin']])
 
-        self.teams[team_id].update(team_data)
-        save_data('teams.json', self.teams)
-        return json.dumps({"status": "success"})
+        old_name = self.teams[team_id]['name']
+        for key, value in team_data.items():
+            self.store.set([team_id, key], value)
+        self.name_index.replace(old_name, self.teams[team_id]['name'], team_id)
+        self.repository.invalidate(('teams',), ('team', team_id))
+        return codec.dumps({"status": "success"})
 
+    @writes
     def add_users_to_team(self, request: str):
-        request_data = json.loads(request)
+        request_data = codec.loads(request)
         team_id = request_data['id']
         user_ids = request_data['users']
         if team_id not in self.teams:
@@ -218,30 +309,70 @@ class TeamManager(TeamBase):
         team = self.teams[team_id]
         if len(team['members']) + len(user_ids) > 50:
             raise ValueError("Cannot add more than 50 members to a team.")
-        
-        team['members'].extend(user_ids)
-        team['members'] = list(set(team['members']))  # Ensure unique members
-        save_data('teams.json', self.teams)
-        return json.dumps({"status": "success"})
-
+        self.repository.require_users(user_ids)
+
+        # Members are held as a set, so duplicates are dropped
+        added = set(user_ids).difference(team['members'])
+        self.store.set([team_id, 'members'], list(team['members'].union(user_ids)))
+        self.membership_index.add(team_id, user_ids)
+        if self.repository.task_counters is not None:
+            self.repository.task_counters.add_members(team_id, added)
+        self.invalidate_members(team_id, user_ids)
+        return codec.dumps({"status": "success"})
+
+    @writes
+    def add_users_to_teams(self, request: str) -> str:
+        entries = codec.loads(request)['teams']
+        new_members = {}
+        for entry in entries:
+            team_id = entry['id']
+            if team_id not in self.teams:
+                raise ValueError("Team not found.")
+            members = new_members.get(team_id, self.teams[team_id]['members'])
+            if len(members) + len(entry['users']) > 50:
+                raise ValueError("Cannot add more than 50 members to a team.")
+            self.repository.require_users(entry['users'])
+            new_members[team_id] = members.union(entry['users'])
+
+        added = {team_id: members.difference(self.teams[team_id]['members']) for team_id, members in new_members.items()}
+        self.store.set_many([([team_id, 'members'], list(members)) for team_id, members in new_members.items()])
+        for team_id, members in new_members.items():
+            self.membership_index.add(team_id, members)
+            if self.repository.task_counters is not None:
+                self.repository.task_counters.add_members(team_id, added[team_id])
+            self.invalidate_members(team_id, members)
+        return codec.dumps({"status": "success"})
+
+    @writes
     def remove_users_from_team(self, request: str):
-        request_data = json.loads(request)
+        request_data = codec.loads(request)
         team_id = request_data['id']
         user_ids = request_data['users']
         if team_id not in self.teams:
             raise ValueError("Team not found.")
         team = self.teams[team_id]
-        team['members'] = [user for user in team['members'] if user not in user_ids]
-        save_data('teams.json', self.teams)
-        return json.dumps({"status": "success"})
-
+        removed = team['members'].intersection(user_ids)
+        self.store.set([team_id, 'members'], list(team['members'].difference(user_ids)))
+        self.membership_index.remove(team_id, user_ids)
+        if self.repository.task_counters is not None:
+            self.repository.task_counters.remove_members(team_id, removed)
+        self.invalidate_members(team_id, user_ids)
+        return codec.dumps({"status": "success"})
+
+    @reads
+    def get_user_team_ids(self, user_id):
+        # A copy: the index's own set changes under later writes, outside the read lock
+        return sorted(self.membership_index.teams_of(user_id))
+
+    @reads
+    @cached(lambda manager, request: manager.team_users_tags(codec.loads(request)['id']))
     def list_team_users(self, request: str):
-        request_data = json.loads(request)
+        request_data = codec.loads(request)
         team_id = request_data['id']
         if team_id not in self.teams:
             raise ValueError("Team not found.")
         team = self.teams[team_id]
-        return json.dumps([
+        return codec.dumps([
             {
                 "id": user_id,
                 "name": self.users[user_id]['name'],
@@ -250,6 +381,14 @@ class TeamManager(TeamBase):
             for user_id in team['members']
         ])
 
+    def invalidate_members(self, team_id, user_ids):
+        self.repository.invalidate(('team_members', team_id), *(('user_teams', user_id) for user_id in user_ids))
+
+    def team_users_tags(self, team_id):
+        # The response shows each member's user record
+        members = self.teams[team_id]['members'] if team_id in self.teams else ()
+        return [('team', team_id), ('team_members', team_id)] + [('user', user_id) for user_id in members]
+
 # Usage Example
 if __name__ == "__main__":
     team_manager = TeamManager()
@@ -282,7 +421,7 @@ if __name__ == "__main__":
     # Add users to a team
     add_users_data = {
         "id": "1",
-        "users": ["2", "3"]
+        "users": ["2"]
     }
     print(team_manager.add_users_to_team(json.dumps(add_users_data)))
 
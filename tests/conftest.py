@@ -0,0 +1,63 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The modules live at the top of the repository rather than in a package
+sys.path.insert(0, ROOT)
+
+from user_base import UserManager  # noqa: E402
+
+
+@pytest.fixture
+def db_dir(tmp_path, monkeypatch):
+    # Exports are written to out/ under the working directory
+    monkeypatch.chdir(tmp_path)
+    return str(tmp_path / 'db')
+
+
+def start_process(code, *args):
+    """
+    Run code in a separate Python process with the repository importable. Its stdin
+    and stdout are pipes, so the test can hand it lines and wait for its replies.
+    """
+    return subprocess.Popen([sys.executable, '-c', textwrap.dedent(code), *map(str, args)],
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+                            env={**os.environ, 'PYTHONPATH': ROOT})
+
+
+def run_process(code, *args):
+    process = start_process(code, *args)
+    output, _ = process.communicate(timeout=60)
+    assert process.returncode == 0, output
+    return output
+
+
+def create_users(repository, count):
+    users = UserManager(repository)
+    for i in range(count):
+        users.create_user(json.dumps({"name": f"user {i}", "display_name": f"User {i}"}))
+    return users
+
+
+def describe(manager, record_id, method='describe_user'):
+    return json.loads(getattr(manager, method)(json.dumps({"id": record_id})))
+
+
+def create_team(teams, name, admin='1'):
+    return json.loads(teams.create_team(json.dumps({"name": name, "description": "", "admin": admin})))['id']
+
+
+def create_board(boards, team_id, name):
+    return json.loads(boards.create_board(json.dumps(
+        {"name": name, "description": "", "team_id": team_id, "creation_time": "2024-01-01T00:00:00"})))['id']
+
+
+def add_task(boards, board_id, title, description='', user_id='1'):
+    return json.loads(boards.add_task(json.dumps(
+        {"board_id": board_id, "title": title, "description": description, "user_id": user_id,
+         "creation_time": "2024-01-01T00:00:00"})))['id']
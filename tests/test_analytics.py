@@ -0,0 +1,119 @@
+import json
+
+import pytest
+
+from analytics import AnalyticsManager
+from cache import ResponseCache
+from conftest import add_task, create_board, create_team, create_users, describe, run_process
+from indexes import TaskCounters
+from project_board_base import ProjectBoardManager
+from repository import Repository
+from storage import JsonBackend
+from team_base import TeamManager
+
+# Runs the managers in another process on the same db, with the method calls given as arguments
+CALLS = """
+    import json, sys
+    from project_board_base import ProjectBoardManager
+    from repository import Repository
+    from storage import JsonBackend
+    from team_base import TeamManager
+    from user_base import UserManager
+
+    repository = Repository(JsonBackend(sys.argv[1]))
+    managers = {"users": UserManager(repository), "teams": TeamManager(repository),
+                "boards": ProjectBoardManager(repository)}
+    for call in sys.argv[2:]:
+        manager, method, request = json.loads(call)
+        getattr(managers[manager], method)(json.dumps(request))
+    repository.close()
+"""
+
+
+@pytest.fixture
+def planner(db_dir):
+    repository = Repository(JsonBackend(db_dir), ResponseCache())
+    users = create_users(repository, 3)
+    teams = TeamManager(repository)
+    create_team(teams, 'one')
+    boards = ProjectBoardManager(repository)
+    create_board(boards, '1', 'first')
+    create_board(boards, '1', 'second')
+    add_task(boards, '1', 'a', user_id='1')
+    add_task(boards, '1', 'b', user_id='2')
+    add_task(boards, '2', 'c', user_id='2')
+    yield repository, users, teams, boards, AnalyticsManager(repository)
+    repository.close()
+
+
+def call(manager, method, **request):
+    return json.loads(getattr(manager, method)(json.dumps(request)))
+
+
+def in_other_process(db_dir, *calls):
+    run_process(CALLS, db_dir, *(json.dumps(call) for call in calls))
+
+
+def assert_counters_match_a_rebuild(repository):
+    counters = repository.task_counters
+    rebuilt = TaskCounters(repository.membership_index, repository.boards.items())
+    for field in ('users', 'boards', 'teams', 'team_boards'):
+        assert {key: +counts for key, counts in getattr(counters, field).items()} == \
+               {key: +counts for key, counts in getattr(rebuilt, field).items()}
+    assert +counters.member_incomplete == +rebuilt.member_incomplete
+
+
+def test_counters_follow_task_and_board_changes(planner):
+    repository, users, teams, boards, analytics = planner
+    assert call(analytics, 'user_workload', id='2') == {
+        "id": "2", "incomplete_tasks": 2, "tasks": 2, "statuses": {"OPEN": 2, "IN_PROGRESS": 0, "COMPLETE": 0}}
+    boards.update_task_status(json.dumps({"board_id": "2", "task_id": "1", "status": "COMPLETE"}))
+    assert call(analytics, 'board_progress', id='2')['completion_rate'] == 1.0
+    boards.close_board(json.dumps({"id": "2"}))
+    progress = call(analytics, 'team_progress', id='1')
+    assert progress['boards'] == {"OPEN": 1, "CLOSED": 1}
+    assert progress['statuses'] == {"OPEN": 2, "IN_PROGRESS": 0, "COMPLETE": 1}
+    assert call(analytics, 'user_workload', id='9') == {"error": "User not found"}
+    assert_counters_match_a_rebuild(repository)
+
+
+def test_member_counts_follow_membership_changes(planner):
+    repository, users, teams, boards, analytics = planner
+    # Only the admin, user 1, is a member so far
+    assert call(analytics, 'team_progress', id='1')['member_incomplete_tasks'] == 1
+    teams.add_users_to_team(json.dumps({"id": "1", "users": ["2", "3"]}))
+    assert call(analytics, 'team_progress', id='1')['member_incomplete_tasks'] == 3
+    add_task(boards, '1', 'd', user_id='3')
+    teams.remove_users_from_team(json.dumps({"id": "1", "users": ["2"]}))
+    assert call(analytics, 'team_progress', id='1')['member_incomplete_tasks'] == 2
+    assert_counters_match_a_rebuild(repository)
+
+
+def test_another_processs_writes_move_the_counters_without_a_rebuild(db_dir, planner):
+    repository, users, teams, boards, analytics = planner
+    call(analytics, 'team_progress', id='1')
+    counters = repository.task_counters
+    in_other_process(db_dir,
+                     ["teams", "add_users_to_team", {"id": "1", "users": ["2"]}],
+                     ["boards", "add_task", {"board_id": "2", "title": "d", "description": "", "user_id": "3",
+                                             "creation_time": "2024-01-01T00:00:00"}],
+                     ["boards", "update_task_status", {"board_id": "1", "task_id": "1", "status": "COMPLETE"}])
+    assert call(analytics, 'team_progress', id='1')['member_incomplete_tasks'] == 2
+    assert call(analytics, 'user_workload', id='3')['incomplete_tasks'] == 1
+    assert repository.task_counters is counters
+    assert_counters_match_a_rebuild(repository)
+
+
+def test_another_processs_writes_drop_only_the_responses_they_change(db_dir, planner):
+    repository, users, teams, boards, analytics = planner
+    describe(users, '1')
+    describe(users, '2')
+    call(boards, 'list_boards', id='1')
+    in_other_process(db_dir, ["users", "update_user", {"id": "2", "user": {"display_name": "changed"}}])
+
+    hits = repository.cache.hits
+    assert describe(users, '1')['display_name'] == 'User 0'
+    call(boards, 'list_boards', id='1')
+    assert repository.cache.hits == hits + 2
+    assert describe(users, '2')['display_name'] == 'changed'
+    assert repository.cache.hits == hits + 2
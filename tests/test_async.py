@@ -0,0 +1,70 @@
+import asyncio
+import inspect
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from analytics import AnalyticsBase
+from async_managers import AsyncAnalyticsManager, AsyncProjectBoardManager, AsyncTeamManager, AsyncUserManager
+from project_board_base import ProjectBoardBase
+from repository import Repository
+from storage import JsonBackend
+from team_base import TeamBase
+from user_base import UserBase
+
+
+@pytest.mark.parametrize('base, facade', [(UserBase, AsyncUserManager), (TeamBase, AsyncTeamManager),
+                                          (ProjectBoardBase, AsyncProjectBoardManager),
+                                          (AnalyticsBase, AsyncAnalyticsManager)])
+def test_every_public_method_has_a_coroutine(base, facade):
+    for name, member in vars(base).items():
+        if not name.startswith('_') and callable(member):
+            assert inspect.iscoroutinefunction(getattr(facade, name)), name
+            assert inspect.signature(getattr(facade, name)).parameters.keys() == \
+                   inspect.signature(member).parameters.keys()
+
+
+def test_concurrent_writes_are_batched_and_answered_one_by_one(db_dir):
+    async def main():
+        users = AsyncUserManager(repository=Repository(JsonBackend(db_dir)))
+        requests = [{"name": f"user {i}", "display_name": "U"} for i in range(20)] + [
+            {"name": "user 0", "display_name": "again"}]
+        results = await asyncio.gather(*(users.create_user(json.dumps(request)) for request in requests),
+                                       return_exceptions=True)
+        listed = json.loads(await users.list_users())
+        await users.close()
+        users.manager.repository.close()
+        return users.batches, results, listed
+
+    batches, results, listed = asyncio.run(main())
+    assert [json.loads(result)['id'] for result in results[:20]] == [str(i) for i in range(1, 21)]
+    assert isinstance(results[20], ValueError) and str(results[20]) == "User name must be unique"
+    # Everything submitted while the first write ran went out as one more batch
+    assert batches <= 2
+    assert len(listed) == 20
+    assert len(Repository(JsonBackend(db_dir)).users) == 20
+
+
+def test_facades_share_a_repository_and_an_executor(db_dir):
+    async def main():
+        repository = Repository(JsonBackend(db_dir))
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            users = AsyncUserManager(repository=repository, executor=executor)
+            teams = AsyncTeamManager(repository=repository, executor=executor)
+            await users.create_user(json.dumps({"name": "a", "display_name": "A"}))
+            await teams.create_team(json.dumps({"name": "t", "description": "", "admin": "1"}))
+            out = io.StringIO()
+            await teams.stream_teams(out)
+            user_teams = json.loads(await users.get_user_teams(json.dumps({"id": "1"})))
+            await users.close()
+            await teams.close()
+            # Not shut down by the facades that were handed it
+            assert executor.submit(lambda: 1).result() == 1
+        repository.close()
+        return json.loads(out.getvalue()), user_teams
+
+    teams, user_teams = asyncio.run(main())
+    assert [team['name'] for team in teams] == ['t']
+    assert [team['name'] for team in user_teams] == ['t']
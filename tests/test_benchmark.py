@@ -0,0 +1,58 @@
+import json
+import random
+
+from analytics import AnalyticsBase
+from benchmark import build_cases, generate_dataset, percentile
+from conftest import run_process
+from project_board_base import ProjectBoardBase
+from storage import JsonBackend
+from team_base import TeamBase
+from user_base import UserBase
+
+TINY = {"users": 30, "teams": 4, "team_size": 3, "boards": 5, "tasks_per_board": 4, "big_board_tasks": 25}
+
+
+def test_percentile_picks_from_sorted_values():
+    values = list(range(1, 101))
+    assert percentile(values, 0.5) in (50, 51)
+    assert percentile(values, 0.99) in (99, 100)
+    assert percentile([7], 0.99) == 7
+
+
+def test_dataset_matches_the_scale_and_cases_cover_every_public_method(db_dir):
+    backend = JsonBackend(db_dir)
+    users, teams, boards, dataset = generate_dataset(backend, TINY, random.Random(0))
+    assert dataset == {"users": 30, "teams": 4, "boards": 5, "big_board_id": "1", "big_board_tasks": 29}
+    assert all(len(board['tasks']) == 4 for board_id, board in boards.boards.items() if board_id != '1')
+
+    names = {name for name, setup, call in build_cases(backend, users, teams, boards, dataset, random.Random(0))}
+    for base, manager in ((UserBase, 'UserManager'), (TeamBase, 'TeamManager'),
+                          (ProjectBoardBase, 'ProjectBoardManager'), (AnalyticsBase, 'AnalyticsManager')):
+        public = {name for name, member in vars(base).items() if not name.startswith('_') and callable(member)}
+        assert {f"{manager}.{name}" for name in public} <= names
+    users.repository.close()
+
+
+def test_a_run_writes_results_that_a_later_run_compares_against(tmp_path, monkeypatch):
+    # The dataset goes to a scratch directory, which the runs create under tmp_path
+    monkeypatch.setenv('TMPDIR', str(tmp_path))
+    tiny = ['--users', '30', '--teams', '4', '--team-size', '3', '--boards', '5', '--big-board-tasks', '25',
+            '--ops', '2', '--load-ops', '1', '--memory-ops', '1', '--only', 'UserManager']
+    before, after = str(tmp_path / 'before.json'), str(tmp_path / 'after.json')
+    run = """
+        import sys
+        import benchmark
+        benchmark.main(sys.argv[1:])
+    """
+    run_process(run, *tiny, '--out', before)
+    output = run_process(run, *tiny, '--out', after, '--compare', before)
+    assert 'ops/sec vs prev' in output
+
+    with open(after) as file:
+        report = json.load(file)
+    assert report['meta']['scale']['users'] == 30
+    assert report['meta']['dataset']['users'] == 30
+    assert all(name.startswith('UserManager.') for name in report['results'])
+    assert 'UserManager.create_users_bulk' in report['results']
+    result = report['results']['UserManager.describe_user']
+    assert result['ops'] == 2 and result['p50_us'] <= result['p99_us']
@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+import instrumentation
+from conftest import add_task, create_board, create_team, create_users
+from project_board_base import ProjectBoardManager
+from repository import Repository
+from storage import JsonBackend
+from team_base import TeamManager
+from user_base import UserManager
+
+NOW = "2024-01-01T00:00:00"
+
+
+@pytest.fixture
+def managers(db_dir):
+    repository = Repository(JsonBackend(db_dir))
+    users = create_users(repository, 2)
+    teams = TeamManager(repository)
+    create_team(teams, 'red')
+    boards = ProjectBoardManager(repository)
+    create_board(boards, '1', 'plan')
+    yield repository, users, teams, boards
+    repository.close()
+
+
+def reopened(db_dir):
+    repository = Repository(JsonBackend(db_dir))
+    return repository, UserManager(repository), TeamManager(repository), ProjectBoardManager(repository)
+
+
+def test_bulk_creates_return_ids_in_order_and_survive_a_reopen(db_dir, managers):
+    repository, users, teams, boards = managers
+    new_users = [{"name": f"bulk {i}", "display_name": "B"} for i in range(3)]
+    assert json.loads(users.create_users_bulk(json.dumps({"users": new_users}))) == {"ids": ['3', '4', '5']}
+    new_boards = [{"name": f"board {i}", "description": "", "team_id": "1", "creation_time": NOW} for i in range(2)]
+    assert json.loads(boards.create_boards_bulk(json.dumps({"boards": new_boards}))) == {"ids": ['2', '3']}
+    tasks = [{"title": f"t{i}", "description": "", "user_id": "3", "creation_time": NOW} for i in range(3)]
+    assert json.loads(boards.add_tasks_bulk(json.dumps({"board_id": "2", "tasks": tasks}))) == {"ids": ['1', '2', '3']}
+    teams.add_users_to_teams(json.dumps({"teams": [{"id": "1", "users": ["3", "4"]}]}))
+    repository.close()
+
+    repository, users, teams, boards = reopened(db_dir)
+    assert [user['name'] for user in json.loads(users.list_users())][2:] == ['bulk 0', 'bulk 1', 'bulk 2']
+    assert [board['name'] for board in json.loads(boards.list_boards(json.dumps({"id": "1"})))] == [
+        'plan', 'board 0', 'board 1']
+    assert len(repository.boards['2']['tasks']) == 3
+    assert repository.teams['1']['members'] == {'1', '3', '4'}
+    repository.close()
+
+
+@pytest.mark.parametrize('method, request_data, message', [
+    ('users', {"users": [{"name": "new", "display_name": "N"}, {"name": "new", "display_name": "N"}]},
+     "User name must be unique"),
+    ('users', {"users": [{"name": "new", "display_name": "N"}, {"name": "x" * 65, "display_name": "N"}]},
+     "exceeds max length"),
+    ('boards', {"boards": [{"name": "new", "description": "", "team_id": "1", "creation_time": NOW},
+                           {"name": "plan", "description": "", "team_id": "1", "creation_time": NOW}]},
+     "Board name must be unique for the team"),
+    ('tasks', {"board_id": "1", "tasks": [{"title": "new", "description": "", "user_id": "1", "creation_time": NOW},
+                                          {"title": "old", "description": "", "user_id": "1", "creation_time": NOW}]},
+     "Task title must be unique for the board"),
+    ('tasks', {"board_id": "1", "tasks": [{"title": "new", "description": "", "user_id": "9", "creation_time": NOW}]},
+     "User not found: 9"),
+    ('teams', {"teams": [{"id": "1", "users": ["2"]}, {"id": "7", "users": ["1"]}]}, "Team not found"),
+])
+def test_a_rejected_item_leaves_the_whole_batch_unwritten(db_dir, managers, method, request_data, message):
+    repository, users, teams, boards = managers
+    add_task(boards, '1', 'old')
+    call = {'users': users.create_users_bulk, 'boards': boards.create_boards_bulk, 'tasks': boards.add_tasks_bulk,
+            'teams': teams.add_users_to_teams}[method]
+    with pytest.raises(ValueError, match=message):
+        call(json.dumps(request_data))
+    repository.close()
+
+    repository, users, teams, boards = reopened(db_dir)
+    assert len(repository.users) == 2
+    assert list(repository.boards) == ['1']
+    assert [task['title'] for task in repository.boards['1']['tasks']] == ['old']
+    assert repository.teams['1']['members'] == {'1'}
+    repository.close()
+
+
+def test_a_bulk_create_is_saved_in_one_write(managers):
+    repository, users, teams, boards = managers
+    instrumentation.enable()
+    try:
+        users.create_users_bulk(json.dumps({"users": [{"name": f"bulk {i}", "display_name": "B"} for i in range(50)]}))
+        assert instrumentation.snapshot()['io']['save']['operations'] == 1
+    finally:
+        instrumentation.disable()
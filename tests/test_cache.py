@@ -0,0 +1,46 @@
+import json
+
+from cache import ResponseCache
+from conftest import create_users, describe, run_process
+from repository import Repository
+from storage import JsonBackend
+
+UPDATE_USER = """
+    import json, sys
+    from repository import Repository
+    from storage import JsonBackend
+    from user_base import UserManager
+
+    repository = Repository(JsonBackend(sys.argv[1]))
+    UserManager(repository).update_user(json.dumps({"id": "1", "user": {"display_name": sys.argv[2]}}))
+    repository.close()
+"""
+
+
+def test_writes_invalidate_cached_responses(db_dir):
+    repository = Repository(JsonBackend(db_dir), ResponseCache())
+    users = create_users(repository, 2)
+    assert describe(users, '1')['display_name'] == 'User 0'
+    assert describe(users, '1')['display_name'] == 'User 0'
+    assert repository.cache.hits == 1
+
+    users.update_user(json.dumps({"id": "1", "user": {"display_name": "changed"}}))
+    assert describe(users, '1')['display_name'] == 'changed'
+    # Responses built from other records are kept
+    describe(users, '2')
+    hits = repository.cache.hits
+    users.update_user(json.dumps({"id": "1", "user": {"display_name": "changed again"}}))
+    describe(users, '2')
+    assert repository.cache.hits == hits + 1
+    repository.close()
+
+
+def test_another_processs_writes_clear_the_cache(db_dir):
+    repository = Repository(JsonBackend(db_dir), ResponseCache())
+    users = create_users(repository, 1)
+    assert describe(users, '1')['display_name'] == 'User 0'
+
+    run_process(UPDATE_USER, db_dir, 'changed elsewhere')
+    assert describe(users, '1')['display_name'] == 'changed elsewhere'
+    assert repository.cache.stats()['invalidations'] >= 1
+    repository.close()
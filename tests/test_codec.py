@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+import codec
+from models import Board, Team
+
+AVAILABLE = [name for name, (_, available) in codec.CODECS.items() if available]
+
+
+@pytest.fixture
+def restore_codec():
+    selected, pretty = codec.codec, codec.pretty
+    yield
+    codec.codec, codec.pretty = selected, pretty
+
+
+@pytest.mark.parametrize('name', AVAILABLE)
+def test_every_codec_encodes_records_and_plain_values_alike(name, restore_codec):
+    codec.configure(name)
+    board = Board({"name": "b", "team_id": "1", "creation_time": "2024-01-01T00:00:00", "status": "OPEN",
+                   "tasks": [{"id": "1", "title": "é", "status": "COMPLETE"}]})
+    team = Team({"name": "t", "members": ["1"]})
+    value = {"board": board, "team": team, "numbers": [1, 2.5, None, True]}
+    expected = {"board": board.to_dict(), "team": team.to_dict(), "numbers": [1, 2.5, None, True]}
+    assert json.loads(codec.dumps(value)) == expected
+    assert codec.loads(codec.dumps(value)) == expected
+    assert codec.loads(codec.dumpb(value)) == expected
+    assert b' ' not in codec.dumpb({"a": [1, 2]})
+    with pytest.raises(ValueError):
+        codec.loads('{"a": ')
+    with pytest.raises(TypeError):
+        codec.dumps({"a": object()})
+
+
+def test_pretty_mode_indents_responses_but_not_files(restore_codec):
+    codec.configure(pretty_responses=True)
+    assert codec.dumps({"a": 1}) == '{\n    "a": 1\n}'
+    assert codec.dumpb({"a": 1}) == b'{"a":1}'
+    codec.configure(pretty_responses=False)
+    assert codec.dumps({"a": 1}) == '{"a":1}'
+
+
+def test_unknown_and_missing_codecs_are_rejected():
+    with pytest.raises(ValueError, match="Unknown codec: yaml"):
+        codec.select_codec('yaml')
+    missing = [name for name, (_, available) in codec.CODECS.items() if not available]
+    for name in missing:
+        with pytest.raises(ValueError, match=f"Codec not installed: {name}"):
+            codec.select_codec(name)
+    assert codec.select_codec().name == AVAILABLE[0]
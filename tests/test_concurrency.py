@@ -0,0 +1,165 @@
+import json
+import os
+import threading
+import time
+
+from conftest import run_process, start_process
+from concurrency import FileLock, ReadWriteLock
+from repository import Repository
+from storage import JsonBackend
+from user_base import UserManager
+
+# Prints whether another process holds the lock file, without waiting for it
+TRY_EXCLUSIVE = """
+    import fcntl, sys
+    with open(sys.argv[1], 'a') as file:
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            print('held')
+        else:
+            print('free')
+"""
+
+
+def wait_until(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_read_write_lock_excludes_readers_while_writing():
+    lock = ReadWriteLock()
+    events = []
+
+    def read():
+        with lock.read():
+            events.append('read')
+
+    with lock.write():
+        reader = threading.Thread(target=read)
+        reader.start()
+        time.sleep(0.1)
+        assert events == []
+        # The writing thread may take the lock again
+        with lock.read(), lock.write():
+            events.append('write')
+    reader.join(timeout=10)
+    assert events == ['write', 'read']
+
+
+def test_read_write_lock_serves_writers_in_arrival_order_ahead_of_new_readers():
+    lock = ReadWriteLock()
+    order = []
+
+    def write(name):
+        with lock.write():
+            order.append(name)
+
+    def read():
+        with lock.read():
+            order.append('reader')
+
+    with lock.read():
+        writers = []
+        for name in ('first', 'second'):
+            writers.append(threading.Thread(target=write, args=(name,)))
+            writers[-1].start()
+            wait_until(lambda: lock.waiting_writers == len(writers))
+        reader = threading.Thread(target=read)
+        reader.start()
+        time.sleep(0.1)
+        assert order == []
+    for thread in writers + [reader]:
+        thread.join(timeout=10)
+    assert order == ['first', 'second', 'reader']
+
+
+def test_file_lock_is_held_shared_until_the_last_thread_releases_it(tmp_path):
+    path = str(tmp_path / 'db.lock')
+    lock = FileLock(path)
+    first, second = lock.hold(exclusive=False), lock.hold(exclusive=False)
+    first.__enter__()
+    second.__enter__()
+    first.__exit__(None, None, None)
+    assert run_process(TRY_EXCLUSIVE, path) == 'held\n'
+    second.__exit__(None, None, None)
+    assert run_process(TRY_EXCLUSIVE, path) == 'free\n'
+
+
+def test_file_lock_goes_back_to_shared_when_the_writer_is_done(tmp_path):
+    path = str(tmp_path / 'db.lock')
+    lock = FileLock(path)
+    with lock.hold(exclusive=False):
+        with lock.hold():
+            assert run_process(TRY_EXCLUSIVE, path) == 'held\n'
+        # Still held for the reader
+        assert run_process(TRY_EXCLUSIVE, path) == 'held\n'
+    assert run_process(TRY_EXCLUSIVE, path) == 'free\n'
+
+
+# Takes the db's file lock like a writer does, appends half a record to the users log,
+# and appends the rest once told to on stdin
+HALF_WRITER = """
+    import os, sys
+    from concurrency import FileLock
+
+    db_dir = sys.argv[1]
+    record = b'{"p":["2"],"v":{"name":"b","display_name":"B","creation_time":"2024-01-01T00:00:00"}}\\n'
+    with FileLock(os.path.join(db_dir, 'db.lock')).hold():
+        with open(os.path.join(db_dir, 'users.json.log'), 'ab') as log:
+            log.write(record[:20])
+            log.flush()
+            print('half', flush=True)
+            sys.stdin.readline()
+            log.write(record[20:])
+"""
+
+
+def test_load_waits_for_another_process_to_finish_its_append(db_dir):
+    repository = Repository(JsonBackend(db_dir))
+    UserManager(repository).create_user(json.dumps({"name": "a", "display_name": "A"}))
+    repository.close()
+    log_path = os.path.join(db_dir, 'users.json.log')
+
+    writer = start_process(HALF_WRITER, db_dir)
+    try:
+        assert writer.stdout.readline() == 'half\n'
+        torn_size = os.path.getsize(log_path)
+        loaded = {}
+        loader = threading.Thread(target=lambda: loaded.update(Repository(JsonBackend(db_dir)).users))
+        loader.start()
+        time.sleep(0.2)
+        # Blocked on the file lock, and the half-written record left alone
+        assert loader.is_alive()
+        assert os.path.getsize(log_path) == torn_size
+        writer.stdin.write('\n')
+        writer.stdin.flush()
+        loader.join(timeout=10)
+    finally:
+        writer.stdin.close()
+        writer.wait(timeout=60)
+    assert sorted(loaded) == ['1', '2']
+    assert loaded['2']['name'] == 'b'
+
+
+def test_reader_picks_up_another_processs_writes(db_dir):
+    repository = Repository(JsonBackend(db_dir))
+    users = UserManager(repository)
+    users.create_user(json.dumps({"name": "a", "display_name": "A"}))
+    run_process("""
+        import json, sys
+        from repository import Repository
+        from storage import JsonBackend
+        from user_base import UserManager
+
+        repository = Repository(JsonBackend(sys.argv[1]))
+        users = UserManager(repository)
+        users.update_user(json.dumps({"id": "1", "user": {"display_name": "changed"}}))
+        users.create_user(json.dumps({"name": "b", "display_name": "B"}))
+        repository.close()
+    """, db_dir)
+    assert json.loads(users.describe_user(json.dumps({"id": "1"})))['display_name'] == 'changed'
+    assert json.loads(users.describe_user(json.dumps({"id": "2"})))['name'] == 'b'
+    repository.close()
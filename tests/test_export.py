@@ -0,0 +1,102 @@
+import csv
+import json
+import os
+
+import pytest
+
+from conftest import add_task, create_board, create_team, create_users
+from project_board_base import ProjectBoardManager
+from repository import Repository
+from storage import JsonBackend
+from team_base import TeamManager
+
+
+@pytest.fixture
+def boards(db_dir):
+    repository = Repository(JsonBackend(db_dir))
+    create_users(repository, 1)
+    create_team(TeamManager(repository), 'red')
+    boards = ProjectBoardManager(repository)
+    create_board(boards, '1', 'plan | <b>')
+    add_task(boards, '1', 'first', 'a | b')
+    add_task(boards, '1', 'second', '<i>x</i>')
+    yield boards
+    repository.close()
+
+
+def export(boards, method='export_board', **request):
+    return json.loads(getattr(boards, method)(json.dumps(request)))
+
+
+def read(name):
+    with open(os.path.join('out', name), encoding='utf-8', newline='') as file:
+        return file.read()
+
+
+def test_each_format_writes_the_board_and_its_tasks(boards):
+    assert export(boards, id='1') == {"out_file": "board_1.txt"}
+    text = read('board_1.txt')
+    assert text.startswith("Board Name: plan | <b>\nBoard Description: \nTeam ID: 1\nTasks:\n- Task ID: 1\n")
+    assert "  Status: OPEN\n" in text
+
+    export(boards, id='1', format='md')
+    assert "| 1 | first | a \\| b | 1 | 2024-01-01T00:00:00 | OPEN |\n" in read('board_1.md')
+
+    export(boards, id='1', format='csv')
+    rows = list(csv.reader(read('board_1.csv').splitlines()))
+    assert rows[0][:3] == ['board_id', 'board_name', 'team_id']
+    assert rows[2] == ['1', 'plan | <b>', '1', '2', 'second', '<i>x</i>', '1', '2024-01-01T00:00:00', 'OPEN']
+
+    export(boards, id='1', format='html')
+    page = read('board_1.html')
+    assert '<h1>plan | &lt;b&gt;</h1>' in page and '<td>&lt;i&gt;x&lt;/i&gt;</td>' in page
+
+    export(boards, id='1', format='ndjson')
+    lines = [json.loads(line) for line in read('board_1.ndjson').splitlines()]
+    assert lines[0]['id'] == '1' and 'tasks' not in lines[0]
+    assert [task['title'] for task in lines[1:]] == ['first', 'second']
+
+
+def test_unknown_boards_and_formats_are_rejected(boards):
+    assert export(boards, id='9') == {"error": "Board not found"}
+    with pytest.raises(ValueError, match="Unknown export format: pdf"):
+        export(boards, id='1', format='pdf')
+
+
+def test_a_parallel_export_writes_the_same_files_as_a_serial_one(boards):
+    for i in range(70):
+        create_board(boards, '1', f'board {i}')
+    board_ids = [str(i) for i in range(1, 72)]
+    boards.export_workers = 1
+    serial = export(boards, 'export_boards', ids=board_ids, format='csv', force=True)['out_files']
+    contents = {name: read(name) for name in serial}
+    boards.export_workers = 2
+    parallel = export(boards, 'export_boards', ids=board_ids, format='csv', force=True)['out_files']
+    assert parallel == serial == [f'board_{board_id}.csv' for board_id in board_ids]
+    assert {name: read(name) for name in parallel} == contents
+
+
+def test_unchanged_boards_are_skipped_until_they_change_or_are_forced(boards):
+    create_board(boards, '1', 'other')
+    assert export(boards, 'export_boards') == {"out_files": ["board_1.txt", "board_2.txt"], "skipped": []}
+    assert export(boards, 'export_boards') == {"out_files": [], "skipped": ["1", "2"]}
+    # Each format keeps its own record of what was written
+    assert export(boards, 'export_boards', format='md')['skipped'] == []
+
+    boards.update_task_status(json.dumps({"board_id": "1", "task_id": "1", "status": "COMPLETE"}))
+    assert export(boards, 'export_boards') == {"out_files": ["board_1.txt"], "skipped": ["2"]}
+    assert "Status: COMPLETE" in read('board_1.txt')
+
+    os.remove(os.path.join('out', 'board_2.txt'))
+    assert export(boards, 'export_boards', ids=['2']) == {"out_files": ["board_2.txt"], "skipped": []}
+    assert export(boards, 'export_boards', force=True) == {"out_files": ["board_1.txt", "board_2.txt"],
+                                                          "skipped": []}
+    assert export(boards, 'export_boards', ids=['1', '8', '9']) == {"error": "Board not found: 8, 9"}
+
+
+def test_a_lost_manifest_exports_everything_again(boards):
+    export(boards, 'export_boards')
+    with open(os.path.join('out', 'export_manifest.json'), 'w') as file:
+        file.write('{not json')
+    assert export(boards, 'export_boards') == {"out_files": ["board_1.txt"], "skipped": []}
+    assert export(boards, 'export_boards')['skipped'] == ['1']
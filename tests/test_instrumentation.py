@@ -0,0 +1,48 @@
+import json
+
+import pytest
+
+import instrumentation
+from conftest import create_users
+from repository import Repository
+from storage import JsonBackend
+
+
+@pytest.fixture
+def instrumented():
+    instrumentation.enable()
+    yield
+    instrumentation.disable()
+
+
+def test_nothing_is_recorded_while_disabled(db_dir):
+    users = create_users(Repository(JsonBackend(db_dir)), 1)
+    users.describe_user(json.dumps({"id": "1"}))
+    assert instrumentation.registry is None
+    assert instrumentation.snapshot() is None
+    assert instrumentation.prometheus() == ''
+
+
+def test_calls_errors_and_io_are_recorded(db_dir, instrumented):
+    users = create_users(Repository(JsonBackend(db_dir)), 2)
+    users.describe_user(json.dumps({"id": "1"}))
+    with pytest.raises(ValueError):
+        users.create_user(json.dumps({"name": "user 0", "display_name": "again"}))
+
+    stats = instrumentation.snapshot()
+    create = stats['methods']['UserManager.create_user']
+    assert (create['calls'], create['errors']) == (3, 1)
+    assert create['buckets']['inf'] == 3
+    assert list(create['buckets'].values()) == sorted(create['buckets'].values())
+    assert stats['methods']['UserManager.describe_user']['calls'] == 1
+    assert stats['io']['save']['operations'] == 2
+    assert stats['io']['save']['bytes'] > 0
+    assert stats['codec']['decode']['operations'] >= 4
+
+    text = instrumentation.prometheus()
+    assert 'planner_method_duration_seconds_count{method="UserManager.create_user"} 3\n' in text
+    assert 'planner_method_errors_total{method="UserManager.create_user"} 1\n' in text
+    assert 'planner_method_duration_seconds_bucket{method="UserManager.create_user",le="+Inf"} 3\n' in text
+
+    instrumentation.reset()
+    assert instrumentation.snapshot() == {"methods": {}, "io": {}, "codec": {}}
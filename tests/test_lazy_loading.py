@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from conftest import add_task, create_board, create_team, create_users, run_process
+from project_board_base import ProjectBoardManager
+from repository import Repository
+from storage import JsonBackend, LogStore
+from team_base import TeamManager
+from user_base import UserManager
+
+
+def test_importing_the_managers_creates_no_files(tmp_path):
+    run_process("""
+        import os, sys
+        os.chdir(sys.argv[1])
+        import analytics, benchmark, project_board_base, server, team_base, user_base
+        assert os.listdir('.') == [], os.listdir('.')
+    """, tmp_path)
+
+
+@pytest.fixture
+def compacted_users(db_dir):
+    repository = Repository(JsonBackend(db_dir))
+    create_users(repository, 50)
+    repository.stores['users'].compact()
+    repository.close()
+    return db_dir
+
+
+def test_a_lazy_store_reads_records_on_first_access(compacted_users):
+    store = LogStore('users.json', compacted_users, summary_fields=('name',), lazy=True)
+    data = store.load()
+    assert len(data) == 50 and '50' in data and list(data)[:2] == ['1', '2']
+    assert dict(store.summaries())['7'] == {"name": "user 6"}
+    assert not any(data.is_loaded(key) for key in data)
+
+    assert data['7']['display_name'] == 'User 6'
+    assert [key for key in data if data.is_loaded(key)] == ['7']
+
+
+def test_lazy_managers_answer_without_loading_every_record(compacted_users):
+    repository = Repository(JsonBackend(compacted_users, lazy=True))
+    users = UserManager(repository)
+    with pytest.raises(ValueError, match="User name must be unique"):
+        users.create_user(json.dumps({"name": "user 3", "display_name": "again"}))
+    assert json.loads(users.describe_user(json.dumps({"id": "4"})))['name'] == 'user 3'
+    users.update_user(json.dumps({"id": "5", "user": {"display_name": "changed"}}))
+    assert sum(repository.users.is_loaded(key) for key in repository.users) == 2
+    repository.close()
+
+    # The log written by the lazy store replays on top of the snapshot
+    assert Repository(JsonBackend(compacted_users, lazy=True)).users['5']['display_name'] == 'changed'
+
+
+def test_a_board_manager_starts_without_reading_any_board(db_dir):
+    repository = Repository(JsonBackend(db_dir))
+    create_users(repository, 1)
+    create_team(TeamManager(repository), 'red')
+    boards = ProjectBoardManager(repository)
+    for name in ('a', 'b', 'c'):
+        create_board(boards, '1', name)
+    add_task(boards, '2', 'task')
+    repository.close()
+
+    repository = Repository(JsonBackend(db_dir))
+    boards = ProjectBoardManager(repository)
+    assert [board['name'] for board in json.loads(boards.list_boards(json.dumps({"id": "1"})))] == ['a', 'b', 'c']
+    assert repository.stores['boards'].shards == {}
+    assert repository.boards['2']['tasks'][0]['title'] == 'task'
+    assert list(repository.stores['boards'].shards) == ['2']
+    repository.close()
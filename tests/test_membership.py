@@ -0,0 +1,62 @@
+import json
+
+from conftest import create_team, create_users, run_process
+from indexes import MembershipIndex
+from repository import Repository
+from storage import JsonBackend
+from team_base import TeamManager
+
+
+def team_names(users, user_id):
+    return [team['name'] for team in json.loads(users.get_user_teams(json.dumps({"id": user_id})))]
+
+
+def test_membership_index_maps_both_ways():
+    index = MembershipIndex([('1', {"members": ['1', '2']}), ('2', {"members": ['2']})])
+    assert index.teams_of('2') == {'1', '2'}
+    assert index.members_of('1') == {'1', '2'}
+    index.remove('1', ['2', '3'])
+    assert index.teams_of('2') == {'2'}
+    index.remove('2', ['2'])
+    assert index.teams_of('2') == set() and index.members_of('2') == set()
+    assert '2' not in index.entries
+
+
+def test_user_teams_follow_membership_changes(db_dir):
+    repository = Repository(JsonBackend(db_dir))
+    users = create_users(repository, 3)
+    teams = TeamManager(repository)
+    for name in ('red', 'blue', 'green'):
+        create_team(teams, name)
+    teams.add_users_to_team(json.dumps({"id": "3", "users": ["2"]}))
+    teams.add_users_to_teams(json.dumps({"teams": [{"id": "1", "users": ["2", "3"]}, {"id": "2", "users": ["3"]}]}))
+    assert team_names(users, '1') == ['red', 'blue', 'green']
+    assert team_names(users, '2') == ['red', 'green']
+    assert team_names(users, '3') == ['red', 'blue']
+
+    teams.remove_users_from_team(json.dumps({"id": "1", "users": ["2", "3"]}))
+    assert team_names(users, '2') == ['green']
+    assert team_names(users, '3') == ['blue']
+    assert json.loads(users.get_user_teams(json.dumps({"id": "9"}))) == {"error": "User not found"}
+    repository.close()
+
+
+def test_memberships_written_by_another_process_are_picked_up(db_dir):
+    repository = Repository(JsonBackend(db_dir))
+    users = create_users(repository, 2)
+    create_team(TeamManager(repository), 'red')
+    assert team_names(users, '2') == []
+    run_process("""
+        import json, sys
+        from repository import Repository
+        from storage import JsonBackend
+        from team_base import TeamManager
+
+        repository = Repository(JsonBackend(sys.argv[1]))
+        teams = TeamManager(repository)
+        teams.create_team(json.dumps({"name": "blue", "description": "", "admin": "2"}))
+        teams.add_users_to_team(json.dumps({"id": "1", "users": ["2"]}))
+        repository.close()
+    """, db_dir)
+    assert team_names(users, '2') == ['red', 'blue']
+    repository.close()
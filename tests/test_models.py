@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+import codec
+from models import Board, Status, Task, Team, Timestamp, User, from_timestamp, to_timestamp
+
+
+@pytest.mark.parametrize('value', ['2024-01-01T00:00:00', '2024-02-29T23:59:59.123456', '1969-07-20T20:17:40'])
+def test_isoformat_timestamps_are_integers_that_format_back_exactly(value):
+    timestamp = to_timestamp(value)
+    assert type(timestamp) is Timestamp
+    assert from_timestamp(timestamp) == value
+
+
+@pytest.mark.parametrize('value', ['2024-01-01', '2024-01-01 00:00:00', '2024-01-01T00:00:00.000000',
+                                   '2024-01-01T00:00:00+00:00', '2024-13-01T00:00:00', 'yesterday',
+                                   1700000000, 0, True, None])
+def test_other_values_are_kept_as_they_are(value):
+    assert to_timestamp(value) is value
+    assert from_timestamp(value) is value
+    assert Task({"id": "1", "creation_time": value})['creation_time'] is value
+
+
+def test_records_read_and_serialize_like_the_dicts_they_replace():
+    task = {"id": "1", "title": "a", "description": "", "user_id": "2", "creation_time": "2024-01-01T00:00:00",
+            "status": "IN_PROGRESS"}
+    board = Board({"name": "b", "description": "", "team_id": "1", "creation_time": "2024-01-01T10:00:00",
+                   "tasks": [task], "status": "OPEN", "custom": [1]})
+    assert board['tasks'][0]['status'] is Status.IN_PROGRESS
+    assert board['custom'] == [1]
+    assert json.loads(codec.dumps(board)) == {"name": "b", "description": "", "team_id": "1",
+                                              "creation_time": "2024-01-01T10:00:00", "tasks": [task],
+                                              "status": "OPEN", "custom": [1]}
+    board['tasks'].append({**task, "id": "2"})
+    assert isinstance(board['tasks'][1], Task)
+
+    user = User({"name": "u", "display_name": "U"})
+    with pytest.raises(KeyError):
+        user['creation_time']
+    user['creation_time'] = "2024-01-01T00:00:00"
+    assert list(user) == ['name', 'display_name', 'creation_time']
+    del user['display_name']
+    assert user.to_dict() == {"name": "u", "creation_time": "2024-01-01T00:00:00"}
+
+
+def test_team_members_are_a_set_exported_as_a_list():
+    team = Team({"name": "t", "description": "", "admin": "1", "members": ["1", "2", "1"]})
+    assert team['members'] == {"1", "2"}
+    assert sorted(team.to_dict()['members']) == ["1", "2"]
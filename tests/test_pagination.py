@@ -0,0 +1,86 @@
+import io
+import json
+from contextlib import contextmanager
+
+import pytest
+
+import pagination
+
+from conftest import create_board, create_team, create_users
+from pagination import decode_cursor, encode_cursor, stream_json_array
+from project_board_base import ProjectBoardManager
+from repository import Repository
+from storage import JsonBackend
+from team_base import TeamManager
+
+
+def pages(method, key, field='id', **request):
+    items, cursor = [], None
+    while True:
+        page = json.loads(method(json.dumps({**request, **({"cursor": cursor} if cursor else {})})))
+        items.append([item[field] for item in page[key]])
+        cursor = page['next_cursor']
+        if cursor is None:
+            return items
+
+
+def test_pages_cover_every_user_and_team_once(db_dir):
+    repository = Repository(JsonBackend(db_dir))
+    users = create_users(repository, 7)
+    teams = TeamManager(repository)
+    for i in range(5):
+        create_team(teams, f'team {i}')
+    assert pages(users.list_users_page, 'users', 'name', limit=3) == [
+        ['user 0', 'user 1', 'user 2'], ['user 3', 'user 4', 'user 5'], ['user 6']]
+    assert pages(teams.list_teams_page, 'teams', 'name', limit=5) == [[f'team {i}' for i in range(5)]]
+    repository.close()
+
+
+@pytest.mark.parametrize('cursor', [5, True, ["MQ=="], "not a cursor", encode_cursor(-1)])
+def test_invalid_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor)
+
+
+@pytest.mark.parametrize('limit', [0, -1, 1001])
+def test_limits_are_bounded(db_dir, limit):
+    users = create_users(Repository(JsonBackend(db_dir)), 1)
+    with pytest.raises(ValueError, match="Limit must be between 1 and 1000"):
+        users.list_users_page(json.dumps({"limit": limit}))
+
+
+def test_closing_boards_between_pages_skips_no_open_board(db_dir):
+    repository = Repository(JsonBackend(db_dir))
+    create_users(repository, 1)
+    team_id = create_team(TeamManager(repository), 'team')
+    boards = ProjectBoardManager(repository)
+    for i in range(6):
+        create_board(boards, team_id, f'board {i}')
+
+    first = json.loads(boards.list_boards_page(json.dumps({"id": team_id, "limit": 2})))
+    assert [board['id'] for board in first['boards']] == ['1', '2']
+    boards.close_board(json.dumps({"id": "1"}))
+    boards.close_board(json.dumps({"id": "4"}))
+    second = json.loads(boards.list_boards_page(json.dumps({"id": team_id, "limit": 2,
+                                                            "cursor": first['next_cursor']})))
+    assert [board['id'] for board in second['boards']] == ['3', '5']
+    assert pages(boards.list_boards_page, 'boards', id=team_id, limit=2) == [['2', '3'], ['5', '6']]
+    repository.close()
+
+
+def test_streams_encode_a_batch_per_read_lock_and_write_outside_it(monkeypatch):
+    monkeypatch.setattr(pagination, 'STREAM_BATCH', 2)
+    out = io.StringIO()
+    events = []
+
+    @contextmanager
+    def reading():
+        events.append(('lock', out.tell()))
+        yield
+        events.append(('unlock', out.tell()))
+
+    stream_json_array(['1', '2', '3'], lambda key: {"id": key}, reading, out)
+    assert json.loads(out.getvalue()) == [{"id": "1"}, {"id": "2"}, {"id": "3"}]
+    # Nothing is written while the lock is held
+    assert [event for event, _ in events] == ['lock', 'unlock', 'lock', 'unlock']
+    assert events[0][1] == events[1][1] and events[2][1] == events[3][1] > events[1][1]
@@ -0,0 +1,65 @@
+import json
+import os
+import pstats
+
+import pytest
+
+import profiling
+from conftest import create_users
+from repository import Repository
+from storage import JsonBackend
+
+
+@pytest.fixture
+def profiled(tmp_path):
+    out_dir = str(tmp_path / 'profiles')
+    yield lambda **options: profiling.enable(out_dir=out_dir, **options), out_dir
+    profiling.disable()
+
+
+def test_sampled_calls_over_the_threshold_leave_cpu_and_allocation_profiles(db_dir, profiled):
+    enable, out_dir = profiled
+    users = create_users(Repository(JsonBackend(db_dir)), 1)
+    sampler = enable(rate=1, threshold_ms=0)
+    users.describe_user(json.dumps({"id": "1"}))
+    assert sampler.stats()['sampled'] == sampler.stats()['dumped'] == 1
+
+    files = sorted(os.listdir(out_dir))
+    assert [name.split('-')[0] for name in files] == ['UserManager.describe_user'] * 2
+    alloc, prof = (os.path.join(out_dir, name) for name in files)
+    assert prof.endswith('.prof') and alloc.endswith('.alloc.txt')
+    assert any('describe_user' in function for _, _, function in pstats.Stats(prof).stats)
+    with open(alloc) as file:
+        assert file.readline().startswith('UserManager.describe_user took ')
+
+
+def test_fast_calls_and_calls_during_another_profile_are_not_written(db_dir, profiled):
+    enable, out_dir = profiled
+    users = create_users(Repository(JsonBackend(db_dir)), 1)
+    sampler = enable(rate=1, threshold_ms=60000, memory=False)
+    users.describe_user(json.dumps({"id": "1"}))
+    assert (sampler.sampled, sampler.dumped) == (1, 0)
+    assert not os.path.exists(out_dir)
+
+    with sampler.lock:
+        # Another call holds the profilers, so this one runs plainly
+        assert json.loads(users.describe_user(json.dumps({"id": "1"})))['name'] == 'user 0'
+    assert sampler.sampled == 1
+
+
+def test_the_environment_enables_profiling(tmp_path):
+    try:
+        sampler = profiling.enable_from_environment({
+            'PLANNER_PROFILE_RATE': '0.5', 'PLANNER_PROFILE_THRESHOLD_MS': '20',
+            'PLANNER_PROFILE_DIR': str(tmp_path), 'PLANNER_PROFILE_MEMORY': '0'})
+        assert profiling.sampler is sampler
+        assert sampler.stats() == {"rate": 0.5, "threshold_ms": 20.0, "out_dir": str(tmp_path),
+                                   "sampled": 0, "dumped": 0}
+        assert not sampler.memory
+    finally:
+        profiling.disable()
+    assert profiling.enable_from_environment({}) is None
+    assert profiling.enable_from_environment({'PLANNER_PROFILE_RATE': '0'}) is None
+    with pytest.warns(RuntimeWarning, match="Profiling left off"):
+        assert profiling.enable_from_environment({'PLANNER_PROFILE_RATE': '2'}) is None
+    assert profiling.sampler is None
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+import instrumentation
+from conftest import create_team, create_users
+from project_board_base import ProjectBoardManager
+from repository import Repository
+from storage import JsonBackend
+from team_base import TeamManager
+from user_base import UserManager
+
+
+def test_managers_on_one_repository_share_each_collection(db_dir):
+    repository = Repository(JsonBackend(db_dir))
+    instrumentation.enable()
+    try:
+        users, teams, boards = UserManager(repository), TeamManager(repository), ProjectBoardManager(repository)
+        loads = instrumentation.snapshot()['io']['load']['operations']
+        UserManager(repository), TeamManager(repository), ProjectBoardManager(repository)
+        assert instrumentation.snapshot()['io']['load']['operations'] == loads
+    finally:
+        instrumentation.disable()
+    assert users.users is teams.users is repository.users
+    assert teams.teams is repository.teams and boards.boards is repository.boards
+    assert repository.open('users') == (repository.stores['users'], repository.users)
+    with pytest.raises(ValueError, match="Unknown collection: tasks"):
+        repository.open('tasks')
+    repository.close()
+
+
+def test_references_are_checked_against_the_other_managers_writes(db_dir):
+    repository = Repository(JsonBackend(db_dir))
+    teams = TeamManager(repository)
+    with pytest.raises(ValueError, match="User not found: 1"):
+        create_team(teams, 'red')
+    # Created through another manager after the team manager was built
+    create_users(repository, 1)
+    assert create_team(teams, 'red') == '1'
+    boards = ProjectBoardManager(repository)
+    with pytest.raises(ValueError, match="Team not found: 2"):
+        boards.create_board(json.dumps({"name": "b", "description": "", "team_id": "2",
+                                        "creation_time": "2024-01-01T00:00:00"}))
+    repository.close()
+
+
+def test_managers_built_without_a_repository_get_their_own(db_dir):
+    users = UserManager(backend=JsonBackend(db_dir))
+    teams = TeamManager(backend=JsonBackend(db_dir))
+    assert users.repository is not teams.repository
+    users.create_user(json.dumps({"name": "a", "display_name": "A"}))
+    # Picked up from the files, as another process's write would be
+    assert create_team(teams, 'red') == '1'
+    users.repository.close()
+    teams.repository.close()
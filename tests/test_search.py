@@ -0,0 +1,116 @@
+import json
+
+import pytest
+
+from conftest import add_task, create_board, create_team, create_users, run_process
+from indexes import TaskSearchIndex
+from project_board_base import ProjectBoardManager
+from repository import Repository
+from storage import JsonBackend
+from team_base import TeamManager
+
+ADD_TASK = """
+    import json, sys
+    from project_board_base import ProjectBoardManager
+    from repository import Repository
+    from storage import JsonBackend
+
+    repository = Repository(JsonBackend(sys.argv[1]))
+    ProjectBoardManager(repository).add_task(json.dumps(
+        {"board_id": sys.argv[2], "title": sys.argv[3], "description": "", "user_id": "1",
+         "creation_time": "2024-01-01T00:00:00"}))
+    repository.close()
+"""
+
+
+@pytest.fixture
+def boards(db_dir):
+    repository = Repository(JsonBackend(db_dir))
+    create_users(repository, 3)
+    teams = TeamManager(repository)
+    create_team(teams, 'one')
+    create_team(teams, 'two')
+    boards = ProjectBoardManager(repository)
+    create_board(boards, '1', 'first')
+    create_board(boards, '2', 'second')
+    add_task(boards, '1', 'Fix login bug', 'login fails on Safari')
+    add_task(boards, '1', 'Write docs', 'explain the login page', user_id='2')
+    add_task(boards, '2', 'Login page', 'new design', user_id='2')
+    add_task(boards, '2', 'Release', 'ship it', user_id='3')
+    yield boards
+    repository.close()
+
+
+def search(boards, **request):
+    return json.loads(boards.search_tasks(json.dumps(request)))
+
+
+def titles(response):
+    return [task['title'] for task in response['tasks']]
+
+
+def test_title_matches_rank_above_description_matches(boards):
+    assert titles(search(boards, query='login')) == ['Fix login bug', 'Login page', 'Write docs']
+    # Every word of the query must match, in any case
+    assert titles(search(boards, query='LOGIN safari')) == ['Fix login bug']
+    assert search(boards, query='nothing') == {"tasks": [], "next_cursor": None}
+    with pytest.raises(ValueError):
+        search(boards, query=' !')
+
+
+def test_filters_narrow_the_matches(boards):
+    assert titles(search(boards, query='login', board_id='2')) == ['Login page']
+    assert titles(search(boards, query='login', team_id='1')) == ['Fix login bug', 'Write docs']
+    assert titles(search(boards, query='login', board_id='2', team_id='1')) == []
+    assert titles(search(boards, query='login', user_id='2')) == ['Login page', 'Write docs']
+    boards.update_task_status(json.dumps({"board_id": "2", "task_id": "1", "status": "COMPLETE"}))
+    assert titles(search(boards, query='login', status='COMPLETE')) == ['Login page']
+
+
+def test_results_are_paginated(boards):
+    first = search(boards, query='login', limit=2)
+    assert titles(first) == ['Fix login bug', 'Login page']
+    second = search(boards, query='login', limit=2, cursor=first['next_cursor'])
+    assert titles(second) == ['Write docs']
+    assert second['next_cursor'] is None
+
+
+def test_index_is_built_by_the_first_search_and_kept_up_to_date(db_dir, boards):
+    reopened = Repository(JsonBackend(db_dir))
+    manager = ProjectBoardManager(reopened)
+    # Constructing the manager loads no board
+    assert manager.task_search is None
+    assert reopened.stores['boards'].shards == {}
+
+    assert titles(search(manager, query='release')) == ['Release']
+    add_task(manager, '1', 'Release notes')
+    assert titles(search(manager, query='release')) == ['Release', 'Release notes']
+    reopened.close()
+
+
+def test_another_processs_write_reindexes_only_its_board(db_dir, boards):
+    search(boards, query='login')
+    index = boards.task_search
+    other_board = list(index.board_tasks['2'])
+
+    run_process(ADD_TASK, db_dir, '1', 'Login timeout')
+    assert titles(search(boards, query='login', board_id='1')) == ['Fix login bug', 'Login timeout', 'Write docs']
+    assert boards.task_search is index
+    assert list(index.board_tasks['2']) == other_board
+    assert index.dead == 2
+
+
+def test_boards_indexed_again_are_renumbered_once_mostly_dead():
+    index = TaskSearchIndex([('1', {"tasks": [{"title": "alpha"}, {"title": "beta"}]}),
+                             ('2', {"tasks": [{"title": "alpha beta"}]})])
+    index.update_board('1', [{"title": "beta"}])
+    assert len(index) == 2
+    assert sorted(board_id for board_id, _, _ in index.search('beta')[0]) == ['1', '2']
+    index.update_board('1', None)
+    # Renumbered without the dead tasks
+    assert index.dead == 0
+    assert list(index.board_of) == ['2']
+    assert [(board_id, position) for board_id, position, _ in index.search('alpha')[0]] == [('2', 0)]
+    index.update_board('2', [{"title": "gamma"}])
+    assert index.search('alpha') == ([], 0)
+    assert index.search('gamma')[1] == 1
@@ -0,0 +1,78 @@
+import http.client
+import json
+import threading
+
+import pytest
+
+from repository import Repository
+from server import PlannerServer, PlannerService, key_error_message
+from storage import JsonBackend
+
+
+@pytest.fixture
+def server(db_dir):
+    server = PlannerServer(('127.0.0.1', 0), PlannerService(Repository(JsonBackend(db_dir))), workers=4,
+                           max_body=1024)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join(timeout=10)
+    server.server_close()
+
+
+@pytest.fixture
+def connection(server):
+    connection = http.client.HTTPConnection('127.0.0.1', server.server_port, timeout=10)
+    yield connection
+    connection.close()
+
+
+def post(connection, path, body):
+    connection.request('POST', path, body if isinstance(body, str) else json.dumps(body))
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def test_round_trip_over_one_kept_alive_connection(connection):
+    assert post(connection, '/users/create_user', {"name": "jane", "display_name": "Jane"}) == (200, {"id": "1"})
+    status, user = post(connection, '/users/describe_user', {"id": "1"})
+    assert status == 200 and user['name'] == 'jane'
+    assert post(connection, '/teams/create_team', {"name": "t", "description": "", "admin": "1"}) == (200, {"id": "1"})
+    connection.request('POST', '/teams/stream_teams', '')
+    response = connection.getresponse()
+    assert response.getheader('Transfer-Encoding') == 'chunked'
+    assert [team['name'] for team in json.loads(response.read())] == ['t']
+
+    connection.request('GET', '/health')
+    assert json.loads(connection.getresponse().read()) == {"status": "ok"}
+    connection.request('GET', '/metrics')
+    metrics = json.loads(connection.getresponse().read())
+    assert metrics['requests'] == 4
+    assert metrics['routes']['/users/create_user']['calls'] == 1
+
+
+def test_client_errors_are_answered_with_400(connection):
+    post(connection, '/users/create_user', {"name": "jane", "display_name": "Jane"})
+    assert post(connection, '/users/create_user', {"display_name": "Jane"}) == (400, {"error": "Missing field: name"})
+    assert post(connection, '/users/create_user', '{not json')[0] == 400
+    assert post(connection, '/users/list_users_page', {"cursor": 5}) == (400, {"error": "Invalid cursor"})
+    assert post(connection, '/boards/add_task', {
+        "board_id": "9", "title": "a", "description": "", "user_id": "1", "creation_time": "2024-01-01T00:00:00"
+    }) == (400, {"error": "Board not found: 9"})
+    assert post(connection, '/users/no_such_method', {}) == (404, {"error": "Not found"})
+
+
+def test_bodies_over_the_limit_are_rejected_with_413(server, connection):
+    status, reply = post(connection, '/users/create_user', {"name": "x" * 2000, "display_name": "X"})
+    assert (status, reply) == (413, {"error": "Request body exceeds 1024 bytes"})
+    assert server.service.rejected == 1
+    # The connection was closed, so the next request goes over a new one
+    connection.close()
+    assert post(connection, '/users/create_user', {"name": "jane", "display_name": "Jane"}) == (200, {"id": "1"})
+
+
+def test_key_errors_name_the_missing_field_or_the_unknown_id():
+    assert key_error_message(b'{"id": "9"}', '9') == "Not found: 9"
+    assert key_error_message(b'{"id": "9"}', 'name') == "Missing field: name"
+    assert key_error_message(b'[1]', 'name') == "Missing field: name"
@@ -0,0 +1,75 @@
+import json
+import os
+
+from conftest import start_process
+from storage import ShardedStore
+
+
+def test_sharded_store_picks_up_writes_across_journal_rotations(db_dir):
+    writer = ShardedStore('boards', db_dir, compact_threshold=4)
+    writer.load()
+    reader = ShardedStore('boards', db_dir, compact_threshold=4)
+    reader.load()
+    for key in ('1', '2', '3'):
+        writer.set([key], {"name": key, "n": 0})
+    reader.refresh()
+    for key in ('1', '2', '3'):
+        reader.shard(key)
+
+    for n in range(1, 40):
+        writer.refresh()
+        writer.set([str(n % 3 + 1), 'n'], n)
+        if n % 5 == 0:
+            assert reader.changed()
+            reader.refresh()
+            assert {key: reader.data[key]['n'] for key in ('1', '2', '3')} == \
+                   {key: writer.data[key]['n'] for key in ('1', '2', '3')}
+
+
+def test_legacy_single_file_snapshot_is_split_into_shards(db_dir):
+    os.makedirs(db_dir)
+    with open(os.path.join(db_dir, 'boards.json'), 'w') as file:
+        json.dump({"1": {"name": "a", "tasks": []}, "2": {"name": "b", "tasks": []}}, file)
+    store = ShardedStore('boards', db_dir, summary_fields=('name',))
+    assert dict(store.load()) == {"1": {"name": "a", "tasks": []}, "2": {"name": "b", "tasks": []}}
+    assert os.path.exists(os.path.join(db_dir, 'boards.json.migrated'))
+
+
+REFRESH_WRITER = """
+    import sys
+    from storage import ShardedStore
+
+    store = ShardedStore('boards', sys.argv[1], compact_threshold=8)
+    store.load()
+    for line in sys.stdin:
+        key, count = line.split()
+        for n in range(int(count)):
+            store.refresh()
+            store.set([key, 'n'], n)
+        print('done', flush=True)
+"""
+
+
+def test_two_processes_see_each_others_writes_across_journal_rotation(db_dir):
+    store = ShardedStore('boards', db_dir, compact_threshold=8)
+    store.load()
+    store.set(['1'], {"name": "a", "n": -1})
+    store.set(['2'], {"name": "b", "n": -1})
+    store.shard('1')
+    store.shard('2')
+
+    writer = start_process(REFRESH_WRITER, db_dir)
+    try:
+        # Rotate the journal with writes to board 1, then regrow it past the offset
+        # this process read up to with writes to board 2 only
+        writer.stdin.write('1 20\n2 30\n')
+        writer.stdin.flush()
+        assert writer.stdout.readline() == 'done\n'
+        assert writer.stdout.readline() == 'done\n'
+        assert store.refresh()
+        assert store.data['1']['n'] == 19
+        assert store.data['2']['n'] == 29
+    finally:
+        writer.stdin.close()
+        writer.wait(timeout=60)
+
@@ -0,0 +1,80 @@
+import os
+
+import storage
+from storage import SqliteBackend
+
+
+def open_users(path):
+    store = SqliteBackend(path).open('users')
+    store.load()
+    return store
+
+
+def test_refresh_reloads_only_the_records_another_connection_wrote(tmp_path):
+    path = str(tmp_path / 'planner.sqlite3')
+    writer = open_users(path)
+    writer.set_many([([str(i)], {"name": f"user {i}", "display_name": "x"}) for i in range(100)])
+    reader = open_users(path)
+    untouched = reader.data['2']
+    assert not reader.changed()
+
+    writer.set(['1', 'display_name'], "changed")
+    writer.set(['100'], {"name": "new", "display_name": "y"})
+    assert not writer.changed()
+    assert reader.changed()
+    assert reader.refresh() == {'1', '100'}
+    assert reader.data['1']['display_name'] == 'changed'
+    assert list(reader.data)[-1] == '100'
+    assert reader.data['2'] is untouched
+    assert reader.refresh() == set()
+
+    writer.delete(['5'])
+    assert reader.refresh() == {'5'}
+    assert '5' not in reader.data
+    assert reader.data == writer.data
+
+
+def test_refresh_reloads_a_boards_tasks_and_a_teams_members(tmp_path):
+    path = str(tmp_path / 'planner.sqlite3')
+    writer, reader = SqliteBackend(path), SqliteBackend(path)
+    teams, boards = writer.open('teams'), writer.open('boards')
+    teams.load()
+    boards.load()
+    teams.set(['1'], {"name": "t", "members": ["1"]})
+    boards.set(['1'], {"name": "b", "team_id": "1", "tasks": []})
+    reading = {name: reader.open(name) for name in ('teams', 'boards')}
+    for store in reading.values():
+        store.load()
+
+    teams.set(['1', 'members'], ["1", "3", "2"])
+    boards.set(['1', 'tasks', 0], {"id": "1", "title": "a"})
+    boards.set(['1', 'tasks', 1], {"id": "2", "title": "b"})
+    assert reading['teams'].refresh() == {'1'}
+    assert reading['teams'].data['1']['members'] == {"1", "2", "3"}
+    assert reading['boards'].refresh() == {'1'}
+    assert [task['title'] for task in reading['boards'].data['1']['tasks']] == ['a', 'b']
+
+
+def test_a_reader_behind_the_pruned_changes_reloads_everything(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, 'SQLITE_CHANGES_KEPT', 5)
+    path = str(tmp_path / 'planner.sqlite3')
+    writer = open_users(path)
+    writer.set_many([([str(i)], {"name": str(i)}) for i in range(3)])
+    reader = open_users(path)
+
+    for i in range(20):
+        writer.set(['1', 'name'], f"name {i}")
+    changes = writer.connection.execute('SELECT COUNT(*) FROM changes').fetchone()[0]
+    assert changes <= 10
+    assert reader.refresh() == {'0', '1', '2'}
+    assert reader.data == writer.data
+
+
+def test_the_lookup_columns_are_indexed(tmp_path):
+    backend = SqliteBackend(os.path.join(tmp_path, 'planner.sqlite3'))
+    indexes = {name for name, in backend.connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {'users_name', 'teams_name', 'team_members_user_id', 'boards_team_id', 'tasks_board_id',
+            'tasks_user_id'} <= indexes
+    plan = backend.connection.execute(
+        "EXPLAIN QUERY PLAN SELECT record_id FROM changes WHERE collection = 'users' AND version > 3").fetchall()
+    assert plan[0][-1].startswith('SEARCH changes USING')
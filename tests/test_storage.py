@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+
+from conftest import create_users
+from repository import Repository
+from storage import Compactor, JsonBackend, LogStore
+
+
+def test_torn_record_is_skipped_on_load_and_truncated_by_the_next_writer(db_dir):
+    store = LogStore('users.json', db_dir)
+    store.load()
+    store.set(['1'], {"name": "a"})
+    with open(store.log_path, 'ab') as file:
+        file.write(b'{"p":["2"],"v":{"na')
+    torn_size = os.path.getsize(store.log_path)
+
+    reader = LogStore('users.json', db_dir)
+    assert reader.load() == {'1': {"name": "a"}}
+    # Loading leaves the tail alone, since it may be another process's append
+    assert os.path.getsize(reader.log_path) == torn_size
+    assert not reader.changed()
+
+    reader.set(['3'], {"name": "c"})
+    assert LogStore('users.json', db_dir).load() == {'1': {"name": "a"}, '3': {"name": "c"}}
+
+
+def test_log_replay_is_idempotent(db_dir):
+    store = LogStore('teams.json', db_dir)
+    store.load()
+    store.set(['1'], {"name": "t", "members": []})
+    store.set(['1', 'members'], ['1', '2'])
+    store.set_many([(['2'], {"name": "u"}), (['1', 'name'], "t2")])
+    store.delete(['2'])
+    with open(store.log_path, 'rb') as file:
+        log = file.read()
+    expected = dict(store.data)
+
+    # A crash between writing the snapshot and emptying the log replays every record again
+    store.compact()
+    with open(store.log_path, 'wb') as file:
+        file.write(log)
+    assert LogStore('teams.json', db_dir).load() == expected
+
+
+def test_compaction_waits_for_the_log_to_grow_as_large_as_the_snapshot(db_dir):
+    store = LogStore('users.json', db_dir, compact_threshold=10)
+    store.load()
+    store.set_many([([str(i)], {"name": f"user {i}", "display_name": "x" * 100}) for i in range(100)])
+    store.compact()
+    snapshot_size = os.path.getsize(store.snapshot_path)
+
+    for i in range(20):
+        store.set([str(i), 'display_name'], "y")
+    # Past compact_threshold records, but far smaller than the snapshot
+    assert store.log_records == 20
+    assert os.path.getsize(store.log_path) < snapshot_size
+
+    log_size = store.log_offset
+    i = 0
+    while store.log_records:
+        log_size = store.log_offset
+        store.set([str(i % 100), 'display_name'], "z" * 100)
+        i += 1
+    # Compacted by the append that made the log as large as the snapshot
+    assert snapshot_size - 200 < log_size < snapshot_size
+    assert os.path.getsize(store.log_path) == 0
+
+    lazy = LogStore('users.json', db_dir, lazy=True)
+    assert dict(lazy.load()) == dict(store.data)
+    assert not lazy.needs_manifest
+
+
+def test_compactor_compacts_in_the_background(db_dir):
+    writers = threading.Lock()
+    compactor = Compactor(lambda: writers)
+    store = LogStore('users.json', db_dir, compact_threshold=5)
+    store.load()
+    store.compact_in_background(compactor)
+    with writers:
+        for i in range(5):
+            store.set([str(i)], {"name": str(i)})
+        # Due, but left to the compactor
+        assert store.log_records == 5
+    deadline = time.monotonic() + 10
+    while not compactor.compactions and time.monotonic() < deadline:
+        time.sleep(0.01)
+    compactor.close()
+    assert compactor.stats() == {"compactions": 1, "due": 0, "error": None}
+    assert store.log_records == 0
+    assert LogStore('users.json', db_dir).load() == store.data
+
+
+def test_due_logs_are_compacted_off_the_request_path(db_dir):
+    repository = Repository(JsonBackend(db_dir, compact_threshold=10))
+    create_users(repository, 30)
+    deadline = time.monotonic() + 10
+    while repository.compactor.compactions == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    repository.close()
+    assert repository.compactor.stats()['error'] is None
+    assert repository.compactor.compactions >= 1
+
+    log_size = os.path.getsize(os.path.join(db_dir, 'users.json.log'))
+    assert log_size < os.path.getsize(os.path.join(db_dir, 'users.json'))
+    assert len(Repository(JsonBackend(db_dir, compact_threshold=10)).users) == 30
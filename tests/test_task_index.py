@@ -0,0 +1,71 @@
+import json
+
+from conftest import add_task, create_board, create_team, create_users, run_process
+from indexes import TaskIndex
+from project_board_base import ProjectBoardManager
+from repository import Repository
+from storage import JsonBackend
+from team_base import TeamManager
+
+
+def call(boards, method, **request):
+    return json.loads(getattr(boards, method)(json.dumps(request)))
+
+
+def board_manager(db_dir):
+    repository = Repository(JsonBackend(db_dir))
+    create_users(repository, 1)
+    create_team(TeamManager(repository), 'red')
+    boards = ProjectBoardManager(repository)
+    create_board(boards, '1', 'plan')
+    return repository, boards
+
+
+def test_task_index_counts_statuses():
+    index = TaskIndex([{"id": "1", "title": "a", "status": "OPEN"}, {"id": "2", "title": "b", "status": "COMPLETE"}])
+    assert len(index) == 2 and index.position_of('2') == 1 and index.position_of('3') is None
+    assert index.titles.get('b') == '2'
+    assert index.incomplete_count() == 1
+    index.change_status('OPEN', 'COMPLETE')
+    assert index.incomplete_count() == 0
+
+
+def test_a_board_closes_once_every_task_is_complete(db_dir):
+    repository, boards = board_manager(db_dir)
+    add_task(boards, '1', 'a')
+    add_task(boards, '1', 'b')
+    assert call(boards, 'update_task_status', board_id='1', task_id='9', status='COMPLETE') == {
+        "error": "Task not found"}
+    call(boards, 'update_task_status', board_id='1', task_id='1', status='COMPLETE')
+    assert call(boards, 'close_board', id='1') == {"error": "Cannot close board, some tasks are not complete"}
+    call(boards, 'update_task_status', board_id='1', task_id='2', status='IN_PROGRESS')
+    call(boards, 'update_task_status', board_id='1', task_id='2', status='COMPLETE')
+    assert call(boards, 'close_board', id='1') == {"status": "Board closed"}
+    assert call(boards, 'close_board', id='1') == {"error": "Board already closed"}
+    assert call(boards, 'close_board', id='9') == {"error": "Board not found"}
+    assert repository.boards['1']['status'] == 'CLOSED'
+    assert [task['status'] for task in repository.boards['1']['tasks']] == ['COMPLETE', 'COMPLETE']
+    repository.close()
+
+
+def test_the_index_of_a_board_another_process_changed_is_rebuilt(db_dir):
+    repository, boards = board_manager(db_dir)
+    add_task(boards, '1', 'a')
+    call(boards, 'update_task_status', board_id='1', task_id='1', status='COMPLETE')
+    run_process("""
+        import json, sys
+        from project_board_base import ProjectBoardManager
+        from repository import Repository
+        from storage import JsonBackend
+
+        repository = Repository(JsonBackend(sys.argv[1]))
+        ProjectBoardManager(repository).add_task(json.dumps({
+            "board_id": "1", "title": "b", "description": "", "user_id": "1",
+            "creation_time": "2024-01-01T00:00:00"}))
+        repository.close()
+    """, db_dir)
+    assert call(boards, 'close_board', id='1') == {"error": "Cannot close board, some tasks are not complete"}
+    assert call(boards, 'update_task_status', board_id='1', task_id='2', status='COMPLETE') == {
+        "status": "Task status updated"}
+    assert call(boards, 'close_board', id='1') == {"status": "Board closed"}
+    repository.close()
@@ -0,0 +1,57 @@
+import json
+
+from conftest import create_board, create_team, create_users, run_process
+from indexes import TeamBoardIndex
+from project_board_base import ProjectBoardManager
+from repository import Repository
+from storage import JsonBackend
+from team_base import TeamManager
+
+
+def open_boards(boards, team_id):
+    return [board['name'] for board in json.loads(boards.list_boards(json.dumps({"id": team_id})))]
+
+
+def test_team_board_index_partitions_by_status():
+    index = TeamBoardIndex([('1', {"team_id": "1"}), ('2', {"team_id": "2"}),
+                            ('3', {"team_id": "1", "status": "CLOSED"}), ('4', {"team_id": "1"})])
+    assert index.boards_of('1') == ['1', '4']
+    assert index.boards_of('1', 'CLOSED') == ['3']
+    index.close('1', '1')
+    assert index.boards_of('1') == ['4'] and index.boards_of('1', 'CLOSED') == ['3', '1']
+    assert index.boards_of('9') == []
+
+
+def test_list_boards_returns_the_open_boards_of_the_team(db_dir):
+    repository = Repository(JsonBackend(db_dir))
+    create_users(repository, 1)
+    teams = TeamManager(repository)
+    create_team(teams, 'red')
+    create_team(teams, 'blue')
+    boards = ProjectBoardManager(repository)
+    for team_id, name in (('1', 'a'), ('2', 'b'), ('1', 'c'), ('1', 'd')):
+        create_board(boards, team_id, name)
+    boards.close_board(json.dumps({"id": "3"}))
+    assert open_boards(boards, '1') == ['a', 'd']
+    assert open_boards(boards, '2') == ['b']
+    assert open_boards(boards, '9') == []
+    repository.close()
+
+    repository = Repository(JsonBackend(db_dir))
+    boards = ProjectBoardManager(repository)
+    assert open_boards(boards, '1') == ['a', 'd']
+    run_process("""
+        import json, sys
+        from project_board_base import ProjectBoardManager
+        from repository import Repository
+        from storage import JsonBackend
+
+        repository = Repository(JsonBackend(sys.argv[1]))
+        boards = ProjectBoardManager(repository)
+        boards.close_board(json.dumps({"id": "1"}))
+        boards.create_board(json.dumps({"name": "e", "description": "", "team_id": "1",
+                                        "creation_time": "2024-01-01T00:00:00"}))
+        repository.close()
+    """, db_dir)
+    assert open_boards(boards, '1') == ['d', 'e']
+    repository.close()
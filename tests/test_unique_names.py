@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from conftest import create_board, create_team, create_users, run_process
+from indexes import UniqueIndex
+from project_board_base import ProjectBoardManager
+from repository import Repository
+from storage import JsonBackend
+from team_base import TeamManager
+
+
+def test_unique_index_tracks_owners():
+    index = UniqueIndex([('a', '1'), ('b', '2')])
+    assert 'a' in index and len(index) == 2
+    assert index.is_taken('a') and index.is_taken('a', '2')
+    assert not index.is_taken('a', '1') and not index.is_taken('c')
+    index.replace('a', 'c', '1')
+    assert index.get('c') == '1' and 'a' not in index
+    index.replace('c', 'c', '1')
+    assert index.get('c') == '1'
+
+
+def test_names_are_unique_per_collection_and_free_again_once_renamed(db_dir):
+    repository = Repository(JsonBackend(db_dir))
+    users = create_users(repository, 2)
+    with pytest.raises(ValueError, match="User name must be unique"):
+        users.create_user(json.dumps({"name": "user 1", "display_name": "again"}))
+
+    teams = TeamManager(repository)
+    create_team(teams, 'red')
+    create_team(teams, 'blue')
+    with pytest.raises(ValueError, match="Team name must be unique"):
+        teams.update_team(json.dumps({"id": "2", "team": {"name": "red"}}))
+    # Keeping its own name is no conflict
+    teams.update_team(json.dumps({"id": "1", "team": {"name": "red", "description": "d"}}))
+    teams.update_team(json.dumps({"id": "1", "team": {"name": "green"}}))
+    assert create_team(teams, 'red') == '3'
+
+    boards = ProjectBoardManager(repository)
+    create_board(boards, '1', 'plan')
+    # Board names are unique per team only
+    create_board(boards, '2', 'plan')
+    with pytest.raises(ValueError, match="Board name must be unique for the team"):
+        create_board(boards, '1', 'plan')
+    repository.close()
+
+
+def test_names_written_by_another_process_are_taken(db_dir):
+    repository = Repository(JsonBackend(db_dir))
+    users = create_users(repository, 1)
+    run_process("""
+        import json, sys
+        from repository import Repository
+        from storage import JsonBackend
+        from user_base import UserManager
+
+        repository = Repository(JsonBackend(sys.argv[1]))
+        UserManager(repository).create_user(json.dumps({"name": "elsewhere", "display_name": "E"}))
+        repository.close()
+    """, db_dir)
+    with pytest.raises(ValueError, match="User name must be unique"):
+        users.create_user(json.dumps({"name": "elsewhere", "display_name": "again"}))
+    repository.close()
@@ -0,0 +1,63 @@
+import json
+import os
+import time
+
+import pytest
+
+from conftest import create_users, describe
+from project_board_base import ProjectBoardManager
+from repository import Repository
+from storage import JsonBackend, SqliteBackend
+from team_base import TeamManager
+from user_base import UserManager
+
+
+@pytest.fixture(params=['json', 'sqlite'])
+def backend(request, db_dir):
+    if request.param == 'json':
+        return lambda: JsonBackend(db_dir)
+    os.makedirs(db_dir, exist_ok=True)
+    return lambda: SqliteBackend(os.path.join(db_dir, 'planner.sqlite3'))
+
+
+def test_write_behind_keeps_writes_in_memory_until_flushed(backend):
+    repository = Repository(backend(), write_behind=60)
+    users = create_users(repository, 3)
+    assert describe(users, '3')['name'] == 'user 2'
+    assert len(Repository(backend()).users) == 0
+
+    repository.flush()
+    assert len(Repository(backend()).users) == 3
+    repository.close()
+
+
+def test_write_behind_flushes_in_the_background(backend):
+    repository = Repository(backend(), write_behind=0.01)
+    create_users(repository, 3)
+    deadline = time.monotonic() + 10
+    while repository.flusher.flushes == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert repository.flusher.stats()['error'] is None
+    assert len(Repository(backend()).users) == 3
+    repository.close()
+
+
+def test_close_writes_what_is_pending(backend):
+    repository = Repository(backend(), write_behind=60)
+    users = create_users(repository, 2)
+    teams = TeamManager(repository)
+    team_id = json.loads(teams.create_team(json.dumps({"name": "team", "description": "", "admin": "1"})))['id']
+    teams.add_users_to_team(json.dumps({"id": team_id, "users": ["2"]}))
+    boards = ProjectBoardManager(repository)
+    board_id = json.loads(boards.create_board(json.dumps(
+        {"name": "board", "description": "", "team_id": team_id, "creation_time": "2024-01-01T00:00:00"})))['id']
+    boards.add_task(json.dumps({"board_id": board_id, "title": "task", "description": "", "user_id": "2",
+                                "creation_time": "2024-01-01T00:00:00"}))
+    users.update_user(json.dumps({"id": "1", "user": {"display_name": "changed"}}))
+    repository.close()
+
+    reopened = Repository(backend())
+    assert describe(UserManager(reopened), '1')['display_name'] == 'changed'
+    assert TeamManager(reopened).get_user_team_ids("2") == [team_id]
+    assert [task['title'] for task in reopened.boards[board_id]['tasks']] == ['task']
+    reopened.close()
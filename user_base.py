@@ -1,24 +1,13 @@
 import json
-import os
 from datetime import datetime
 
-DB_DIR = 'db'
-
-if not os.path.exists(DB_DIR):
-    os.makedirs(DB_DIR)
-
-# Helper functions
-def load_data(file_name):
-    file_path = os.path.join(DB_DIR, file_name)
-    if os.path.exists(file_path):
-        with open(file_path, 'r') as file:
-            return json.load(file)
-    return {}
-
-def save_data(file_name, data):
-    file_path = os.path.join(DB_DIR, file_name)
-    with open(file_path, 'w') as file:
-        json.dump(data, file, indent=4)
+import codec
+from cache import cached, id_tag
+from concurrency import reads, writes
+from indexes import UniqueIndex
+from instrumentation import instrumented
+from pagination import page_bounds, stream_json_array
+from repository import Repository
 
 # UserBase class
 class UserBase:
@@ -43,6 +32,27 @@ class UserBase:
         """
         pass
 
+    # create many users at once
+    def create_users_bulk(self, request: str) -> str:
+        """
+        :param request: A json string with the users to create
+        {
+          "users" : [
+            {
+              "name" : "<user_name>",
+              "display_name" : "<display name>"
+            }
+          ]
+        }
+        :return: A json string with the response {"ids" : ["<user_id>"]}
+
+        Constraint:
+            * same constraints as create_user, checked for the whole batch first
+            * user names must also be unique within the batch
+            * either every user is created or none is
+        """
+        pass
+
     # list all users
     def list_users(self) -> str:
         """
@@ -57,6 +67,30 @@ class UserBase:
         """
         pass
 
+    # list users a page at a time
+    def list_users_page(self, request: str) -> str:
+        """
+        :param request: A json string with the page to fetch
+        {
+          "limit" : <max users in the page, default 100>,
+          "cursor" : "<next_cursor of the previous page, omitted for the first page>"
+        }
+        :return: A json string with the response
+        {
+          "users" : [<same entries as list_users>],
+          "next_cursor" : "<cursor of the next page, null on the last page>"
+        }
+        """
+        pass
+
+    # write all users as a json list to a file-like object
+    def stream_users(self, out):
+        """
+        :param out: A writable text file-like object. The same json list as list_users is
+        written to it incrementally, one user at a time.
+        """
+        pass
+
     # describe user
     def describe_user(self, request: str) -> str:
         """
@@ -116,58 +150,131 @@ class UserBase:
         pass
 
 # UserManager class
+@instrumented(UserBase)
 class UserManager(UserBase):
-    def __init__(self):
-        self.users_file = 'users.json'
-        self.users = load_data(self.users_file)
+    def __init__(self, repository=None, backend=None):
+        self.repository = repository or Repository(backend)
+        self.store, self.users = self.repository.open('users')
+        self.guard = self.repository.guard
+        self.name_index = UniqueIndex()
+        self.rebuild_indexes()
+        self.repository.on_reload(self.rebuild_indexes)
+
+    def rebuild_indexes(self, changes=None):
+        """
+        :param changes: collection name -> ids of the records reloaded, None to build from scratch
+        """
+        if changes is None or 'users' in changes:
+            self.name_index.rebuild((user['name'], user_id) for user_id, user in self.store.summaries())
 
+    @writes
     def create_user(self, request: str) -> str:
-        user_data = json.loads(request)
+        user_data = codec.loads(request)
         user_id = str(len(self.users) + 1)
-        if user_data['name'] in [user['name'] for user in self.users.values()]:
+        if user_data['name'] in self.name_index:
             raise ValueError("User name must be unique")
         if len(user_data['name']) > 64 or len(user_data['display_name']) > 64:
             raise ValueError("Name or display name exceeds max length")
-        self.users[user_id] = {
+        self.store.set([user_id], {
             "name": user_data['name'],
             "display_name": user_data['display_name'],
             "creation_time": datetime.now().isoformat()
-        }
-        save_data(self.users_file, self.users)
-        return json.dumps({"id": user_id})
-
+        })
+        self.name_index.add(user_data['name'], user_id)
+        self.repository.invalidate(('users',), ('user', user_id))
+        return codec.dumps({"id": user_id})
+
+    @writes
+    def create_users_bulk(self, request: str) -> str:
+        users = codec.loads(request)['users']
+        batch_names = set()
+        for user_data in users:
+            if user_data['name'] in self.name_index or user_data['name'] in batch_names:
+                raise ValueError("User name must be unique")
+            if len(user_data['name']) > 64 or len(user_data['display_name']) > 64:
+                raise ValueError("Name or display name exceeds max length")
+            batch_names.add(user_data['name'])
+
+        first_id = len(self.users) + 1
+        user_ids = [str(first_id + offset) for offset in range(len(users))]
+        creation_time = datetime.now().isoformat()
+        self.store.set_many([
+            ([user_id], {
+                "name": user_data['name'],
+                "display_name": user_data['display_name'],
+                "creation_time": creation_time
+            })
+            for user_id, user_data in zip(user_ids, users)
+        ])
+        for user_id, user_data in zip(user_ids, users):
+            self.name_index.add(user_data['name'], user_id)
+        self.repository.invalidate(('users',), *(('user', user_id) for user_id in user_ids))
+        return codec.dumps({"ids": user_ids})
+
+    @reads
+    @cached(lambda manager: [('users',)])
     def list_users(self) -> str:
-        return json.dumps(list(self.users.values()), indent=4)
-
+        return codec.dumps(list(self.users.values()))
+
+    @reads
+    @cached(lambda manager, request: [('users',)])
+    def list_users_page(self, request: str) -> str:
+        start, end, next_cursor = page_bounds(codec.loads(request), len(self.users))
+        # User ids are assigned sequentially from 1, so a position maps straight to an id
+        users = [self.users[str(position + 1)] for position in range(start, end)]
+        return codec.dumps({"users": users, "next_cursor": next_cursor})
+
+    def stream_users(self, out):
+        with self.guard.reading():
+            user_ids = list(self.users)
+        stream_json_array(user_ids, self.users.__getitem__, self.guard.reading, out)
+
+    @reads
+    @cached(id_tag('user'))
     def describe_user(self, request: str) -> str:
-        user_id = json.loads(request)['id']
+        user_id = codec.loads(request)['id']
         user = self.users.get(user_id)
         if user:
-            return json.dumps(user, indent=4)
+            return codec.dumps(user)
         else:
-            return json.dumps({"error": "User not found"}, indent=4)
+            return codec.dumps({"error": "User not found"})
 
+    @writes
     def update_user(self, request: str) -> str:
-        user_data = json.loads(request)
+        user_data = codec.loads(request)
         user_id = user_data['id']
         if user_id not in self.users:
-            return json.dumps({"error": "User not found"}, indent=4)
+            return codec.dumps({"error": "User not found"})
         if len(user_data['user']['display_name']) > 128:
             raise ValueError("Display name exceeds max length")
-        self.users[user_id]['display_name'] = user_data['user']['display_name']
-        save_data(self.users_file, self.users)
-        return json.dumps({"status": "User updated"}, indent=4)
+        self.store.set([user_id, 'display_name'], user_data['user']['display_name'])
+        self.repository.invalidate(('users',), ('user', user_id))
+        return codec.dumps({"status": "User updated"})
 
+    @reads
+    @cached(lambda manager, request: manager.user_teams_tags(codec.loads(request)['id']))
     def get_user_teams(self, request: str) -> str:
-        user_id = json.loads(request)['id']
+        user_id = codec.loads(request)['id']
         user = self.users.get(user_id)
         if user:
-            teams_file = 'teams.json'
-            teams = load_data(teams_file)
-            user_teams = [team for team in teams.values() if user_id in team['users']]
-            return json.dumps(user_teams, indent=4)
+            # Team memberships are answered from the repository's reverse index
+            teams = self.repository.teams
+            user_teams = [
+                {
+                    "name": teams[team_id]['name'],
+                    "description": teams[team_id]['description'],
+                    "creation_time": teams[team_id]['creation_time']
+                }
+                for team_id in sorted(self.repository.membership_index.teams_of(user_id), key=int)
+            ]
+            return codec.dumps(user_teams)
         else:
-            return json.dumps({"error": "User not found"}, indent=4)
+            return codec.dumps({"error": "User not found"})
+
+    def user_teams_tags(self, user_id):
+        # The response lists the user's teams, so it changes with the membership and those teams
+        team_ids = self.repository.membership_index.teams_of(user_id)
+        return [('user', user_id), ('user_teams', user_id)] + [('team', team_id) for team_id in team_ids]
 
 # Usage Example
 if __name__ == "__main__":